@@ -54,11 +54,73 @@ except ImportError:
 from allure_step_rewriter.rewrite_step import (
     rewrite_step,
     AllureStepWrapper,
+    StepFrame,
+    current_frame,
+    is_recording,
+    set_collapse_recursion,
+    will_override,
+)
+from allure_step_rewriter.attachments import attach_stream
+from allure_step_rewriter.caching import StepCache, clear_step_caches
+from allure_step_rewriter.dedup import set_deduplication
+from allure_step_rewriter.failures import set_failure_capture
+from allure_step_rewriter.log_capture import set_step_log_capture
+from allure_step_rewriter.observers import (
+    StepObserver,
+    add_step_observer,
+    remove_step_observer,
+)
+from allure_step_rewriter.polling import PollTimeoutError, poll, retry
+from allure_step_rewriter.profiling import set_profiled_titles
+from allure_step_rewriter.sampling import StepSampler, set_sampler
+from allure_step_rewriter.sinks import (
+    AllureSink,
+    MemorySink,
+    NullSink,
+    StepSink,
+    capture_steps,
+    set_sink,
+)
+from allure_step_rewriter.slow_steps import (
+    SlowStepError,
+    SlowStepWarning,
+    set_slow_step_thresholds,
 )
 from allure_step_rewriter.version import __version__
 
+# rewrite_step.poll() and rewrite_step.retry()
+rewrite_step.poll = poll
+rewrite_step.retry = retry
+
 __all__ = [
     "rewrite_step",
     "AllureStepWrapper",
+    "StepFrame",
+    "current_frame",
+    "will_override",
+    "is_recording",
+    "set_collapse_recursion",
+    "attach_stream",
+    "StepCache",
+    "clear_step_caches",
+    "set_deduplication",
+    "set_failure_capture",
+    "set_step_log_capture",
+    "StepObserver",
+    "add_step_observer",
+    "remove_step_observer",
+    "PollTimeoutError",
+    "set_profiled_titles",
+    "StepSampler",
+    "set_sampler",
+    "StepSink",
+    "AllureSink",
+    "NullSink",
+    "MemorySink",
+    "set_sink",
+    "capture_steps",
+    "SlowStepError",
+    "SlowStepWarning",
+    "set_slow_step_thresholds",
     "__version__",
 ]
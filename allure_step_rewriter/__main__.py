@@ -0,0 +1,7 @@
+"""Allow running the command line interface with ``python -m allure_step_rewriter``."""
+
+import sys
+
+from allure_step_rewriter.cli import main
+
+sys.exit(main())
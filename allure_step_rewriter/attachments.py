@@ -0,0 +1,160 @@
+"""
+Streamed step attachments.
+
+attach_stream() attaches large payloads to the current step without loading
+them into memory: file-like objects, iterators of chunks and paths are read
+in chunks and written through the sink, straight into the Allure results
+directory when one is in use. The payload can be capped in size and gzip
+compressed on the fly. Identical payloads are written once per results
+directory, see allure_step_rewriter.dedup.
+"""
+
+import os
+import zlib
+from functools import partial
+from typing import Any, Iterator, Optional
+
+from allure_step_rewriter.dedup import get_content_index, new_hash
+from allure_step_rewriter.sinks import get_sink, resolve_attachment_type
+
+# Read size for files and file-like objects
+CHUNK_SIZE = 1 << 20
+
+# Appended to attachments cut at max_size
+TRUNCATED_NOTE = "\n... [truncated at {size} bytes]\n"
+
+
+def _encode(chunk: Any) -> bytes:
+    """Convert a text or binary chunk to bytes."""
+    return chunk.encode("utf-8") if isinstance(chunk, str) else bytes(chunk)
+
+
+def iter_chunks(source: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Iterate over a payload in chunks.
+
+    Args:
+        source: Path (str or os.PathLike), bytes, binary or text file-like
+            object, or iterable of bytes or str chunks
+        chunk_size: Read size for files (default: 1 MiB)
+
+    Yields:
+        Binary chunks
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as source_file:
+            yield from iter(partial(source_file.read, chunk_size), b"")
+        return
+
+    read = getattr(source, "read", None)
+    if read is not None:
+        while True:
+            chunk = read(chunk_size)
+            if not chunk:
+                return
+            yield _encode(chunk)
+
+    for chunk in source:
+        yield _encode(chunk)
+
+
+def attach_stream(
+    source: Any,
+    name: Optional[str] = None,
+    attachment_type: Any = None,
+    extension: Optional[str] = None,
+    max_size: Optional[int] = None,
+    compress: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    dedupe: bool = True,
+) -> Optional[int]:
+    """
+    Attach a payload to the current step, streaming it in chunks.
+
+    Args:
+        source: Path (str or os.PathLike), bytes, binary or text file-like
+            object, or iterable of bytes or str chunks
+        name: Attachment name (optional)
+        attachment_type: Allure attachment type or MIME type (optional)
+        extension: File extension (optional)
+        max_size: Keep at most this many bytes of the payload and note the
+            truncation at the end (optional)
+        compress: Gzip the attachment; its type becomes application/gzip and
+            ".gz" is appended to the extension (default: False)
+        chunk_size: Read size for files (default: 1 MiB)
+        dedupe: Reference an identical attachment already written to the
+            results directory instead of writing another copy (default: True)
+
+    Returns:
+        Number of payload bytes attached (before compression), or None if
+        the sink drops attachments
+
+    Example:
+        >>> with rewrite_step("Download report"):
+        >>>     response = session.get(url, stream=True)
+        >>>     attach_stream(response.iter_content(65536), name="report",
+        >>>                   attachment_type=allure.attachment_type.JSON,
+        >>>                   max_size=50 * 2**20, compress=True)
+    """
+    if compress:
+        _, file_extension = resolve_attachment_type(attachment_type, extension)
+        attachment_type, extension = "application/gzip", f"{file_extension}.gz"
+
+    index = get_content_index() if dedupe else None
+    # Unchanged files attached as they are skip reading when already written
+    whole_file = (
+        index is not None
+        and isinstance(source, (str, os.PathLike))
+        and not compress
+        and (max_size is None or os.path.getsize(source) <= max_size)
+    )
+
+    writer = get_sink().open_attachment(name, attachment_type, extension)
+    if writer is None:
+        return None
+
+    if whole_file:
+        digest = index.path_digest(source)
+        if digest is not None and writer.reuse(digest):
+            return os.path.getsize(source)
+
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    content_hash = new_hash() if index is not None else None
+
+    def write(data: bytes) -> None:
+        if compressor is not None:
+            data = compressor.compress(data)
+        if content_hash is not None:
+            content_hash.update(data)
+        writer.write(data)
+
+    size = 0
+    try:
+        for chunk in iter_chunks(source, chunk_size):
+            if max_size is not None and size + len(chunk) > max_size:
+                write(chunk[: max_size - size])
+                size = max_size
+                write(TRUNCATED_NOTE.format(size=max_size).encode("utf-8"))
+                break
+            write(chunk)
+            size += len(chunk)
+        if compressor is not None:
+            compressor, data = None, compressor.flush()
+            write(data)
+    except BaseException:
+        writer.discard()
+        raise
+
+    if content_hash is None:
+        writer.close()
+        return size
+
+    digest = content_hash.hexdigest()
+    writer.close(digest)
+    if whole_file:
+        index.add_path_digest(source, digest)
+    return size
@@ -0,0 +1,143 @@
+"""
+Cached step functions.
+
+``rewrite_step(..., cache=...)`` memoises expensive setup helpers (login,
+token fetch, schema load) across tests. Results are kept in a StepCache keyed
+by the call arguments, bounded in size (LRU) and optionally in age (TTL). A
+cache hit returns the stored result and records a step with a ``cached``
+parameter instead of running the function.
+
+Caches live for the whole session, or with ``scope="module"`` until the
+pytest plugin moves on to the next test module.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+SCOPES = ("session", "module")
+
+# Every StepCache, for clearing at scope boundaries
+_caches: "weakref.WeakSet[StepCache]" = weakref.WeakSet()
+
+
+class StepCache:
+    """
+    LRU cache of step function results.
+
+    Example:
+        >>> tokens = StepCache(max_size=16, ttl=300)
+        >>> @rewrite_step("Get token for {user}", params=["user"], cache=tokens)
+        >>> def get_token(user):
+        >>>     return auth.login(user)
+    """
+
+    def __init__(
+        self, max_size: int = 128, ttl: Optional[float] = None, scope: str = "session"
+    ) -> None:
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_size: Maximum number of results kept (default: 128)
+            ttl: Seconds a result stays valid (default: no expiry)
+            scope: "session" or "module": clear the cache after each test
+                module (default: "session")
+
+        Raises:
+            ValueError: If the scope is unknown or max_size is not positive
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown cache scope: {scope!r}")
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.scope = scope
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time or None, result)
+        self._entries: "OrderedDict[Any, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    @staticmethod
+    def make_key(func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """
+        Build the key of a call.
+
+        Args:
+            func: Called function
+            args: Positional arguments
+            kwargs: Keyword arguments
+
+        Returns:
+            Hashable key, or None if an argument is not hashable
+        """
+        key = (func, args, tuple(sorted(kwargs.items()))) if kwargs else (func, args)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        """
+        Look up a result.
+
+        Args:
+            key: Key built by make_key()
+
+        Returns:
+            Tuple of (True, result), or (False, None) if the key is missing or
+            expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+        return False, None
+
+    def put(self, key: Any, value: Any) -> None:
+        """
+        Store a result, evicting the least recently used one when full.
+
+        Args:
+            key: Key built by make_key()
+            value: Result to store
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every result."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Number of stored results, including expired ones not looked up yet."""
+        return len(self._entries)
+
+
+def clear_step_caches(scope: Optional[str] = None) -> None:
+    """
+    Clear step caches.
+
+    Args:
+        scope: Only clear caches of this scope (default: all caches)
+    """
+    for cache in list(_caches):
+        if scope is None or cache.scope == scope:
+            cache.clear()
@@ -0,0 +1,143 @@
+"""
+Command line interface.
+
+Usage:
+    allure-step-rewriter rewrite RESULTS_DIR [--map OLD=NEW] [--rules FILE]
+                                             [--collapse] [--workers N]
+    allure-step-rewriter compact RESULTS_DIR [--workers N]
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+from allure_step_rewriter.results import (
+    TitleRules,
+    compact_directory,
+    rewrite_directory,
+)
+
+
+def _parse_mapping(value: str) -> List[str]:
+    """Parse an OLD=NEW title mapping."""
+    old, separator, new = value.partition("=")
+    if not separator or not old:
+        raise argparse.ArgumentTypeError(f"expected OLD=NEW, got {value!r}")
+    return [old, new]
+
+
+def _format_size(size: int) -> str:
+    """Format a byte count for humans."""
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(value) < 1024 or unit == "GiB":
+            break
+        value /= 1024
+    return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(
+        prog="allure-step-rewriter",
+        description="Post-process existing allure-results directories.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rewrite = commands.add_parser(
+        "rewrite",
+        help="Rewrite step titles and collapse single-child nesting",
+    )
+    rewrite.add_argument("results_dir", help="allure-results directory")
+    rewrite.add_argument(
+        "--map",
+        dest="mappings",
+        action="append",
+        type=_parse_mapping,
+        default=[],
+        metavar="OLD=NEW",
+        help="Rename steps titled OLD to NEW (repeatable)",
+    )
+    rewrite.add_argument(
+        "--rules",
+        metavar="FILE",
+        help='JSON rules file: {"titles": {"old": "new"}, '
+        '"patterns": [["regex", "replacement"]]}',
+    )
+    rewrite.add_argument(
+        "--collapse",
+        action="store_true",
+        help="Merge steps that only wrap a single child step with the same "
+        "title, or a title the rules rename to it",
+    )
+    rewrite.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: CPU count)",
+    )
+
+    compact = commands.add_parser(
+        "compact",
+        help="Merge repeated steps, drop passthrough steps, dedupe attachments",
+    )
+    compact.add_argument("results_dir", help="allure-results directory")
+    compact.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: CPU count)",
+    )
+    return parser
+
+
+def _rewrite(args: argparse.Namespace) -> int:
+    """Run the rewrite command."""
+    rules = TitleRules.from_file(args.rules) if args.rules else TitleRules()
+    rules.titles.update(dict(args.mappings))
+    if not rules and not args.collapse:
+        print("Nothing to do: pass --map, --rules or --collapse", file=sys.stderr)
+        return 2
+
+    report = rewrite_directory(args.results_dir, rules, args.collapse, args.workers)
+    for path, error in report.failed:
+        print(f"Could not rewrite {path}, left unchanged: {error}", file=sys.stderr)
+    print(
+        f"Rewrote {report.rewritten} of {report.files} result files in "
+        f"{args.results_dir}"
+    )
+    return 1 if report.failed else 0
+
+
+def _compact(args: argparse.Namespace) -> int:
+    """Run the compact command."""
+    report = compact_directory(args.results_dir, args.workers)
+    print(
+        f"Compacted {report.compacted} of {report.files} files in "
+        f"{args.results_dir}: removed {report.steps_removed} steps and "
+        f"{report.attachments_removed} duplicate attachments, "
+        f"saved {_format_size(report.bytes_saved)}"
+    )
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the command line interface.
+
+    Args:
+        argv: Command line arguments (default: sys.argv[1:])
+
+    Returns:
+        Exit code
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == "rewrite":
+        return _rewrite(args)
+    if args.command == "compact":
+        return _compact(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
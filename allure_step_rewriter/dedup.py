@@ -0,0 +1,199 @@
+"""
+Content-addressed attachment deduplication.
+
+Streamed attachments are hashed while they are written. ContentIndex maps
+recent content digests to the attachment file already holding that content,
+so an identical payload is referenced from every step but written once per
+results directory. Files attached by path also remember their digest by
+path, size and modification time, so hot payloads are not read again.
+
+Both maps are LRU-bounded; forgetting an entry only costs a duplicate file.
+Files referenced more than once are counted, so that removing one reference
+(e.g. when the detail mode prunes a passing test) keeps the file. Paths are
+normalized with os.path.abspath, so that callers spelling a results directory
+differently (e.g. with "..") agree on its files.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Hash of attachment contents
+HASH_NAME = "sha256"
+
+
+def new_hash() -> Any:
+    """Create a content hash object."""
+    return hashlib.new(HASH_NAME)
+
+
+def _stat_key(path: Any) -> Optional[Tuple[str, int, int]]:
+    """Get the (path, size, mtime) key of a file, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return os.path.realpath(path), stat.st_size, stat.st_mtime_ns
+
+
+class ContentIndex:
+    """
+    LRU index of attachment contents.
+
+    Example:
+        >>> index = ContentIndex(max_entries=1024)
+        >>> index.add("ab12...", "/results/1-attachment.png")
+        >>> index.find("ab12...", "/results")
+        '/results/1-attachment.png'
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        """
+        Initialize an empty index.
+
+        Args:
+            max_entries: Number of remembered digests and of remembered
+                source files (default: 4096)
+        """
+        self.max_entries = max_entries
+        self._files: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._path_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._references: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, entries: "OrderedDict[Any, str]", key: Any, value: str) -> None:
+        """Insert an LRU entry, evicting the oldest one when full."""
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def find(self, digest: str, directory: str) -> Optional[str]:
+        """
+        Find the file of a directory holding some content.
+
+        Args:
+            digest: Content digest
+            directory: Results directory
+
+        Returns:
+            File path, or None if the content is not known
+        """
+        key = (os.path.abspath(directory), digest)
+        with self._lock:
+            path = self._files.get(key)
+            if path is None:
+                return None
+            if not os.path.exists(path):
+                del self._files[key]
+                return None
+            self._files.move_to_end(key)
+        return path
+
+    def add(self, digest: str, path: str) -> None:
+        """
+        Remember the file holding some content.
+
+        Args:
+            digest: Content digest
+            path: File path
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._remember(self._files, (os.path.dirname(path), digest), path)
+
+    def reference(self, path: str) -> None:
+        """
+        Count one more reference to a file found with find().
+
+        Args:
+            path: File path
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._references[path] = self._references.get(path, 1) + 1
+
+    def release(self, path: str) -> bool:
+        """
+        Drop one reference to a file.
+
+        Args:
+            path: File path
+
+        Returns:
+            True if no references remain and the file may be removed
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._references.get(path)
+            if count is None:
+                for key in [key for key, value in self._files.items() if value == path]:
+                    del self._files[key]
+                return True
+            if count > 2:
+                self._references[path] = count - 1
+            else:
+                del self._references[path]
+            return False
+
+    def path_digest(self, path: Any) -> Optional[str]:
+        """
+        Get the remembered digest of an unchanged file.
+
+        Args:
+            path: Source file path
+
+        Returns:
+            Digest, or None if the file is not known or changed since
+        """
+        key = _stat_key(path)
+        if key is None:
+            return None
+        with self._lock:
+            digest = self._path_digests.get(key)
+            if digest is not None:
+                self._path_digests.move_to_end(key)
+        return digest
+
+    def add_path_digest(self, path: Any, digest: str) -> None:
+        """
+        Remember the digest of a source file.
+
+        Args:
+            path: Source file path
+            digest: Digest of its content
+        """
+        key = _stat_key(path)
+        if key is not None:
+            with self._lock:
+                self._remember(self._path_digests, key, digest)
+
+    def clear(self) -> None:
+        """Forget everything."""
+        with self._lock:
+            self._files.clear()
+            self._path_digests.clear()
+            self._references.clear()
+
+
+# Index used by streamed attachments, or None when deduplication is disabled
+_content_index: Optional[ContentIndex] = ContentIndex()
+
+
+def set_deduplication(enabled: bool = True, max_entries: int = 4096) -> None:
+    """
+    Enable or disable attachment deduplication.
+
+    Args:
+        enabled: Write identical streamed attachments once (default: True)
+        max_entries: Size of the LRU index (default: 4096)
+    """
+    global _content_index
+    _content_index = ContentIndex(max_entries) if enabled else None
+
+
+def get_content_index() -> Optional[ContentIndex]:
+    """Get the attachment index, or None when deduplication is disabled."""
+    return _content_index
@@ -0,0 +1,256 @@
+"""
+Failure-focused detail mode.
+
+In ``"failure"`` mode the full step tree is written only for tests that fail
+or break. For every other test only the top-level steps created by the
+rewriter are kept: their nested steps are dropped right before the result
+file is serialised. Attachments the rewriter adds to those nested steps are
+held in memory until the outcome is known, so they are only written for
+failed tests; other attachments of dropped steps are removed from the
+results directory.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import allure_commons
+
+from allure_step_rewriter.dedup import get_content_index
+
+DETAIL_FULL = "full"
+DETAIL_FAILURE = "failure"
+DETAIL_MODES = (DETAIL_FULL, DETAIL_FAILURE)
+
+# Statuses for which the full step tree is always kept
+_FAILED_STATUSES = ("failed", "broken")
+
+# Session-wide default and the mode of the test item currently running
+_default_mode = DETAIL_FULL
+_item_mode: Optional[str] = None
+
+# Steps created by the rewriter in failure mode since the last report, by id
+_rewriter_steps: Dict[int, Any] = {}
+
+# Per thread: rewriter steps still open by uuid, outermost first, and
+# attachment bodies held back until the outcome of the test is known, by
+# file name
+_local = threading.local()
+
+
+def _open_steps() -> Dict[Any, Any]:
+    """Get the open rewriter steps of the current thread."""
+    steps = getattr(_local, "open_steps", None)
+    if steps is None:
+        steps = _local.open_steps = {}
+    return steps
+
+
+def _pending_attachments() -> Dict[str, Any]:
+    """Get the attachments held back on the current thread."""
+    attachments = getattr(_local, "pending_attachments", None)
+    if attachments is None:
+        attachments = _local.pending_attachments = {}
+    return attachments
+
+
+def _validate_mode(mode: str) -> str:
+    """Validate a detail mode name."""
+    if mode not in DETAIL_MODES:
+        raise ValueError(
+            f"Unknown step detail mode {mode!r}, expected one of {DETAIL_MODES}"
+        )
+    return mode
+
+
+def set_detail_mode(mode: str) -> None:
+    """
+    Set the session-wide step detail mode.
+
+    Args:
+        mode: ``"full"`` (default) or ``"failure"``
+    """
+    global _default_mode
+    _default_mode = _validate_mode(mode)
+
+
+def set_item_detail_mode(mode: Optional[str]) -> None:
+    """
+    Set the detail mode for the test item currently running.
+
+    Args:
+        mode: Detail mode, or None to fall back to the session-wide default
+    """
+    global _item_mode
+    _item_mode = _validate_mode(mode) if mode is not None else None
+
+
+def get_detail_mode() -> str:
+    """Get the detail mode in effect for the current test."""
+    return _item_mode or _default_mode
+
+
+def rewriter_step_started(uuid: Any, step: Any) -> None:
+    """
+    Track a step created by the rewriter in failure mode.
+
+    Args:
+        uuid: Allure uuid of the step
+        step: Allure step result
+    """
+    _rewriter_steps[id(step)] = step
+    _open_steps()[uuid] = step
+
+
+def rewriter_step_stopped(uuid: Any) -> None:
+    """Stop tracking an open step created by the rewriter."""
+    _open_steps().pop(uuid, None)
+
+
+def tracking_steps() -> bool:
+    """Check whether a top-level rewriter step is open in failure mode."""
+    return bool(_open_steps())
+
+
+def defers_attachments_of(step: Any) -> bool:
+    """
+    Check whether attachments of a step are held until the test outcome.
+
+    Args:
+        step: Allure item receiving the attachment
+
+    Returns:
+        True in failure mode if the step is nested below an open top-level
+        rewriter step, so it is dropped if the test passes
+    """
+    open_steps = _open_steps()
+    if not open_steps or get_detail_mode() != DETAIL_FAILURE:
+        return False
+    return step is not next(iter(open_steps.values()))
+
+
+def defer_attachment(file_name: str, body: Any) -> None:
+    """
+    Hold an attachment body until the test outcome is known.
+
+    Args:
+        file_name: File name the attachment is referenced by
+        body: Attachment content
+    """
+    _pending_attachments()[file_name] = body
+
+
+def prune_step_tree(
+    result: Any, rewriter_steps: Optional[Mapping[int, Any]] = None
+) -> List[str]:
+    """
+    Drop everything below the top-level rewriter steps of a test result.
+
+    Other steps are kept, and searched for rewriter steps.
+
+    Args:
+        result: Allure test result (or any item with ``steps``)
+        rewriter_steps: Steps created by the rewriter, by id (default: treat
+            every top-level step as one)
+
+    Returns:
+        Attachment sources referenced only by the dropped steps
+    """
+    dropped_sources: List[str] = []
+    _prune(result.steps, rewriter_steps, dropped_sources)
+    return dropped_sources
+
+
+def _prune(
+    steps: List[Any], rewriter_steps: Optional[Mapping[int, Any]], sources: List[str]
+) -> None:
+    """Prune the rewriter steps of a list of steps, recursively."""
+    for step in steps:
+        if rewriter_steps is None or id(step) in rewriter_steps:
+            _collect_attachments(step.steps, sources)
+            step.steps = []
+        else:
+            _prune(step.steps, rewriter_steps, sources)
+
+
+def _collect_attachments(steps: List[Any], sources: List[str]) -> None:
+    """Collect attachment sources of a list of steps, recursively."""
+    for step in steps:
+        sources.extend(attachment.source for attachment in step.attachments)
+        _collect_attachments(step.steps, sources)
+
+
+class StepTreePruner:
+    """
+    Allure plugin that prunes step trees of passing tests.
+
+    Runs before the file logger writes the result, so the dropped steps never
+    reach the results directory.
+    """
+
+    def __init__(
+        self,
+        report_dir: Optional[str] = None,
+        remove: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """
+        Initialize the pruner.
+
+        Args:
+            report_dir: Allure results directory, used to remove attachments
+                of the dropped steps (optional)
+            remove: Function removing an attachment by file name, used
+                instead of removing it from report_dir, e.g.
+                BackgroundFileLogger.remove (optional)
+        """
+        self.report_dir = report_dir
+        self.remove = remove
+
+    @allure_commons.hookimpl(tryfirst=True)
+    def report_result(self, result: Any) -> None:
+        """
+        Prune the step tree of a passing test before it is reported.
+
+        Held attachments are written unless they belonged to dropped steps.
+        """
+        rewriter_steps = dict(_rewriter_steps)
+        _rewriter_steps.clear()
+        if get_detail_mode() != DETAIL_FAILURE or result.status in _FAILED_STATUSES:
+            self.flush()
+            return
+
+        dropped_sources = prune_step_tree(result, rewriter_steps)
+        pending_attachments = _pending_attachments()
+        for source in dropped_sources:
+            pending_attachments.pop(source, None)
+        self.flush()
+        index = get_content_index()
+        if index is not None and self.report_dir:
+            # Deduplicated attachments may still be referenced elsewhere
+            dropped_sources = [
+                source
+                for source in dropped_sources
+                if index.release(os.path.join(self.report_dir, source))
+            ]
+        if self.remove is not None:
+            for source in dropped_sources:
+                self.remove(source)
+            return
+        if not self.report_dir:
+            return
+
+        for source in dropped_sources:
+            try:
+                os.remove(os.path.join(self.report_dir, source))
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        """Write the attachments held on the current thread."""
+        pending_attachments = _pending_attachments()
+        while pending_attachments:
+            file_name = next(iter(pending_attachments))
+            body = pending_attachments.pop(file_name)
+            allure_commons.plugin_manager.hook.report_attached_data(
+                body=body, file_name=file_name
+            )
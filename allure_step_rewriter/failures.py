@@ -0,0 +1,160 @@
+"""
+Compact failure details of steps.
+
+allure-pytest formats the full traceback of an exception for every step it
+propagates through. After set_failure_capture(), AllureSink records an
+exception once, on the innermost step it fails, with a traceback limited to
+max_frames frames and without the frames of test framework modules. Outer
+steps failed by the same exception only get their status and a message
+naming that step.
+"""
+
+import threading
+import traceback
+from types import FrameType, TracebackType
+from typing import Iterable, Optional, Tuple
+
+import pytest
+
+# Number of traceback frames recorded by default
+DEFAULT_MAX_FRAMES = 10
+
+# Modules whose frames are left out of recorded tracebacks by default
+DEFAULT_HIDDEN_MODULES = (
+    "allure",
+    "allure_commons",
+    "allure_pytest",
+    "allure_step_rewriter",
+    "_pytest",
+    "pluggy",
+)
+
+# Frames recorded per failure, or None to let allure-pytest record failures
+_max_frames: Optional[int] = None
+_hidden_modules: Tuple[str, ...] = DEFAULT_HIDDEN_MODULES
+
+# Last exception recorded on each thread and the title of its step
+_local = threading.local()
+
+
+def set_failure_capture(
+    max_frames: Optional[int] = DEFAULT_MAX_FRAMES,
+    hidden_modules: Iterable[str] = DEFAULT_HIDDEN_MODULES,
+) -> None:
+    """
+    Record each step failure once, with a short traceback.
+
+    Args:
+        max_frames: Traceback frames recorded, innermost first; None to
+            restore the full details of allure-pytest (default: 10)
+        hidden_modules: Modules, with their submodules, whose frames are
+            left out of the traceback (default: allure, pytest and pluggy)
+
+    Raises:
+        ValueError: If max_frames is negative
+    """
+    global _max_frames, _hidden_modules
+
+    if max_frames is not None and max_frames < 0:
+        raise ValueError(f"max_frames must not be negative, got {max_frames}")
+    _max_frames = max_frames
+    _hidden_modules = tuple(hidden_modules)
+    clear_failure_record()
+
+
+def failure_capture_enabled() -> bool:
+    """Check whether step failures are recorded by failure_details()."""
+    return _max_frames is not None
+
+
+def step_status(exc_val: Optional[BaseException]) -> str:
+    """
+    Get the Allure status of a step finished with exc_val.
+
+    Mirrors allure-pytest: assertion errors and ``pytest.fail()`` fail the
+    step, ``pytest.skip()`` skips it and other exceptions break it.
+
+    Args:
+        exc_val: Exception leaving the step, if any
+
+    Returns:
+        "passed", "failed", "skipped" or "broken"
+    """
+    if exc_val is None:
+        return "passed"
+    if isinstance(exc_val, (AssertionError, pytest.fail.Exception)):
+        return "failed"
+    if isinstance(exc_val, pytest.skip.Exception):
+        return "skipped"
+    return "broken"
+
+
+def clear_failure_record() -> None:
+    """
+    Forget the exception last recorded on the current thread.
+
+    Called when the outermost step of the thread or the test closes, so the
+    exception, its traceback and frame locals are not kept alive, and the
+    same instance raised again is recorded again.
+    """
+    _local.recorded = None
+
+
+def _is_hidden(frame: FrameType) -> bool:
+    """Check whether a frame belongs to a hidden module."""
+    module = frame.f_globals.get("__name__", "")
+    return any(
+        module == hidden or module.startswith(hidden + ".")
+        for hidden in _hidden_modules
+    )
+
+
+def format_traceback(tb: Optional[TracebackType], max_frames: int) -> str:
+    """
+    Format the innermost frames of a traceback.
+
+    Only the kept frames are formatted, so the cost does not grow with the
+    depth of the stack.
+
+    Args:
+        tb: Traceback
+        max_frames: Maximum number of frames
+
+    Returns:
+        Formatted frames, preceded by the number of frames left out
+    """
+    frames = [
+        (frame, lineno)
+        for frame, lineno in traceback.walk_tb(tb)
+        if not _is_hidden(frame)
+    ]
+    kept = frames[-max_frames:] if max_frames else []
+    lines = traceback.StackSummary.extract(kept).format()
+    if len(frames) > len(kept):
+        lines.insert(0, f"... {len(frames) - len(kept)} outer frames not shown\n")
+    return "".join(lines)
+
+
+def failure_details(exc_val: BaseException, title: str) -> Tuple[str, Optional[str]]:
+    """
+    Get the message and traceback recorded on a step failed by exc_val.
+
+    The first step of the thread failed by an exception, its innermost one,
+    gets the exception and its traceback; outer steps failed by the same
+    exception get a message naming that step and no traceback. The last
+    recorded exception is kept until clear_failure_record().
+
+    Args:
+        exc_val: Exception leaving the step
+        title: Step title
+
+    Returns:
+        Tuple of message and traceback (None for linked steps)
+    """
+    recorded = getattr(_local, "recorded", None)
+    if recorded is not None and recorded[0] is exc_val:
+        return f"{type(exc_val).__name__} raised in step {recorded[1]!r}", None
+
+    _local.recorded = (exc_val, title)
+    message = "".join(traceback.format_exception_only(type(exc_val), exc_val))
+    return message.strip(), format_traceback(exc_val.__traceback__, _max_frames or 0)
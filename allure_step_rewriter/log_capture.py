@@ -0,0 +1,209 @@
+"""
+Per-step log capture.
+
+Steps created with ``rewrite_step(..., capture_logs=True)``, or every step
+after set_step_log_capture(True), collect the ``logging`` records emitted on
+their thread while they run, and attach them as a single "Log" attachment
+when they close. Records go to the innermost capturing step of the thread:
+steps merged into an outer step log into it. Each step keeps at most
+max_records records in a ring buffer, so a chatty step costs a bounded
+amount of memory and one attachment.
+
+Records must pass the level of their logger to reach the handler: set the
+level of the root logger (or pytest's ``log_level``) to capture INFO or
+DEBUG records.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Union
+
+import allure
+
+from allure_step_rewriter.sinks import get_sink
+
+# capture_logs value attaching the records of failed steps only
+LOGS_ON_FAILURE = "failure"
+
+DEFAULT_MAX_RECORDS = 200
+
+DEFAULT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_LogMode = Union[bool, str]
+
+# Innermost capturing step of each thread
+_captures: Dict[int, "StepLogCapture"] = {}
+
+# Session-wide settings for steps that do not set capture_logs
+_default_mode: _LogMode = False
+_max_records = DEFAULT_MAX_RECORDS
+_handler: Optional["StepLogHandler"] = None
+
+
+def check_log_mode(mode: Union[bool, str, None]) -> None:
+    """
+    Check a capture_logs value.
+
+    Raises:
+        ValueError: If the value is not None, a bool or "failure"
+    """
+    if mode not in (None, True, False, LOGS_ON_FAILURE):
+        raise ValueError(
+            f"capture_logs must be a bool or {LOGS_ON_FAILURE!r}, got {mode!r}"
+        )
+
+
+class StepLogHandler(logging.Handler):
+    """Handler passing records to the innermost capturing step."""
+
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        """
+        Initialize the handler.
+
+        Args:
+            level: Minimum level of captured records (default: all records)
+        """
+        super().__init__(level)
+        self.setFormatter(logging.Formatter(DEFAULT_FORMAT))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Buffer a record in the capturing step of the current thread."""
+        capture = _captures.get(threading.get_ident())
+        if capture is not None:
+            capture.records.append(record)
+            capture.total += 1
+
+
+def _install_handler(level: int = logging.NOTSET) -> "StepLogHandler":
+    """Add the handler to the root logger, once."""
+    global _handler
+    if _handler is None:
+        _handler = StepLogHandler(level)
+        logging.getLogger().addHandler(_handler)
+    else:
+        _handler.setLevel(level)
+    return _handler
+
+
+def set_step_log_capture(
+    mode: _LogMode = False,
+    max_records: int = DEFAULT_MAX_RECORDS,
+    level: int = logging.NOTSET,
+) -> None:
+    """
+    Capture the log records of every step by default.
+
+    Args:
+        mode: True to attach the records of every step, "failure" for failed
+            steps only, False to capture only steps with capture_logs set
+        max_records: Records kept per step; older ones are dropped
+            (default: 200)
+        level: Minimum level of captured records (default: all records)
+
+    Raises:
+        ValueError: If mode is invalid or max_records is not positive
+    """
+    global _default_mode, _max_records, _handler
+
+    check_log_mode(mode)
+    if max_records < 1:
+        raise ValueError(f"max_records must be at least 1, got {max_records}")
+    _default_mode = mode
+    _max_records = max_records
+    if mode or level != logging.NOTSET:
+        _install_handler(level)
+    elif _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+class StepLogCapture:
+    """Log records of one step."""
+
+    __slots__ = ("mode", "records", "total", "_parent", "_active")
+
+    def __init__(self, mode: _LogMode, max_records: int) -> None:
+        """
+        Initialize an empty buffer.
+
+        Args:
+            mode: True or "failure", see set_step_log_capture()
+            max_records: Records kept; older ones are dropped
+        """
+        self.mode = mode
+        self.records: Deque[logging.LogRecord] = deque(maxlen=max_records)
+        self.total = 0
+        self._parent: Optional[StepLogCapture] = None
+        self._active = False
+
+    @classmethod
+    def start(cls, mode: Union[bool, str, None] = None) -> Optional["StepLogCapture"]:
+        """
+        Start capturing the records of a step on the current thread.
+
+        Args:
+            mode: Explicit step setting, or None for the session-wide one
+
+        Returns:
+            Capture, or None if the step does not capture its records
+        """
+        if mode is None:
+            mode = _default_mode
+        if not mode:
+            return None
+        if _handler is None:
+            _install_handler()
+
+        capture = cls(mode, _max_records)
+        capture.resume()
+        return capture
+
+    def resume(self) -> None:
+        """Make this the capturing step of the current thread."""
+        thread_id = threading.get_ident()
+        self._parent = _captures.get(thread_id)
+        _captures[thread_id] = self
+        self._active = True
+
+    def suspend(self) -> None:
+        """Give the thread back to the capturing step it replaced."""
+        if not self._active:
+            return
+        self._active = False
+        thread_id = threading.get_ident()
+        if self._parent is None:
+            _captures.pop(thread_id, None)
+        else:
+            _captures[thread_id] = self._parent
+        self._parent = None
+
+    def finish(self, exc_val: Optional[BaseException]) -> None:
+        """
+        Stop capturing and attach the records.
+
+        Nothing is attached without records, or for a passed step in
+        "failure" mode. Must be called while the step is still open, so the
+        attachment lands on it.
+
+        Args:
+            exc_val: Exception leaving the step, if any
+        """
+        self.suspend()
+        if not self.records:
+            return
+        if self.mode == LOGS_ON_FAILURE and exc_val is None:
+            return
+
+        formatter = (
+            _handler.formatter
+            if _handler is not None
+            else logging.Formatter(DEFAULT_FORMAT)
+        )
+        lines = [formatter.format(record) for record in self.records]
+        dropped = self.total - len(self.records)
+        if dropped:
+            lines.insert(0, f"... {dropped} earlier records dropped")
+        get_sink().attach(
+            "\n".join(lines), name="Log", attachment_type=allure.attachment_type.TEXT
+        )
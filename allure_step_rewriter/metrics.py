@@ -0,0 +1,186 @@
+"""
+Rewriter metrics.
+
+StepMetrics counts the steps the rewriter created, merged into an outer step
+(overridden) and dropped by sampling, and the time spent reporting them: the
+time the rewriter's wrappers take outside the wrapped code, sink calls
+included. MeteredSink wraps the current sink to count created and overridden
+steps; the pytest plugin uses both for its per-test summary
+(``--allure-step-metrics``).
+"""
+
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from allure_step_rewriter.sinks import AttachmentWriter, StepSink
+
+
+class MetricsSnapshot(NamedTuple):
+    """Counter values at one point in time."""
+
+    created: int
+    overridden: int
+    dropped: int
+    overhead: float
+
+    def __sub__(self, other: "MetricsSnapshot") -> "MetricsSnapshot":
+        """Get the counts between two snapshots."""
+        return MetricsSnapshot(*(a - b for a, b in zip(self, other)))
+
+
+class StepMetrics:
+    """
+    Step counters and reporting time.
+
+    Counters are not locked: with steps on several threads they are
+    approximate.
+    """
+
+    def __init__(self) -> None:
+        """Initialize zero counters."""
+        self.created = 0
+        self.overridden = 0
+        self.dropped = 0
+        self.overhead = 0.0
+
+    def snapshot(self) -> MetricsSnapshot:
+        """Get the current counter values."""
+        return MetricsSnapshot(
+            self.created, self.overridden, self.dropped, self.overhead
+        )
+
+
+class MeteredSink(StepSink):
+    """Sink counting the steps of another sink."""
+
+    def __init__(self, sink: StepSink, metrics: StepMetrics) -> None:
+        """
+        Initialize the sink.
+
+        Args:
+            sink: Sink receiving the steps
+            metrics: Counters to update
+        """
+        self.sink = sink
+        self.metrics = metrics
+
+    @property
+    def recording(self) -> bool:
+        """Whether the wrapped sink records steps."""
+        return self.sink.recording
+
+    def start_step(self, title: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Open a step and count it as created."""
+        handle = self.sink.start_step(title, params)
+        self.metrics.created += 1
+        return handle
+
+    def stop_step(self, handle: Any, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Close a step."""
+        self.sink.stop_step(handle, exc_type, exc_val, exc_tb)
+
+    def override_step(self, handle: Any, title: str) -> None:
+        """Count a step merged into an open step."""
+        self.sink.override_step(handle, title)
+        self.metrics.overridden += 1
+
+    def annotate_step(self, handle: Any, params: Dict[str, str]) -> None:
+        """Add parameters to an open step."""
+        self.sink.annotate_step(handle, params)
+
+    def annotate_current_step(self, params: Dict[str, str]) -> None:
+        """Add parameters to the innermost open step."""
+        self.sink.annotate_current_step(params)
+
+    def attach(
+        self,
+        body: Any,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> None:
+        """Attach data to the innermost open step."""
+        self.sink.attach(body, name, attachment_type, extension)
+
+    def open_attachment(
+        self,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> Optional[AttachmentWriter]:
+        """Open a streamed attachment of the innermost open step."""
+        return self.sink.open_attachment(name, attachment_type, extension)
+
+
+# Metrics updated by the rewriter, or None when not collected
+_metrics: Optional[StepMetrics] = None
+
+
+def set_metrics(metrics: Optional[StepMetrics]) -> None:
+    """
+    Set the metrics counting dropped steps.
+
+    Created and overridden steps are counted by a MeteredSink.
+
+    Args:
+        metrics: Metrics instance, or None to stop counting
+    """
+    global _metrics
+    _metrics = metrics
+
+
+def get_metrics() -> Optional[StepMetrics]:
+    """Get the metrics counting dropped steps."""
+    return _metrics
+
+
+def record_dropped() -> None:
+    """Count a step dropped by sampling."""
+    if _metrics is not None:
+        _metrics.dropped += 1
+
+
+def start_overhead() -> Optional[float]:
+    """
+    Start timing rewriter work.
+
+    Returns:
+        Start time for add_overhead(), or None when metrics are not collected
+    """
+    return time.perf_counter() if _metrics is not None else None
+
+
+def add_overhead(started: Optional[float], excluded: float = 0.0) -> None:
+    """
+    Add the time since start_overhead() to the reporting overhead.
+
+    Args:
+        started: Value returned by start_overhead()
+        excluded: Time spent in the wrapped code meanwhile, in seconds
+    """
+    if started is not None and _metrics is not None:
+        _metrics.overhead += time.perf_counter() - started - excluded
+
+
+class TimedCall:
+    """Function timing its own calls, to leave them out of the overhead."""
+
+    __slots__ = ("func", "elapsed")
+
+    def __init__(self, func: Callable) -> None:
+        """
+        Initialize the timer.
+
+        Args:
+            func: Wrapped function
+        """
+        self.func = func
+        self.elapsed = 0.0
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        """Call the function and add its duration to elapsed."""
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.elapsed += time.perf_counter() - start
@@ -0,0 +1,78 @@
+"""
+Step observers.
+
+Observers are notified when the rewriter begins and ends a step, including
+overridden steps that produce no Allure step of their own. They are called
+whether or not Allure reporting is enabled, and only when at least one
+observer is registered.
+"""
+
+from typing import Optional, Tuple
+
+
+class StepObserver:
+    """
+    Base class for objects notified about every step the rewriter handles.
+
+    ``step_started`` is called after the Allure step is opened and
+    ``step_finished`` before it is closed, so observers may attach data to
+    the step.
+    """
+
+    def step_started(self, title: str, overridden: bool) -> None:
+        """
+        Called when a step begins.
+
+        Args:
+            title: Step title
+            overridden: True if the step was merged into an outer step
+        """
+
+    def step_finished(
+        self,
+        title: str,
+        overridden: bool,
+        wall_time: float,
+        cpu_time: float,
+        exc_val: Optional[BaseException],
+    ) -> None:
+        """
+        Called when a step ends.
+
+        Args:
+            title: Step title
+            overridden: True if the step was merged into an outer step
+            wall_time: Wall-clock duration in seconds
+            cpu_time: CPU time of the current thread in seconds
+            exc_val: Exception raised inside the step, if any
+        """
+
+
+# Registered observers, notified in registration order. Replaced rather than
+# modified, so steps can keep the observers they notified without a copy.
+_step_observers: Tuple[StepObserver, ...] = ()
+
+
+def add_step_observer(observer: StepObserver) -> None:
+    """
+    Register a step observer.
+
+    Args:
+        observer: Observer instance
+    """
+    global _step_observers
+    if observer not in _step_observers:
+        _step_observers += (observer,)
+
+
+def remove_step_observer(observer: StepObserver) -> None:
+    """
+    Unregister a step observer.
+
+    Args:
+        observer: Observer instance
+    """
+    global _step_observers
+    _step_observers = tuple(
+        registered for registered in _step_observers if registered is not observer
+    )
@@ -0,0 +1,202 @@
+"""
+Step parameters from function arguments.
+
+``rewrite_step(..., params=...)`` records selected arguments of the
+decorated function as step parameters. The signature is resolved once, when
+the function is decorated, and values are formatted with a size-capped repr:
+strings, bytes and containers are cut before they are formatted, and objects
+with a ``shape`` (DataFrames, arrays) are summarised instead of rendered.
+Parameters are only formatted for steps that are actually created.
+"""
+
+import inspect
+import reprlib
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# Default maximum length of a formatted parameter value
+DEFAULT_MAX_LENGTH = 100
+
+# Names not recorded when all arguments are selected
+_IMPLICIT_ARGUMENTS = ("self", "cls")
+
+_MISSING = object()
+
+_POSITIONAL_KINDS = (
+    inspect.Parameter.POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+)
+
+
+class BoundedRepr(reprlib.Repr):
+    """repr() that stops at a maximum length instead of formatting everything."""
+
+    def __init__(self, max_length: int = DEFAULT_MAX_LENGTH) -> None:
+        """
+        Initialize the limits.
+
+        Args:
+            max_length: Maximum length of the result (default: 100)
+        """
+        super().__init__()
+        self.max_length = max_length
+        self.maxstring = max_length
+        self.maxother = max_length
+        self.maxlong = max_length
+        self.maxlevel = 3
+        self.maxlist = self.maxtuple = self.maxset = self.maxfrozenset = 10
+        self.maxdeque = self.maxarray = self.maxdict = 10
+
+    def repr(self, x: Any) -> str:
+        """Format a value, truncated to max_length characters."""
+        text = super().repr(x)
+        if len(text) > self.max_length:
+            return text[: self.max_length - 3] + "..."
+        return text
+
+    def repr_bytes(self, x: bytes, level: int) -> str:
+        """Format the head of a bytes value."""
+        if len(x) <= self.max_length:
+            return repr(x)
+        suffix = f"... ({len(x)} bytes)"
+        return repr(x[: max(self.max_length - len(suffix) - 3, 0)]) + suffix
+
+    def repr_bytearray(self, x: bytearray, level: int) -> str:
+        """Format the head of a bytearray value."""
+        return self.repr_bytes(bytes(x[: self.max_length + 1]), level)
+
+    def repr_instance(self, x: Any, level: int) -> str:
+        """Summarise array-like objects by shape, format others."""
+        shape = getattr(x, "shape", None)
+        if isinstance(shape, tuple):
+            return f"<{type(x).__name__} shape={shape!r}>"
+        return super().repr_instance(x, level)
+
+
+def format_params(values: Mapping[str, Any], max_length: int) -> Dict[str, str]:
+    """
+    Format parameter values with a bounded repr.
+
+    Args:
+        values: Parameter names and values
+        max_length: Maximum length of a formatted value
+
+    Returns:
+        Parameter names and formatted values
+    """
+    formatter = BoundedRepr(max_length)
+    return {name: formatter.repr(value) for name, value in values.items()}
+
+
+def format_title(title: str, params: Optional[Mapping[str, str]]) -> str:
+    """
+    Fill ``{name}`` placeholders of a title with formatted parameters.
+
+    Args:
+        title: Step title
+        params: Formatted parameters (optional)
+
+    Returns:
+        Formatted title, or the title itself if it has no placeholders or
+        refers to unknown parameters
+    """
+    if not params or "{" not in title:
+        return title
+    try:
+        return title.format(**params)
+    except (KeyError, IndexError, ValueError):
+        return title
+
+
+class ParamRecorder:
+    """
+    Records selected arguments of a function as step parameters.
+
+    Example:
+        >>> recorder = ParamRecorder(get_user, ["user_id"])
+        >>> recorder.capture((42,), {})
+        {'user_id': '42'}
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        names: Union[bool, str, Iterable[str]] = True,
+        max_length: int = DEFAULT_MAX_LENGTH,
+    ) -> None:
+        """
+        Resolve where each selected argument is passed.
+
+        Args:
+            func: Decorated function
+            names: Argument names to record, a single name, or True for all
+                arguments except ``self`` and ``cls``
+            max_length: Maximum length of a formatted value (default: 100)
+
+        Raises:
+            ValueError: If a name is not an argument of the function
+        """
+        self.max_length = max_length
+        parameters = inspect.signature(func).parameters
+
+        if names is True:
+            selected = [name for name in parameters if name not in _IMPLICIT_ARGUMENTS]
+        else:
+            selected = [names] if isinstance(names, str) else list(names)
+            unknown = [name for name in selected if name not in parameters]
+            if unknown:
+                raise ValueError(
+                    f"{func.__qualname__}() has no arguments named "
+                    f"{', '.join(unknown)}"
+                )
+
+        # (name, kind, position, default) of each selected argument
+        self._arguments: List[Tuple[str, Any, Optional[int], Any]] = []
+        for position, (name, parameter) in enumerate(parameters.items()):
+            if name not in selected:
+                continue
+            default = (
+                _MISSING
+                if parameter.default is inspect.Parameter.empty
+                else parameter.default
+            )
+            self._arguments.append(
+                (
+                    name,
+                    parameter.kind,
+                    position if parameter.kind in _POSITIONAL_KINDS else None,
+                    default,
+                )
+            )
+        self._positional_count = sum(
+            1
+            for parameter in parameters.values()
+            if parameter.kind in _POSITIONAL_KINDS
+        )
+        self._names = set(parameters)
+
+    def capture(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Format the selected arguments of a call.
+
+        Args:
+            args: Positional arguments of the call
+            kwargs: Keyword arguments of the call
+
+        Returns:
+            Parameter names and formatted values
+        """
+        values: Dict[str, Any] = {}
+        for name, kind, position, default in self._arguments:
+            if kind is inspect.Parameter.VAR_POSITIONAL:
+                value = args[self._positional_count :]
+            elif kind is inspect.Parameter.VAR_KEYWORD:
+                value = {
+                    key: item for key, item in kwargs.items() if key not in self._names
+                }
+            elif position is not None and position < len(args):
+                value = args[position]
+            else:
+                value = kwargs.get(name, default)
+            if value is not _MISSING:
+                values[name] = value
+        return format_params(values, self.max_length)
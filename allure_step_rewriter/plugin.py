@@ -0,0 +1,610 @@
+"""
+Pytest plugin for allure-step-rewriter.
+
+Installed with the package as a ``pytest11`` entry point, so it is active in
+every pytest session; ``-p no:allure_step_rewriter.plugin`` disables it.
+Without options it only isolates the rewriter state of each test.
+"""
+
+import os
+import threading
+import warnings
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+import allure_commons
+import pytest
+
+from allure_step_rewriter import detail
+from allure_step_rewriter.caching import clear_step_caches
+from allure_step_rewriter.failures import clear_failure_record, set_failure_capture
+from allure_step_rewriter.log_capture import (
+    DEFAULT_MAX_RECORDS,
+    LOGS_ON_FAILURE,
+    set_step_log_capture,
+)
+from allure_step_rewriter.metrics import (
+    MeteredSink,
+    MetricsSnapshot,
+    StepMetrics,
+    set_metrics,
+)
+from allure_step_rewriter.observers import add_step_observer, remove_step_observer
+from allure_step_rewriter.profiling import set_profiled_titles
+from allure_step_rewriter.rewrite_step import (
+    AllureStepWrapper,
+    _active_step_contexts,
+    _new_rules_frame,
+    _pop_frame,
+    _push_frame,
+    set_collapse_recursion,
+)
+from allure_step_rewriter.sampling import StepSampler, set_sampler
+from allure_step_rewriter.sinks import (
+    MemorySink,
+    NullSink,
+    StepSink,
+    capture_steps,
+    get_sink,
+    set_sink,
+)
+from allure_step_rewriter.slow_steps import set_slow_step_thresholds
+from allure_step_rewriter.timing import TimingRecorder
+from allure_step_rewriter.trace import ChromeTraceWriter
+from allure_step_rewriter.writer import (
+    BackgroundFileLogger,
+    install_background_writer,
+    uninstall_background_writer,
+)
+
+DETAIL_MARK = "allure_step_detail"
+REWRITE_MARK = "rewrite_step"
+
+# Title rules frame and test step of a test, compiled from its markers
+_CompiledMarks = Tuple[Optional[Dict[str, Any]], Optional[AllureStepWrapper]]
+_compiled_marks_key = pytest.StashKey[_CompiledMarks]()
+
+_pruner: Optional[detail.StepTreePruner] = None
+_timing_recorder: Optional[TimingRecorder] = None
+_trace_writer: Optional[ChromeTraceWriter] = None
+_background_writer: Optional[BackgroundFileLogger] = None
+_sampler: Optional[StepSampler] = None
+_metrics: Optional[StepMetrics] = None
+_test_metrics: Dict[str, MetricsSnapshot] = {}
+_previous_sink: Optional[StepSink] = None
+
+# Ini options whose session-wide setting the plugin changed; settings made
+# through the API, e.g. in conftest.py, are left alone otherwise
+_ini_settings: Set[str] = set()
+
+# Number of tests listed in the metrics summary
+METRICS_SUMMARY_TESTS = 10
+
+
+class StepStateWarning(pytest.PytestWarning):
+    """Warning emitted when a test leaves rewrite_step contexts open."""
+
+
+def _ini_value(config: pytest.Config, name: str) -> Any:
+    """Get the value of an ini option, or None if it is not set."""
+    value = config.getini(name)
+    if value is None or value == "" or value == []:
+        return None
+    return value
+
+
+def _float_or_none(value: Optional[str]) -> Optional[float]:
+    """Convert an optional ini value to float."""
+    return float(value) if value else None
+
+
+def _worker_path(config: pytest.Config, path: str) -> str:
+    """
+    Get the output path of the current process.
+
+    pytest-xdist workers insert their id before the extension, so they do
+    not overwrite each other's file: ``trace.json`` becomes
+    ``trace.gw0.json``.
+    """
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{workerinput['workerid']}{ext}"
+
+
+def _log_mode(value: str) -> Any:
+    """
+    Convert the allure_step_capture_logs ini value.
+
+    Raises:
+        pytest.UsageError: If the value is not true, false or failure
+    """
+    value = value.strip().lower()
+    if value in ("true", "1", "yes", "on"):
+        return True
+    if value in ("false", "0", "no", "off", ""):
+        return False
+    if value == LOGS_ON_FAILURE:
+        return LOGS_ON_FAILURE
+    raise pytest.UsageError(f"Invalid allure_step_capture_logs value: {value!r}")
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Register allure-step-rewriter options."""
+    group = parser.getgroup("allure-step-rewriter")
+    group.addoption(
+        "--allure-step-timings",
+        action="store_true",
+        dest="allure_step_timings",
+        help="Record per-title step timings and show the slowest and most "
+        "frequent steps at the end of the session",
+    )
+    group.addoption(
+        "--allure-step-timings-json",
+        action="store",
+        dest="allure_step_timings_json",
+        metavar="PATH",
+        help="Write per-title step timings as JSON (implies --allure-step-timings)",
+    )
+    group.addoption(
+        "--allure-step-trace",
+        action="store",
+        dest="allure_step_trace",
+        metavar="PATH",
+        help="Write step begin and end events as a Chrome trace-event JSON file",
+    )
+    group.addoption(
+        "--allure-step-disable",
+        action="store_true",
+        dest="allure_step_disable",
+        help="Drop every step created by the rewriter (NullSink)",
+    )
+    group.addoption(
+        "--allure-step-sample-every",
+        action="store",
+        type=int,
+        dest="allure_step_sample_every",
+        metavar="N",
+        help="Record one in N top-level steps of each title per test",
+    )
+    group.addoption(
+        "--allure-step-sample-rate",
+        action="store",
+        type=float,
+        dest="allure_step_sample_rate",
+        metavar="RATE",
+        help="Record top-level steps with this probability (0.0 to 1.0)",
+    )
+    group.addoption(
+        "--allure-step-budget",
+        action="store",
+        type=int,
+        dest="allure_step_budget",
+        metavar="N",
+        help="Record at most N top-level steps per test and drop the rest",
+    )
+    group.addoption(
+        "--allure-step-collapse",
+        action="store_true",
+        dest="allure_step_collapse",
+        help="Collapse recursive calls of decorated functions into one step",
+    )
+    group.addoption(
+        "--allure-step-metrics",
+        action="store_true",
+        dest="allure_step_metrics",
+        help="Count created, overridden and dropped steps and the time spent "
+        "reporting them per test, and show the most expensive tests",
+    )
+    group.addoption(
+        "--allure-step-background-writer",
+        action="store_true",
+        dest="allure_step_background_writer",
+        help="Serialise and write Allure results on a background thread",
+    )
+    parser.addini(
+        "allure_step_detail",
+        help="Step detail mode: 'full' (default) or 'failure' to keep nested "
+        "steps only for failed tests",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_warn_after",
+        help="Default slow step warning threshold in seconds",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_fail_after",
+        help="Default slow step failure threshold in seconds",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_profile",
+        type="linelist",
+        help="Step title patterns to run under cProfile, e.g. 'Login*'",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_writer_queue",
+        help="Number of Allure report items queued for the background writer "
+        "before tests wait for it",
+        default="1000",
+    )
+    parser.addini(
+        "allure_step_capture_stack",
+        type="bool",
+        help="Attach a stack sample of slow steps",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_failure_frames",
+        help="Record each step failure once, on its innermost step, with at "
+        "most this many traceback frames (default: full allure-pytest details)",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_capture_logs",
+        help="Attach the log records of each step: 'false' (default), 'true' "
+        "or 'failure' for failed steps only",
+        default=None,
+    )
+    parser.addini(
+        "allure_step_log_records",
+        help="Log records kept per step; older ones are dropped "
+        f"(default: {DEFAULT_MAX_RECORDS})",
+        default=None,
+    )
+
+
+def pytest_load_initial_conftests(early_config: pytest.Config) -> None:
+    """
+    Apply --allure-step-collapse before conftest files are imported.
+
+    The session-wide setting is read when a function is decorated, so it
+    must be in place before conftest files decorate their helpers.
+    """
+    if early_config.known_args_namespace.allure_step_collapse:
+        set_collapse_recursion(True)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config: pytest.Config) -> None:
+    """
+    Configure the rewriter and register its allure and step observers.
+
+    Runs after allure-pytest has registered its file logger, so the
+    background writer can take over from it.
+    """
+    global _pruner, _timing_recorder, _trace_writer, _background_writer
+    global _sampler, _metrics, _previous_sink
+
+    config.addinivalue_line(
+        "markers",
+        f"{DETAIL_MARK}(mode): step detail mode for the test, 'full' or 'failure'",
+    )
+    config.addinivalue_line(
+        "markers",
+        f"{REWRITE_MARK}(rules_or_title, target=None, allow_multiple=False): "
+        "rename the steps of the test: a mapping of default titles to new "
+        "titles, a new title for the steps titled target, or a title for a "
+        "step wrapping the test",
+    )
+    detail_mode = _ini_value(config, "allure_step_detail")
+    if detail_mode is not None:
+        detail.set_detail_mode(detail_mode)
+        _ini_settings.add("allure_step_detail")
+    slow_step_options = (
+        _ini_value(config, "allure_step_warn_after"),
+        _ini_value(config, "allure_step_fail_after"),
+        _ini_value(config, "allure_step_capture_stack"),
+    )
+    if slow_step_options != (None, None, None):
+        warn_after, fail_after, capture_stack = slow_step_options
+        set_slow_step_thresholds(
+            _float_or_none(warn_after), _float_or_none(fail_after), bool(capture_stack)
+        )
+        _ini_settings.add("allure_step_warn_after")
+    profiled_titles = _ini_value(config, "allure_step_profile")
+    if profiled_titles is not None:
+        set_profiled_titles(profiled_titles)
+        _ini_settings.add("allure_step_profile")
+    log_mode = _ini_value(config, "allure_step_capture_logs")
+    log_records = _ini_value(config, "allure_step_log_records")
+    if log_mode is not None or log_records is not None:
+        set_step_log_capture(
+            _log_mode(log_mode or "false"), int(log_records or DEFAULT_MAX_RECORDS)
+        )
+        _ini_settings.add("allure_step_capture_logs")
+    failure_frames = _ini_value(config, "allure_step_failure_frames")
+    if failure_frames is not None:
+        set_failure_capture(int(failure_frames))
+        _ini_settings.add("allure_step_failure_frames")
+
+    if config.option.allure_step_background_writer:
+        _background_writer = install_background_writer(
+            int(config.getini("allure_step_writer_queue"))
+        )
+
+    report_dir = getattr(config.option, "allure_report_dir", None)
+    _pruner = detail.StepTreePruner(
+        os.path.abspath(report_dir) if report_dir else None,
+        _background_writer.remove if _background_writer is not None else None,
+    )
+    allure_commons.plugin_manager.register(_pruner)
+
+    if config.option.allure_step_timings or config.option.allure_step_timings_json:
+        _timing_recorder = TimingRecorder()
+        add_step_observer(_timing_recorder)
+
+    if config.option.allure_step_trace:
+        _trace_writer = ChromeTraceWriter(
+            _worker_path(config, config.option.allure_step_trace)
+        )
+        add_step_observer(_trace_writer)
+
+    option = config.option
+    if option.allure_step_disable:
+        _previous_sink = set_sink(NullSink())
+    if (
+        option.allure_step_sample_every
+        or option.allure_step_sample_rate is not None
+        or option.allure_step_budget is not None
+    ):
+        _sampler = StepSampler(
+            every=option.allure_step_sample_every or 1,
+            rate=(
+                1.0
+                if option.allure_step_sample_rate is None
+                else option.allure_step_sample_rate
+            ),
+            budget=option.allure_step_budget,
+        )
+        set_sampler(_sampler)
+    if option.allure_step_collapse:
+        set_collapse_recursion(True)
+    if option.allure_step_metrics:
+        _metrics = StepMetrics()
+        set_metrics(_metrics)
+        previous = set_sink(MeteredSink(get_sink(), _metrics))
+        if _previous_sink is None:
+            _previous_sink = previous
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    """Unregister the allure and step observers of the rewriter."""
+    global _pruner, _timing_recorder, _trace_writer, _background_writer
+    global _sampler, _metrics, _previous_sink
+
+    if _trace_writer is not None:
+        remove_step_observer(_trace_writer)
+        _trace_writer.close()
+        _trace_writer = None
+    if _timing_recorder is not None:
+        remove_step_observer(_timing_recorder)
+        _timing_recorder = None
+    if _pruner is not None:
+        _pruner.flush()
+        allure_commons.plugin_manager.unregister(_pruner)
+        _pruner = None
+    if _background_writer is not None:
+        uninstall_background_writer(_background_writer)
+        _background_writer = None
+    if _previous_sink is not None:
+        set_sink(_previous_sink)
+        _previous_sink = None
+    if _sampler is not None:
+        set_sampler(None)
+        _sampler = None
+    if _metrics is not None:
+        set_metrics(None)
+        _metrics = None
+    _test_metrics.clear()
+    set_collapse_recursion(False)
+    if "allure_step_detail" in _ini_settings:
+        detail.set_detail_mode(detail.DETAIL_FULL)
+    clear_step_caches()
+    if "allure_step_warn_after" in _ini_settings:
+        set_slow_step_thresholds()
+    if "allure_step_profile" in _ini_settings:
+        set_profiled_titles([])
+    if "allure_step_capture_logs" in _ini_settings:
+        set_step_log_capture(False)
+    if "allure_step_failure_frames" in _ini_settings:
+        set_failure_capture(None)
+    _ini_settings.clear()
+
+
+def pytest_collection_modifyitems(items: List[pytest.Item]) -> None:
+    """
+    Compile the rewrite_step markers of each test.
+
+    Items sharing the same markers, e.g. the cases of a parametrised test,
+    share the compiled frame and step.
+    """
+    compiled: Dict[Tuple[int, ...], _CompiledMarks] = {}
+    for item in items:
+        marks = list(item.iter_markers(REWRITE_MARK))
+        if not marks:
+            continue
+        key = tuple(map(id, marks))
+        if key not in compiled:
+            compiled[key] = _compile_rewrite_marks(item, marks)
+        item.stash[_compiled_marks_key] = compiled[key]
+
+
+def _compile_rewrite_marks(item: pytest.Item, marks: List[Any]) -> _CompiledMarks:
+    """
+    Compile the rewrite_step markers of a test.
+
+    Args:
+        item: Test item
+        marks: Markers of the test, closest first
+
+    Returns:
+        Tuple of the title rules frame and the step wrapping the test, each
+        None if no marker declares it
+
+    Raises:
+        pytest.UsageError: If a marker has invalid arguments
+    """
+    rules: Dict[str, str] = {}
+    wrapper = None
+    # Farthest first, so markers closer to the test win
+    for mark in reversed(marks):
+        unknown = set(mark.kwargs) - {"target", "allow_multiple"}
+        value = mark.args[0] if len(mark.args) == 1 else None
+        target = mark.kwargs.get("target")
+        if isinstance(value, Mapping) and not unknown and target is None:
+            rules.update(value)
+        elif isinstance(value, str) and not unknown and target is not None:
+            rules[target] = value
+        elif isinstance(value, str) and not unknown:
+            wrapper = AllureStepWrapper(
+                value, allow_multiple=mark.kwargs.get("allow_multiple", False)
+            )
+        else:
+            raise pytest.UsageError(
+                f"{item.nodeid}: invalid {REWRITE_MARK} marker {mark!r}; expected "
+                "a mapping of titles, a title and a target, or a title"
+            )
+    return (_new_rules_frame(rules) if rules else None), wrapper
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item: pytest.Item):
+    """Run a test under the title rules and step of its rewrite_step markers."""
+    frame, wrapper = item.stash.get(_compiled_marks_key, (None, None))
+    thread_id = threading.get_ident()
+    if frame is not None:
+        _push_frame(thread_id, frame)
+    try:
+        if wrapper is None:
+            yield
+            return
+        wrapper.__enter__()
+        outcome = yield
+        try:
+            wrapper.__exit__(*(outcome.excinfo or (None, None, None)))
+        except Exception as e:
+            force_exception = getattr(outcome, "force_exception", None)
+            if force_exception is None:
+                # Before pluggy 1.1, exceptions of hook wrappers propagate
+                raise
+            force_exception(e)
+    finally:
+        if frame is not None:
+            _pop_frame(thread_id, frame)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item: pytest.Item, nextitem: Optional[pytest.Item]):
+    """
+    Run a test with isolated rewriter state.
+
+    Applies the item's step detail mode while it runs and is reported,
+    restarts sampling, collects step metrics, restores step contexts the
+    test left open and clears module-scoped step caches after the last test
+    of a module.
+    """
+    marker = item.get_closest_marker(DETAIL_MARK)
+    mode = None
+    if marker is not None:
+        mode = marker.kwargs.get("mode", marker.args[0] if marker.args else None)
+    detail.set_item_detail_mode(mode)
+    if _sampler is not None:
+        _sampler.reset()
+    contexts = dict(_active_step_contexts)
+    before = _metrics.snapshot() if _metrics is not None else None
+    try:
+        yield
+    finally:
+        detail.set_item_detail_mode(None)
+        clear_failure_record()
+        if before is not None:
+            _test_metrics[item.nodeid] = _metrics.snapshot() - before
+        _restore_step_contexts(item, contexts)
+        module = getattr(item, "module", None)
+        if nextitem is None or getattr(nextitem, "module", None) is not module:
+            clear_step_caches("module")
+
+
+def _restore_step_contexts(item: pytest.Item, contexts: Dict[int, Any]) -> None:
+    """
+    Restore the step contexts of all threads as they were before a test.
+
+    Args:
+        item: Test item
+        contexts: Innermost step context frame of each thread before the test
+    """
+    if _active_step_contexts == contexts:
+        return
+
+    leaked = [
+        frame["title"]
+        for thread_id, frame in _active_step_contexts.items()
+        if contexts.get(thread_id) is not frame
+    ]
+    _active_step_contexts.clear()
+    _active_step_contexts.update(contexts)
+    if leaked:
+        warnings.warn(
+            StepStateWarning(
+                f"{item.nodeid} left rewrite_step contexts open: "
+                f"{', '.join(map(repr, leaked))}"
+            )
+        )
+
+
+@pytest.fixture
+def captured_steps() -> Iterator[MemorySink]:
+    """Capture the steps created by the rewriter during the test in memory."""
+    with capture_steps() as sink:
+        yield sink
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    """Dump step timings as JSON."""
+    path = session.config.option.allure_step_timings_json
+    if _timing_recorder is not None and path:
+        _timing_recorder.dump_json(_worker_path(session.config, path))
+
+
+def pytest_terminal_summary(terminalreporter: Any) -> None:
+    """Show the slowest and most frequent steps and the step metrics."""
+    if _metrics is not None and _test_metrics:
+        terminalreporter.write_sep("-", "allure-step-rewriter: step metrics")
+        for line in _metrics_lines():
+            terminalreporter.write_line(line)
+
+    if _timing_recorder is None:
+        return
+
+    lines = _timing_recorder.report_lines()
+    if not lines:
+        return
+
+    terminalreporter.write_sep("-", "allure-step-rewriter: hot steps")
+    for line in lines:
+        terminalreporter.write_line(line)
+
+
+def _metrics_lines() -> List[str]:
+    """Format the totals and the tests with the highest reporting overhead."""
+    totals = MetricsSnapshot(*(sum(values) for values in zip(*_test_metrics.values())))
+    lines = [
+        f"{len(_test_metrics)} tests: created {totals.created}, "
+        f"overridden {totals.overridden}, dropped {totals.dropped}, "
+        f"reporting overhead {totals.overhead:.3f}s",
+        "",
+        "Highest reporting overhead:",
+    ]
+    ranked = sorted(
+        _test_metrics.items(), key=lambda entry: entry[1].overhead, reverse=True
+    )
+    for nodeid, counts in ranked[:METRICS_SUMMARY_TESTS]:
+        lines.append(
+            f"  {counts.overhead:8.4f}s  created {counts.created:>5}  "
+            f"overridden {counts.overridden:>5}  dropped {counts.dropped:>5}  "
+            f"{nodeid}"
+        )
+    return lines
@@ -0,0 +1,217 @@
+"""
+Polling and retrying inside a single step.
+
+``rewrite_step.poll()`` and ``rewrite_step.retry()`` call a function
+repeatedly and record one step for all attempts instead of one step per
+iteration. Steps of the attempts are merged into it, the attempt count and
+timings become step parameters, and only the last failure is attached.
+"""
+
+import threading
+import time
+import traceback
+from typing import Any, Callable, List, Optional, Tuple, Type
+
+from allure_step_rewriter.params import BoundedRepr
+from allure_step_rewriter.rewrite_step import AllureStepWrapper, _active_step_contexts
+
+_Exceptions = Tuple[Type[BaseException], ...]
+
+
+class PollTimeoutError(AssertionError):
+    """Raised when poll() does not get an accepted result in time."""
+
+
+class _Attempts:
+    """Timings and last failure of the attempts of one step."""
+
+    def __init__(self) -> None:
+        """Initialize empty statistics."""
+        self.times: List[float] = []
+        # Exception of the last attempt, or (attempt, result) if it returned
+        # a result that was not accepted
+        self.failure: Optional[BaseException] = None
+        self.rejected: Optional[Tuple[int, Any]] = None
+
+    def run(self, func: Callable[[], Any], exceptions: _Exceptions) -> Tuple[bool, Any]:
+        """
+        Run one attempt.
+
+        Args:
+            func: Function to call
+            exceptions: Exceptions counted as a failed attempt
+
+        Returns:
+            Tuple of (True, result), or (False, None) if the attempt raised
+        """
+        start = time.perf_counter()
+        try:
+            result = func()
+        except exceptions as e:
+            self.failure, self.rejected = e, None
+            return False, None
+        finally:
+            self.times.append(time.perf_counter() - start)
+        self.failure = None
+        return True, result
+
+    def reject(self, result: Any) -> None:
+        """Record that the result of the last attempt was not accepted."""
+        self.rejected = (len(self.times), result)
+
+    def report(self, exc_val: Optional[BaseException]) -> None:
+        """
+        Add the attempt statistics and last failure to the current step.
+
+        Args:
+            exc_val: Exception leaving the step, if any; not attached again
+                when it is the last failure
+        """
+        frame = _active_step_contexts.get(threading.get_ident())
+        sink = frame.get("sink") if frame is not None else None
+        if sink is None or not self.times:
+            return
+
+        average = sum(self.times) / len(self.times)
+        sink.annotate_step(
+            frame["context"],
+            {
+                "attempts": str(len(self.times)),
+                "attempt time": (
+                    f"min {min(self.times):.3f}s, avg {average:.3f}s, "
+                    f"max {max(self.times):.3f}s"
+                ),
+            },
+        )
+
+        if exc_val is None:
+            return
+        if self.failure is not None and self.failure is not exc_val:
+            details = "".join(
+                traceback.format_exception(
+                    type(self.failure), self.failure, self.failure.__traceback__
+                )
+            )
+        elif self.rejected is not None:
+            attempt, result = self.rejected
+            details = f"Attempt {attempt} returned {BoundedRepr().repr(result)}"
+        else:
+            return
+        sink.attach(details, name="Last failure", attachment_type="text/plain")
+
+
+def poll(
+    title: str,
+    func: Callable[[], Any],
+    timeout: float = 10.0,
+    interval: float = 0.5,
+    until: Optional[Callable[[Any], bool]] = None,
+    ignore: _Exceptions = (Exception,),
+) -> Any:
+    """
+    Call a function until its result is accepted, recording a single step.
+
+    Args:
+        title: Step title
+        func: Function to call, without arguments
+        timeout: Give up after this many seconds (default: 10)
+        interval: Pause between attempts in seconds (default: 0.5)
+        until: Predicate accepting a result (default: the result is truthy)
+        ignore: Exceptions counted as a failed attempt; others propagate
+            (default: Exception)
+
+    Returns:
+        First accepted result
+
+    Raises:
+        PollTimeoutError: If no result was accepted before the timeout; the
+            last exception of an attempt is its cause
+
+    Example:
+        >>> rewrite_step.poll(
+        >>>     "Wait for the order to ship",
+        >>>     lambda: api.get_order(order_id),
+        >>>     until=lambda order: order["status"] == "shipped",
+        >>>     timeout=30,
+        >>>     interval=1,
+        >>> )
+    """
+    attempts = _Attempts()
+    deadline = time.monotonic() + timeout
+    with AllureStepWrapper(title, allow_multiple=True):
+        try:
+            while True:
+                ok, result = attempts.run(func, ignore)
+                if ok:
+                    if until(result) if until is not None else result:
+                        break
+                    attempts.reject(result)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PollTimeoutError(
+                        f"{title}: no accepted result after {len(attempts.times)} "
+                        f"attempts in {timeout}s"
+                    ) from attempts.failure
+                time.sleep(min(interval, remaining))
+        except BaseException as e:
+            attempts.report(e)
+            raise
+        attempts.report(None)
+    return result
+
+
+def retry(
+    title: str,
+    func: Callable[[], Any],
+    attempts: int = 3,
+    interval: float = 0.0,
+    backoff: float = 1.0,
+    exceptions: _Exceptions = (Exception,),
+) -> Any:
+    """
+    Call a function until it does not raise, recording a single step.
+
+    Args:
+        title: Step title
+        func: Function to call, without arguments
+        attempts: Maximum number of attempts (default: 3)
+        interval: Pause after the first failed attempt in seconds
+            (default: 0)
+        backoff: Factor applied to the pause after each failed attempt
+            (default: 1)
+        exceptions: Exceptions that trigger another attempt; others propagate
+            (default: Exception)
+
+    Returns:
+        Result of the first successful attempt
+
+    Raises:
+        ValueError: If attempts is less than 1
+        Exception: The exception of the last attempt if all attempts failed
+
+    Example:
+        >>> token = rewrite_step.retry(
+        >>>     "Get token", auth.get_token, attempts=5, interval=0.2, backoff=2
+        >>> )
+    """
+    if attempts < 1:
+        raise ValueError(f"attempts must be at least 1, got {attempts}")
+
+    stats = _Attempts()
+    with AllureStepWrapper(title, allow_multiple=True):
+        try:
+            for attempt in range(1, attempts + 1):
+                ok, result = stats.run(func, exceptions)
+                if ok:
+                    break
+                if attempt == attempts:
+                    raise stats.failure
+                if interval > 0:
+                    time.sleep(interval)
+                    interval *= backoff
+        except BaseException as e:
+            stats.report(e)
+            raise
+        stats.report(None)
+    return result
@@ -0,0 +1,164 @@
+"""
+Opt-in per-step profiling.
+
+Steps created with ``rewrite_step(..., profile=True)``, or whose title
+matches a pattern registered with set_profiled_titles(), run under cProfile.
+The profile is attached to the step as a pstats dump and as a text summary
+of the top functions. A profiler is only created for matching steps.
+Generator steps profile their body only while it runs, not the consumer
+between items.
+"""
+
+import cProfile
+import fnmatch
+import io
+import marshal
+import pstats
+import re
+import threading
+from typing import Iterable, Optional, Pattern
+
+import allure
+
+from allure_step_rewriter.sinks import get_sink
+
+# Compiled title patterns, or None when no titles are profiled by pattern
+_title_pattern: Optional[Pattern[str]] = None
+
+# Number of functions in the text summary
+_summary_limit = 30
+
+# Profiler running on each thread; nested matching steps reuse it
+_local = threading.local()
+
+
+def set_profiled_titles(patterns: Iterable[str], limit: int = 30) -> None:
+    """
+    Profile every step whose title matches one of the patterns.
+
+    Args:
+        patterns: Shell-style title patterns, e.g. ``"Login*"``; empty to
+            disable profiling by title
+        limit: Number of functions in the text summary (default: 30)
+    """
+    global _title_pattern, _summary_limit
+
+    patterns = list(patterns)
+    _title_pattern = (
+        re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+        if patterns
+        else None
+    )
+    _summary_limit = limit
+
+
+def should_profile(title: str, profile: Optional[bool] = None) -> bool:
+    """
+    Check whether a step is profiled.
+
+    Args:
+        title: Step title
+        profile: Explicit step setting, or None to match the title patterns
+
+    Returns:
+        True if the step should run under the profiler
+    """
+    if profile is not None:
+        return profile
+    return _title_pattern is not None and _title_pattern.match(title) is not None
+
+
+class StepProfiler:
+    """cProfile session of one step."""
+
+    __slots__ = ("title", "_profile", "_running")
+
+    def __init__(self, title: str) -> None:
+        """
+        Start profiling the current thread.
+
+        Args:
+            title: Step title
+        """
+        self.title = title
+        self._profile = cProfile.Profile()
+        self._running = False
+        self.resume()
+        if not self._running:
+            raise ValueError("Another profiling tool is active")
+
+    @classmethod
+    def start(
+        cls, title: str, profile: Optional[bool] = None
+    ) -> Optional["StepProfiler"]:
+        """
+        Start profiling a step if it matches.
+
+        Args:
+            title: Step title
+            profile: Explicit step setting, or None to match the title patterns
+
+        Returns:
+            Profiler, or None if the step is not profiled or an enclosing
+            step of the same thread is already being profiled
+        """
+        if not should_profile(title, profile):
+            return None
+        if getattr(_local, "active", None) is not None:
+            return None
+
+        try:
+            return cls(title)
+        except ValueError:
+            # Another profiling tool is active on this interpreter
+            return None
+
+    def resume(self) -> None:
+        """
+        Profile the current thread again, e.g. when a generator step resumes.
+
+        Does nothing while another step of the thread is being profiled: the
+        code then already runs under its profiler.
+        """
+        if self._running or getattr(_local, "active", None) is not None:
+            return
+        try:
+            self._profile.enable()
+        except ValueError:
+            # Another profiling tool is active on this interpreter
+            return
+        self._running = True
+        _local.active = self
+
+    def suspend(self) -> None:
+        """Stop profiling the thread until resume(), keeping the results."""
+        if not self._running:
+            return
+        self._profile.disable()
+        self._running = False
+        _local.active = None
+
+    def finish(self) -> None:
+        """
+        Stop profiling and attach the results.
+
+        Must be called while the step is still open, so the attachments land
+        on it.
+        """
+        self.suspend()
+
+        self._profile.create_stats()
+        get_sink().attach(
+            marshal.dumps(self._profile.stats),
+            name="Profile (pstats)",
+            extension="pstats",
+        )
+
+        summary = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(_summary_limit)
+        get_sink().attach(
+            summary.getvalue(),
+            name="Profile summary",
+            attachment_type=allure.attachment_type.TEXT,
+        )
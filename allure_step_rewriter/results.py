@@ -0,0 +1,655 @@
+"""
+Offline processing of allure-results directories.
+
+Rewrites step titles of existing ``*-result.json`` files with title rules
+and collapses "outer step with a single child of the same purpose"
+nesting, the same problem ``rewrite_step`` solves at runtime.
+compact_directory() shrinks a results directory: repeated identical sibling
+steps become one counted step, steps that only repeat their parent are
+dropped and identical attachments are stored once. Files are processed one at a time per worker and written
+atomically, so memory is bounded by the largest single file. A result file
+that cannot be rewritten is reported and left as it was.
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from allure_step_rewriter import serialization
+
+RESULT_SUFFIX = "-result.json"
+CONTAINER_SUFFIX = "-container.json"
+ATTACHMENT_MARKER = "-attachment"
+
+# Read size when hashing attachments
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+class TitleRules:
+    """
+    Step title mapping rules.
+
+    Exact titles are looked up first, then regular expression patterns are
+    tried in order; the first matching pattern wins.
+
+    Example:
+        >>> rules = TitleRules({"Get data": "Fetch user"}, [(r"^GET (.*)$", r"Request \\1")])
+        >>> rules.apply("GET /users")
+        'Request /users'
+    """
+
+    def __init__(
+        self,
+        titles: Optional[Dict[str, str]] = None,
+        patterns: Optional[Iterable[Tuple[str, str]]] = None,
+    ) -> None:
+        """
+        Initialize the rules.
+
+        Args:
+            titles: Mapping of exact old titles to new titles (optional)
+            patterns: Pairs of regular expression and replacement (optional)
+        """
+        self.titles = dict(titles or {})
+        self.patterns = [
+            (re.compile(pattern), replacement)
+            for pattern, replacement in (patterns or [])
+        ]
+
+    @classmethod
+    def from_file(cls, path: str) -> "TitleRules":
+        """
+        Load rules from a JSON file.
+
+        The file holds ``{"titles": {"old": "new"}, "patterns": [["regex",
+        "replacement"]]}``; both keys are optional.
+
+        Args:
+            path: Rules file path
+
+        Returns:
+            TitleRules instance
+        """
+        with open(path, encoding="utf-8") as rules_file:
+            data = json.load(rules_file)
+        return cls(data.get("titles"), data.get("patterns"))
+
+    def __bool__(self) -> bool:
+        return bool(self.titles or self.patterns)
+
+    def apply(self, title: str) -> str:
+        """
+        Map a step title.
+
+        Args:
+            title: Original title
+
+        Returns:
+            New title, or the original one if no rule matches
+        """
+        if title in self.titles:
+            return self.titles[title]
+        for pattern, replacement in self.patterns:
+            new_title, count = pattern.subn(replacement, title, count=1)
+            if count:
+                return new_title
+        return title
+
+
+def rename_steps(steps: List[Dict[str, Any]], rules: TitleRules) -> bool:
+    """
+    Apply title rules to a step tree in place.
+
+    Args:
+        steps: Steps of a result
+        rules: Title rules
+
+    Returns:
+        True if any title changed
+    """
+    changed = False
+    for step in steps:
+        title = step.get("name")
+        if title is not None:
+            new_title = rules.apply(title)
+            if new_title != title:
+                step["name"] = new_title
+                changed = True
+        if rename_steps(step.get("steps", []), rules):
+            changed = True
+    return changed
+
+
+def _same_purpose(
+    step: Dict[str, Any], child: Dict[str, Any], rules: Optional[TitleRules]
+) -> bool:
+    """Check whether a child step does what its parent step does."""
+    title, child_title = step.get("name"), child.get("name")
+    if title == child_title:
+        return True
+    if not rules or title is None or child_title is None:
+        return False
+    return rules.apply(child_title) == rules.apply(title)
+
+
+def collapse_single_child(
+    steps: List[Dict[str, Any]], rules: Optional[TitleRules] = None
+) -> bool:
+    """
+    Merge steps that only wrap a single child step of the same purpose, in place.
+
+    A child has the purpose of its parent if it has the same title, or if
+    the title rules give both the same title, e.g. a "Custom title" step
+    wrapping the "Default title" step the rules rename to it. Unrelated
+    children, e.g. "Click pay button" in "Checkout", are kept.
+
+    The outer step keeps its title and timing and takes over the child's
+    steps, attachments, parameters and status details.
+
+    Args:
+        steps: Steps of a result
+        rules: Title rules relating child titles to parent titles (optional)
+
+    Returns:
+        True if any step was merged
+    """
+    changed = False
+    for step in steps:
+        children = step.get("steps", [])
+        if collapse_single_child(children, rules):
+            changed = True
+
+        while (
+            len(children) == 1
+            and not step.get("attachments")
+            and not step.get("parameters")
+            and _same_purpose(step, children[0], rules)
+        ):
+            child = children[0]
+            for key in ("steps", "attachments", "parameters", "statusDetails"):
+                if key in child:
+                    step[key] = child[key]
+                else:
+                    step.pop(key, None)
+            children = step.get("steps", [])
+            changed = True
+    return changed
+
+
+def rewrite_result(
+    data: Dict[str, Any], rules: Optional[TitleRules] = None, collapse: bool = False
+) -> bool:
+    """
+    Rewrite the step tree of a result in place.
+
+    Args:
+        data: Parsed ``*-result.json`` content
+        rules: Title rules (optional)
+        collapse: Merge steps that only wrap a single child of the same
+            purpose (default: False)
+
+    Returns:
+        True if the result changed
+    """
+    steps = data.get("steps", [])
+    changed = False
+    if collapse and collapse_single_child(steps, rules):
+        changed = True
+    if rules and rename_steps(steps, rules):
+        changed = True
+    return changed
+
+
+def read_json(path: str) -> Any:
+    """Read a JSON file with the fastest installed JSON backend."""
+    return serialization.read_file(path)
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """
+    Write a JSON file atomically: to a temporary file, then replace.
+
+    If writing fails, the temporary file is removed and the destination is
+    left as it was.
+
+    Args:
+        path: Destination path
+        data: Data to write
+    """
+    serialization.write_file_atomic(path, data)
+
+
+def rewrite_file(
+    path: str, rules: Optional[TitleRules] = None, collapse: bool = False
+) -> bool:
+    """
+    Rewrite one result file, writing it back only if it changed.
+
+    Args:
+        path: Result file path
+        rules: Title rules (optional)
+        collapse: Merge steps that only wrap a single child of the same
+            purpose (default: False)
+
+    Returns:
+        True if the file was rewritten
+    """
+    data = read_json(path)
+    if not rewrite_result(data, rules, collapse):
+        return False
+    write_json_atomic(path, data)
+    return True
+
+
+def _try_rewrite_file(
+    path: str, rules: Optional[TitleRules] = None, collapse: bool = False
+) -> Tuple[str, bool, Optional[str]]:
+    """
+    Rewrite one result file, catching its errors.
+
+    Returns:
+        Tuple of the path, whether the file was rewritten and the error
+        that left it unchanged, if any
+    """
+    try:
+        return path, rewrite_file(path, rules, collapse), None
+    except Exception as error:
+        return path, False, f"{type(error).__name__}: {error}"
+
+
+def iter_result_files(
+    directory: str, suffixes: Tuple[str, ...] = (RESULT_SUFFIX,)
+) -> Iterator[str]:
+    """
+    Iterate over ``*-result.json`` files of a results directory.
+
+    Args:
+        directory: allure-results directory
+        suffixes: File name suffixes to match (default: result files only)
+
+    Yields:
+        Result file paths
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffixes) and entry.is_file():
+                yield entry.path
+
+
+def iter_attachment_files(directory: str) -> Iterator[str]:
+    """
+    Iterate over attachment files of a results directory.
+
+    Args:
+        directory: allure-results directory
+
+    Yields:
+        Attachment file paths
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if ATTACHMENT_MARKER in entry.name and entry.is_file():
+                yield entry.path
+
+
+def map_files(
+    func: Callable[[str], Any],
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+) -> Iterator[Any]:
+    """
+    Apply a function to files, in a process pool unless workers is 1.
+
+    Args:
+        func: Picklable function of a path
+        paths: File paths
+        workers: Number of worker processes (default: CPU count)
+        initializer: Function called once per worker before any file, e.g.
+            to share large read-only state (optional)
+        initargs: Arguments of the initializer
+
+    Yields:
+        Results in input order
+    """
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, paths)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        yield from executor.map(func, paths, chunksize=64)
+
+
+class RewriteReport(NamedTuple):
+    """Outcome of rewrite_directory()."""
+
+    #: Number of result files
+    files: int
+    #: Number of rewritten files
+    rewritten: int
+    #: Path and error of each file left unchanged because of an error
+    failed: List[Tuple[str, str]]
+
+
+def rewrite_directory(
+    directory: str,
+    rules: Optional[TitleRules] = None,
+    collapse: bool = False,
+    workers: Optional[int] = None,
+) -> RewriteReport:
+    """
+    Rewrite every result file of a results directory.
+
+    A file that cannot be read, rewritten or written back is left as it was
+    and reported; the other files are still processed.
+
+    Args:
+        directory: allure-results directory
+        rules: Title rules (optional)
+        collapse: Merge steps that only wrap a single child of the same
+            purpose (default: False)
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        RewriteReport instance
+    """
+    rewrite = partial(_try_rewrite_file, rules=rules, collapse=collapse)
+    total = rewritten = 0
+    failed: List[Tuple[str, str]] = []
+    for path, changed, error in map_files(
+        rewrite, iter_result_files(directory), workers
+    ):
+        total += 1
+        rewritten += changed
+        if error is not None:
+            failed.append((path, error))
+    return RewriteReport(total, rewritten, failed)
+
+
+class CompactReport(NamedTuple):
+    """Outcome of compact_directory()."""
+
+    #: Number of result and container files
+    files: int
+    #: Number of rewritten files
+    compacted: int
+    #: Number of steps removed from the step trees
+    steps_removed: int
+    #: Number of duplicate attachment files deleted
+    attachments_removed: int
+    #: Bytes saved on disk
+    bytes_saved: int
+
+
+def _untimed(step: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a step subtree without its timing fields."""
+    untimed = {
+        key: value for key, value in step.items() if key not in ("start", "stop")
+    }
+    if "steps" in untimed:
+        untimed["steps"] = [_untimed(child) for child in untimed["steps"]]
+    return untimed
+
+
+def _step_key(step: Dict[str, Any]) -> str:
+    """Get a comparison key of a step subtree, ignoring timing."""
+    return json.dumps(_untimed(step), sort_keys=True, default=str)
+
+
+def hoist_passthrough_steps(
+    steps: List[Dict[str, Any]], parent: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Drop steps that only repeat their parent, in place.
+
+    A passthrough step has the title and status of its parent step and no
+    attachments, parameters or status details of its own, e.g. a helper
+    calling itself through another helper. Its children take its place.
+
+    Args:
+        steps: Steps of a result or of a step
+        parent: Parent step (None for top-level steps)
+
+    Returns:
+        Number of dropped steps
+    """
+    removed = 0
+    index = 0
+    while index < len(steps):
+        step = steps[index]
+        removed += hoist_passthrough_steps(step.get("steps", []), step)
+        if (
+            parent is not None
+            and step.get("name") == parent.get("name")
+            and step.get("status") == parent.get("status")
+            and not step.get("statusDetails")
+            and not step.get("attachments")
+            and not step.get("parameters")
+        ):
+            steps[index : index + 1] = step.get("steps", [])
+            removed += 1
+            continue
+        index += 1
+    return removed
+
+
+def count_repeated_steps(steps: List[Dict[str, Any]]) -> int:
+    """
+    Merge runs of identical sibling steps into one counted step, in place.
+
+    Siblings are identical when they match in everything but timing. The
+    merged step is titled ``"<title> ×<count>"`` and spans the whole run.
+
+    Args:
+        steps: Steps of a result or of a step
+
+    Returns:
+        Number of removed steps
+    """
+    removed = 0
+    for step in steps:
+        removed += count_repeated_steps(step.get("steps", []))
+
+    merged: List[Dict[str, Any]] = []
+    last_key = None
+    count = 0
+    for step in steps:
+        key = _step_key(step)
+        if merged and key == last_key:
+            count += 1
+            first = merged[-1]
+            if "stop" in step:
+                first["stop"] = step["stop"]
+            first["name"] = f"{step.get('name')} ×{count}"
+            removed += 1
+            continue
+        merged.append(step)
+        last_key = key
+        count = 1
+
+    steps[:] = merged
+    return removed
+
+
+def relink_attachments(node: Dict[str, Any], sources: Dict[str, str]) -> bool:
+    """
+    Point attachments of a result, container or step tree to new sources.
+
+    Args:
+        node: Parsed result, container or step
+        sources: Mapping of old attachment sources to new ones
+
+    Returns:
+        True if any source changed
+    """
+    changed = False
+    for attachment in node.get("attachments", []):
+        source = sources.get(attachment.get("source"))
+        if source is not None:
+            attachment["source"] = source
+            changed = True
+    for key in ("steps", "befores", "afters"):
+        for child in node.get(key, []):
+            if relink_attachments(child, sources):
+                changed = True
+    return changed
+
+
+def compact_result(data: Dict[str, Any], sources: Dict[str, str]) -> int:
+    """
+    Compact a result or container in place.
+
+    Args:
+        data: Parsed ``*-result.json`` or ``*-container.json`` content
+        sources: Mapping of duplicate attachment sources to kept ones
+
+    Returns:
+        Number of removed steps, or -1 if only attachment sources changed
+    """
+    relinked = relink_attachments(data, sources) if sources else False
+
+    removed = 0
+    for node in [data] + data.get("befores", []) + data.get("afters", []):
+        steps = node.get("steps", [])
+        removed += hoist_passthrough_steps(steps)
+        removed += count_repeated_steps(steps)
+    if not removed and relinked:
+        return -1
+    return removed
+
+
+def hash_file(path: str) -> Tuple[str, int, str]:
+    """
+    Hash a file in chunks.
+
+    Args:
+        path: File path
+
+    Returns:
+        Tuple of path, size and SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as data_file:
+        for chunk in iter(partial(data_file.read, _HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return path, size, digest.hexdigest()
+
+
+def find_duplicate_attachments(
+    directory: str, workers: Optional[int] = None
+) -> Tuple[Dict[str, str], int]:
+    """
+    Find attachment files with identical content.
+
+    Of each group of identical files, the one with the smallest name is kept.
+
+    Args:
+        directory: allure-results directory
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        Mapping of duplicate file names to kept file names, and the total
+        size of the duplicates
+    """
+    kept: Dict[Tuple[int, str], str] = {}
+    duplicates: Dict[str, str] = {}
+    duplicate_bytes = 0
+    paths = sorted(iter_attachment_files(directory))
+    for path, size, digest in map_files(hash_file, paths, workers):
+        name = os.path.basename(path)
+        original = kept.setdefault((size, digest), name)
+        if original != name:
+            duplicates[name] = original
+            duplicate_bytes += size
+    return duplicates, duplicate_bytes
+
+
+# Attachment mapping shared with compact_file() workers
+_compact_sources: Dict[str, str] = {}
+
+
+def _set_compact_sources(sources: Dict[str, str]) -> None:
+    """Share the attachment mapping with compact_file()."""
+    global _compact_sources
+    _compact_sources = sources
+
+
+def compact_file(path: str) -> Tuple[bool, int, int]:
+    """
+    Compact one result or container file, writing it back only if it changed.
+
+    Args:
+        path: File path
+
+    Returns:
+        Tuple of whether the file was rewritten, the number of removed steps
+        and the number of bytes saved
+    """
+    data = read_json(path)
+    removed = compact_result(data, _compact_sources)
+    if not removed:
+        return False, 0, 0
+
+    size = os.path.getsize(path)
+    write_json_atomic(path, data)
+    return True, max(removed, 0), size - os.path.getsize(path)
+
+
+def compact_directory(directory: str, workers: Optional[int] = None) -> CompactReport:
+    """
+    Compact a results directory.
+
+    Runs in three phases, each spread over a process pool: attachments are
+    hashed, results and containers are rewritten to point at one copy of
+    each attachment (compacting their step trees on the way), then the
+    duplicate attachment files are deleted.
+
+    Args:
+        directory: allure-results directory
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        CompactReport instance
+    """
+    duplicates, duplicate_bytes = find_duplicate_attachments(directory, workers)
+
+    files = compacted = steps_removed = bytes_saved = 0
+    paths = iter_result_files(directory, (RESULT_SUFFIX, CONTAINER_SUFFIX))
+    try:
+        for changed, removed, saved in map_files(
+            compact_file, paths, workers, _set_compact_sources, (duplicates,)
+        ):
+            files += 1
+            compacted += changed
+            steps_removed += removed
+            bytes_saved += saved
+    finally:
+        _set_compact_sources({})
+
+    for name in duplicates:
+        os.remove(os.path.join(directory, name))
+
+    return CompactReport(
+        files, compacted, steps_removed, len(duplicates), bytes_saved + duplicate_bytes
+    )
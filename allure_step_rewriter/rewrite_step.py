@@ -5,23 +5,434 @@ This module provides the rewrite_step decorator and context manager
 that allows overriding Allure step titles without creating nested steps.
 """
 
+import inspect
 import threading
+import time
 from functools import wraps
-from typing import Any, Callable, Dict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import allure
+from allure_step_rewriter import observers, sinks
+from allure_step_rewriter.caching import StepCache
+from allure_step_rewriter.log_capture import StepLogCapture, check_log_mode
+from allure_step_rewriter.metrics import (
+    TimedCall,
+    add_overhead,
+    record_dropped,
+    start_overhead,
+)
+from allure_step_rewriter.params import (
+    DEFAULT_MAX_LENGTH,
+    ParamRecorder,
+    format_params,
+    format_title,
+)
+from allure_step_rewriter.profiling import StepProfiler
+from allure_step_rewriter.sampling import StepSampler, get_sampler
+from allure_step_rewriter.slow_steps import SlowStepGuard
 
-
-# Thread-local storage for step contexts
+# Thread-local storage for step contexts: the innermost frame of each thread.
+# Every frame keeps a reference to the frame it replaced in "parent", and
+# shares the title rules ("rules") of the frames around it.
 _active_step_contexts: Dict[int, Dict[str, Any]] = {}
 
+# Number of decorated steps open on each thread. Decorated steps push no
+# frame, so steps nested inside them inherit their sampling decision from
+# this count.
+_recorded_calls: Dict[int, int] = {}
+
+# Session-wide collapse_recursion default of wrappers that do not set it
+_collapse_recursion = False
+
+
+def set_collapse_recursion(enabled: bool) -> None:
+    """
+    Collapse recursive calls of every decorated function by default.
+
+    Applies to functions decorated after the call: the setting is read when
+    a function is decorated, so other functions pay nothing for it.
+
+    Args:
+        enabled: Default for wrappers created with collapse_recursion=None
+    """
+    global _collapse_recursion
+    _collapse_recursion = enabled
+
 
 def _current_thread_id() -> int:
     """Get current thread ID."""
     return threading.get_ident()
 
 
-def rewrite_step(title: str = "", allow_multiple: bool = False) -> "AllureStepWrapper":
+def _push_frame(thread_id: int, frame: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Make frame the innermost step context of a thread.
+
+    Args:
+        thread_id: Current thread ID
+        frame: Step context frame
+
+    Returns:
+        The pushed frame
+    """
+    parent = _active_step_contexts.get(thread_id)
+    frame["parent"] = parent
+    if frame["rules"] is None and parent is not None:
+        frame["rules"] = parent["rules"]
+    _active_step_contexts[thread_id] = frame
+    return frame
+
+
+def _pop_frame(thread_id: int, frame: Dict[str, Any]) -> None:
+    """
+    Remove frame and restore the frame it replaced.
+
+    Args:
+        thread_id: Current thread ID
+        frame: Step context frame
+    """
+    parent = frame.get("parent")
+    if parent is None:
+        _active_step_contexts.pop(thread_id, None)
+    else:
+        _active_step_contexts[thread_id] = parent
+
+
+def _enter_recorded(thread_id: int) -> None:
+    """Count a decorated step opened on a thread."""
+    _recorded_calls[thread_id] = _recorded_calls.get(thread_id, 0) + 1
+
+
+def _leave_recorded(thread_id: int) -> None:
+    """Count a decorated step closed on a thread."""
+    count = _recorded_calls.pop(thread_id) - 1
+    if count:
+        _recorded_calls[thread_id] = count
+
+
+def _new_frame(
+    title: str, allow_multiple: bool = False, sampled: Optional[bool] = True
+) -> Dict[str, Any]:
+    """Create a step context frame."""
+    return {
+        "title": title,
+        "can_override": bool(sampled),
+        "allow_multiple": allow_multiple,
+        "sampled": sampled,
+        "context": None,
+        "sink": None,
+        "rules": None,
+        # Override depth limit, and nesting depth of the current call below
+        # the frame, counted only when limited
+        "override_depth": None,
+        "depth": 0,
+        "suppress_deeper": False,
+    }
+
+
+def _accepts_override(frame: Dict[str, Any]) -> bool:
+    """Check whether a step started now can be merged into a frame."""
+    if not frame["can_override"]:
+        return False
+    limit = frame["override_depth"]
+    return limit is None or frame["depth"] < limit
+
+
+def _depth_scope(thread_id: int) -> Optional[Dict[str, Any]]:
+    """Get the innermost frame of a thread if it limits its override depth."""
+    frame = _active_step_contexts.get(thread_id)
+    if frame is None or frame["override_depth"] is None:
+        return None
+    return frame
+
+
+def _suppresses_deeper(scope: Optional[Dict[str, Any]]) -> bool:
+    """Check whether a depth limiting frame drops the steps started now."""
+    return (
+        scope is not None
+        and scope["suppress_deeper"]
+        and scope["depth"] >= scope["override_depth"]
+    )
+
+
+def _new_rules_frame(rules: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Create a frame renaming the steps created inside it.
+
+    The frame creates no step and leaves sampling to the steps inside it.
+    It can be pushed again after it was popped, e.g. once per test.
+
+    Args:
+        rules: New titles by default step title
+
+    Returns:
+        Frame for _push_frame()
+    """
+    frame = _new_frame("", sampled=None)
+    frame["rules"] = dict(rules)
+    return frame
+
+
+def _decided_frame(thread_id: int) -> Optional[Dict[str, Any]]:
+    """Get the innermost frame of a thread that decided sampling, if any."""
+    frame = _active_step_contexts.get(thread_id)
+    while frame is not None and frame["sampled"] is None:
+        frame = frame["parent"]
+    return frame
+
+
+def _apply_rules(thread_id: int, title: str) -> str:
+    """Get the title of a new step under the title rules of its frames."""
+    frame = _active_step_contexts.get(thread_id)
+    if frame is None or not frame["rules"]:
+        return title
+    return frame["rules"].get(title, title)
+
+
+class StepFrame(NamedTuple):
+    """Read-only view of the innermost rewrite_step context of a thread."""
+
+    title: str
+    can_override: bool
+    allow_multiple: bool
+    recording: bool
+
+
+def current_frame() -> Optional[StepFrame]:
+    """
+    Get the innermost rewrite_step context of the current thread.
+
+    Contexts and steps that were not sampled have a frame; decorated calls
+    that create a step do not.
+
+    Returns:
+        Frame view, or None outside of any context
+    """
+    frame = _decided_frame(_current_thread_id())
+    if frame is None:
+        return None
+    return StepFrame(
+        frame["title"],
+        _accepts_override(frame),
+        frame["allow_multiple"],
+        frame["sampled"] and frame["sink"].recording,
+    )
+
+
+def will_override() -> bool:
+    """
+    Check whether a step started now would be merged into the current one.
+
+    A merged step replaces the title of the current step and records neither
+    its parameters nor a step of its own, so work spent on them can be
+    skipped.
+
+    Returns:
+        True if the innermost context of the thread can still be overridden
+        at the current depth
+    """
+    frame = _active_step_contexts.get(_current_thread_id())
+    return frame is not None and _accepts_override(frame)
+
+
+def is_recording() -> bool:
+    """
+    Check whether a step started now would be recorded.
+
+    Returns:
+        False inside a step that was not sampled or when the sink drops
+        every step, True otherwise; outside of any context, a sampler may
+        still drop the new step
+    """
+    frame = _decided_frame(_current_thread_id())
+    if frame is not None and not frame["sampled"]:
+        return False
+    return sinks.get_sink().recording
+
+
+def _start_observation(title: str, overridden: bool) -> Optional[Tuple[Any, ...]]:
+    """
+    Notify step observers that a step begins.
+
+    Args:
+        title: Step title
+        overridden: True if the step was merged into an outer step
+
+    Returns:
+        Observation state for _finish_observation, or None without observers
+    """
+    notified = observers._step_observers
+    if not notified:
+        return None
+
+    for observer in notified:
+        observer.step_started(title, overridden)
+    return notified, title, overridden, time.perf_counter(), time.thread_time()
+
+
+def _finish_observation(
+    observation: Optional[Tuple[Any, ...]], exc_val: Optional[BaseException]
+) -> None:
+    """
+    Notify step observers that a step ends.
+
+    Args:
+        observation: State returned by _start_observation
+        exc_val: Exception raised inside the step, if any
+    """
+    if observation is None:
+        return
+
+    notified, title, overridden, wall_start, cpu_start = observation
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.thread_time() - cpu_start
+    for observer in notified:
+        observer.step_finished(title, overridden, wall_time, cpu_time, exc_val)
+
+
+def _observed_call(
+    title: str,
+    overridden: bool,
+    guard: Optional[SlowStepGuard],
+    profiler: Optional[StepProfiler],
+    capture: Optional[StepLogCapture],
+    func: Callable,
+    args: Any,
+    kwargs: Any,
+) -> Any:
+    """
+    Call a wrapped function with step observers, slow step guard, profiler
+    and log capture.
+
+    Args:
+        title: Step title
+        overridden: True if the step was merged into an outer step
+        guard: Slow step guard of the step (optional)
+        profiler: Profiler started for the step (optional)
+        capture: Log capture started for the step (optional)
+        func: Wrapped function
+        args: Positional arguments
+        kwargs: Keyword arguments
+
+    Returns:
+        Function result
+    """
+    observation = _start_observation(title, overridden)
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        if profiler is not None:
+            profiler.finish()
+        if guard is not None:
+            guard.finish(e)
+        if capture is not None:
+            capture.finish(e)
+        _finish_observation(observation, e)
+        raise
+
+    if profiler is not None:
+        profiler.finish()
+    error = guard.finish() if guard is not None else None
+    if capture is not None:
+        capture.finish(error)
+    _finish_observation(observation, error)
+    if error is not None:
+        raise error
+    return result
+
+
+class _RecursionTracker(threading.local):
+    """
+    Re-entry counter of a function decorated with collapse_recursion=True.
+
+    Each thread counts its own depth, so a recursive call is detected in O(1)
+    without walking the step stack.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the counters of the current thread."""
+        self.depth = 0
+        self.calls = 0
+        self.max_depth = 0
+
+    def enter(self) -> bool:
+        """
+        Count a call of the function.
+
+        Returns:
+            True for the outermost call, which records the step
+        """
+        self.depth += 1
+        if self.depth == 1:
+            self.calls = self.max_depth = 1
+            return True
+        self.calls += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+        return False
+
+    def resume(self, counts: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Re-enter a started generator call.
+
+        Args:
+            counts: Counters saved by the outermost call, restored when it
+                resumes (optional)
+        """
+        self.depth += 1
+        if counts is not None:
+            self.calls, self.max_depth = counts
+        elif self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def leave(self) -> Tuple[int, int]:
+        """
+        Leave the function.
+
+        Returns:
+            Call count and maximum depth so far
+        """
+        self.depth -= 1
+        return self.calls, self.max_depth
+
+
+def _annotate_recursion(
+    sink: sinks.StepSink, handle: Any, counts: Tuple[int, int]
+) -> None:
+    """Add the call count and depth of a recursive call to its step."""
+    calls, max_depth = counts
+    if calls > 1:
+        sink.annotate_step(
+            handle, {"recursion depth": str(max_depth), "calls": str(calls)}
+        )
+
+
+def rewrite_step(
+    title: str = "",
+    allow_multiple: bool = False,
+    sample: Optional[StepSampler] = None,
+    warn_after: Optional[float] = None,
+    fail_after: Optional[float] = None,
+    capture_stack: Optional[bool] = None,
+    profile: Optional[bool] = None,
+    params: Union[bool, Iterable[str], Mapping[str, Any], None] = None,
+    param_max_length: int = DEFAULT_MAX_LENGTH,
+    item_stats: bool = False,
+    collapse_recursion: Optional[bool] = None,
+    cache: Union[bool, StepCache, None] = None,
+    capture_logs: Union[bool, str, None] = None,
+    depth: Optional[int] = None,
+    suppress_deeper: bool = False,
+) -> "AllureStepWrapper":
     """
     Create a step with the ability to override nested step titles.
 
@@ -30,6 +441,39 @@ def rewrite_step(title: str = "", allow_multiple: bool = False) -> "AllureStepWr
     Args:
         title: Step title (optional)
         allow_multiple: Allow multiple overrides in single context (default: False)
+        sample: Sampler deciding whether the step is recorded when it is the
+            outermost one (default: the session-wide sampler, if any)
+        warn_after: Warn about and tag the step if it runs longer than this,
+            in seconds (default: the session-wide threshold, if any)
+        fail_after: Fail the step if it runs longer than this, in seconds
+            (default: the session-wide threshold, if any)
+        capture_stack: Attach a stack sample of slow steps (default: the
+            session-wide setting)
+        profile: Run the step under cProfile and attach the results
+            (default: profile if the title matches set_profiled_titles())
+        params: Step parameters: names of the decorated function's arguments
+            to record (or a single name), True for all of them, or a mapping
+            of names to values; they also fill ``{name}`` placeholders of the
+            title (optional)
+        param_max_length: Maximum length of a formatted parameter value
+            (default: 100)
+        item_stats: For generator functions, attach the number of items and
+            the time spent producing them (default: False)
+        collapse_recursion: Record only the outermost call of a recursive
+            function, with the recursion depth and call count as step
+            parameters (default: the session-wide setting when the function
+            is decorated, off)
+        cache: Return the stored result of earlier calls with the same
+            arguments and record the step as cached: a StepCache, or True for
+            a session-wide cache of this function (optional)
+        capture_logs: Attach the log records emitted while the step runs as
+            one "Log" attachment: True, or "failure" for failed steps only
+            (default: the session-wide setting, off)
+        depth: Only override steps nested at most this many decorated calls
+            below the context, e.g. 1 for its direct children; deeper steps
+            are recorded normally (default: any depth)
+        suppress_deeper: Do not record steps nested deeper than depth
+            (default: False)
 
     Returns:
         AllureStepWrapper instance
@@ -55,12 +499,257 @@ def rewrite_step(title: str = "", allow_multiple: bool = False) -> "AllureStepWr
             >>> def my_function():
             >>>     pass
             >>> my_function(step_title="Custom title")
+
+        With sampling under load:
+            >>> for _ in range(1000):
+            >>>     with rewrite_step("Iteration", sample=StepSampler(every=100)):
+            >>>         my_function()  # Recorded in 1 of 100 iterations
+
+        With slow step detection:
+            >>> @rewrite_step("Fetch report", warn_after=1.0, fail_after=10.0)
+            >>> def fetch_report():
+            >>>     pass
+
+        With profiling:
+            >>> with rewrite_step("Suspicious block", profile=True):
+            >>>     my_function()
+
+        With parameters:
+            >>> @rewrite_step("Load report {report_id}", params=["report_id"])
+            >>> def load_report(report_id, frame):
+            >>>     pass
+
+        With a generator function (the step stays open while it is consumed):
+            >>> @rewrite_step("Fetch pages", item_stats=True)
+            >>> def fetch_pages():
+            >>>     yield from client.pages()
+
+        With a recursive function (one step for the whole walk):
+            >>> @rewrite_step("Walk tree", collapse_recursion=True)
+            >>> def walk(node):
+            >>>     for child in node.children:
+            >>>         walk(child)
+
+        With a cached setup helper (one login per user for the session):
+            >>> @rewrite_step("Log in as {user}", params=["user"], cache=True)
+            >>> def login(user):
+            >>>     return auth.login(user)
+
+        With the log records of the step attached:
+            >>> with rewrite_step("Sync inventory", capture_logs=True):
+            >>>     inventory.sync()
+
+        Overriding only the direct children of the context:
+            >>> with rewrite_step("Checkout", allow_multiple=True, depth=1):
+            >>>     add_to_cart()  # Overridden
+            >>>     pay()  # Overridden; steps of pay() helpers are recorded
     """
     if callable(title):
         # Called as @rewrite_step without parentheses
-        return AllureStepWrapper(title.__name__, allow_multiple)(title)
+        return AllureStepWrapper(title.__name__, allow_multiple, sample)(title)
     else:
-        return AllureStepWrapper(title, allow_multiple)
+        return AllureStepWrapper(
+            title,
+            allow_multiple,
+            sample,
+            warn_after,
+            fail_after,
+            capture_stack,
+            profile,
+            params,
+            param_max_length,
+            item_stats,
+            collapse_recursion,
+            cache,
+            capture_logs,
+            depth,
+            suppress_deeper,
+        )
+
+
+class _StreamingStep:
+    """
+    Step of a generator call, open while the generator is consumed.
+
+    Whether the step is created, overridden, sampled out or suppressed by
+    an override depth limit is decided when the generator first runs. The
+    generator body only counts as inside the step, and one level deeper in
+    a depth limited context, while it runs: between items, steps of the
+    consumer are not merged into it.
+    """
+
+    def __init__(
+        self,
+        wrapper: "AllureStepWrapper",
+        title: str,
+        get_params: Callable[[], Optional[Dict[str, str]]],
+        recursion: Optional[_RecursionTracker] = None,
+    ) -> None:
+        """
+        Initialize a step that has not started yet.
+
+        Args:
+            wrapper: Wrapper of the generator function
+            title: Step title
+            get_params: Function formatting the step parameters
+            recursion: Re-entry counter when recursion is collapsed (optional)
+        """
+        self.wrapper = wrapper
+        self.title = title
+        self.items = 0
+        self.producer_time = 0.0
+        self.max_item_time = 0.0
+        self._get_params = get_params
+        self._recursion = recursion
+        self._counts: Optional[Tuple[int, int]] = None
+        self._started = False
+        self._finished = False
+        self._sampled_out = False
+        self._scope: Optional[Dict[str, Any]] = None
+        self._frame: Optional[Dict[str, Any]] = None
+        self._recorded = False
+        self._sink: Optional[sinks.StepSink] = None
+        self._handle: Any = None
+        self._guard: Optional[SlowStepGuard] = None
+        self._profiler: Optional[StepProfiler] = None
+        self._capture: Optional[StepLogCapture] = None
+        self._observation: Optional[Tuple[Any, ...]] = None
+        self._resumed_at = 0.0
+
+    def _start(self, thread_id: int) -> None:
+        """Decide how the step is recorded and open it."""
+        self._started = True
+        self.title = _apply_rules(thread_id, self.title)
+        if self.wrapper._is_sampled_out(thread_id, self.title):
+            self._sampled_out = True
+            return
+
+        # Steps nested below a context limiting its override depth
+        scope = _depth_scope(thread_id)
+        if _suppresses_deeper(scope):
+            return
+        self._scope = scope
+
+        overridden = self.wrapper._can_override_step(thread_id, self.title)
+        if not overridden:
+            params = self._get_params()
+            self.title = format_title(self.title, params)
+            self._sink = sinks.get_sink()
+            self._handle = self._sink.start_step(self.title, params)
+            self._capture = StepLogCapture.start(self.wrapper.capture_logs)
+        self._guard = self.wrapper._start_guard(self.title)
+        self._profiler = StepProfiler.start(self.title, self.wrapper.profile)
+        self._observation = _start_observation(self.title, overridden)
+
+    def resume(self) -> None:
+        """Enter the generator body."""
+        thread_id = _current_thread_id()
+        if not self._started:
+            if self._recursion is not None and not self._recursion.enter():
+                # Recursive call: runs inside the step of the outermost call
+                self._started = self._finished = True
+            else:
+                started = start_overhead()
+                self._start(thread_id)
+                add_overhead(started)
+        else:
+            if self._recursion is not None:
+                self._recursion.resume(None if self._finished else self._counts)
+            if self._capture is not None and not self._finished:
+                self._capture.resume()
+            if self._profiler is not None and not self._finished:
+                self._profiler.resume()
+        if self._scope is not None:
+            self._scope["depth"] += 1
+        if self._sampled_out and _decided_frame(thread_id) is None:
+            self._frame = _push_frame(thread_id, _new_frame(self.title, sampled=False))
+        elif self._handle is not None and not self._finished:
+            _enter_recorded(thread_id)
+            self._recorded = True
+        self._resumed_at = time.perf_counter()
+
+    def suspend(self, produced: bool) -> None:
+        """
+        Leave the generator body.
+
+        Args:
+            produced: True if the body yielded an item
+        """
+        elapsed = time.perf_counter() - self._resumed_at
+        self.producer_time += elapsed
+        if produced:
+            self.items += 1
+            self.max_item_time = max(self.max_item_time, elapsed)
+        if self._recursion is not None:
+            self._counts = self._recursion.leave()
+        if self._capture is not None:
+            self._capture.suspend()
+        if self._profiler is not None:
+            self._profiler.suspend()
+        if self._scope is not None:
+            self._scope["depth"] -= 1
+
+        frame, self._frame = self._frame, None
+        if frame is not None:
+            _pop_frame(_current_thread_id(), frame)
+        if self._recorded:
+            self._recorded = False
+            _leave_recorded(_current_thread_id())
+
+    def finish(self, exc_val: Optional[BaseException]) -> Optional[BaseException]:
+        """
+        Close the step when the generator is exhausted, fails or is closed.
+
+        Args:
+            exc_val: Exception raised by the generator, if any
+
+        Returns:
+            SlowStepError to raise if the step was too slow, None otherwise
+        """
+        if self._finished or not self._started:
+            return None
+        self._finished = True
+        started = start_overhead()
+        try:
+            return self._close(exc_val)
+        finally:
+            add_overhead(started)
+
+    def _close(self, exc_val: Optional[BaseException]) -> Optional[BaseException]:
+        """Attach the step data and close the step, see finish()."""
+
+        if self._handle is not None and self.wrapper.item_stats:
+            average = self.producer_time / self.items if self.items else 0.0
+            self._sink.attach(
+                f"Items: {self.items}\n"
+                f"Producer time: {self.producer_time:.6f}s "
+                f"(avg {average:.6f}s, max {self.max_item_time:.6f}s per item)",
+                name="Items",
+                attachment_type="text/plain",
+            )
+        if self._handle is not None and self._counts is not None:
+            _annotate_recursion(self._sink, self._handle, self._counts)
+
+        profiler, self._profiler = self._profiler, None
+        if profiler is not None:
+            profiler.finish()
+        guard, self._guard = self._guard, None
+        error = guard.finish(exc_val) if guard is not None else None
+        if error is not None:
+            exc_val = error
+        capture, self._capture = self._capture, None
+        if capture is not None:
+            capture.finish(exc_val)
+        _finish_observation(self._observation, exc_val)
+
+        if self._handle is not None:
+            if exc_val is None:
+                self._sink.stop_step(self._handle, None, None, None)
+            else:
+                self._sink.stop_step(
+                    self._handle, type(exc_val), exc_val, exc_val.__traceback__
+                )
+        return error
 
 
 class AllureStepWrapper:
@@ -72,44 +761,473 @@ class AllureStepWrapper:
     created inside its context.
     """
 
-    def __init__(self, title: str, allow_multiple: bool = False) -> None:
+    def __init__(
+        self,
+        title: str,
+        allow_multiple: bool = False,
+        sample: Optional[StepSampler] = None,
+        warn_after: Optional[float] = None,
+        fail_after: Optional[float] = None,
+        capture_stack: Optional[bool] = None,
+        profile: Optional[bool] = None,
+        params: Union[bool, Iterable[str], Mapping[str, Any], None] = None,
+        param_max_length: int = DEFAULT_MAX_LENGTH,
+        item_stats: bool = False,
+        collapse_recursion: Optional[bool] = None,
+        cache: Union[bool, StepCache, None] = None,
+        capture_logs: Union[bool, str, None] = None,
+        depth: Optional[int] = None,
+        suppress_deeper: bool = False,
+    ) -> None:
         """
         Initialize the wrapper.
 
         Args:
             title: Step title
             allow_multiple: Allow multiple overrides in single context (default: False)
+            sample: Sampler for outermost steps (default: session-wide sampler)
+            warn_after: Slow step warning threshold in seconds (optional)
+            fail_after: Slow step failure threshold in seconds (optional)
+            capture_stack: Attach a stack sample of slow steps (optional)
+            profile: Run the step under cProfile (default: match title patterns)
+            params: Argument names (or a single name) to record as step
+                parameters, True for all arguments, or a mapping of parameter
+                values (optional)
+            param_max_length: Maximum length of a formatted parameter value
+            item_stats: Attach item count and timing of generator steps
+            collapse_recursion: Record only the outermost recursive call
+                (default: the session-wide setting at decoration time)
+            cache: Cache of call results, or True for a new one (optional)
+            capture_logs: Attach the log records of the step, True or
+                "failure" (default: the session-wide setting)
+            depth: Maximum nesting depth of overridden steps (default: any)
+            suppress_deeper: Do not record steps nested deeper than depth
+
+        Raises:
+            ValueError: If capture_logs is invalid or depth is less than 1
         """
+        check_log_mode(capture_logs)
+        if depth is not None and depth < 1:
+            raise ValueError(f"depth must be at least 1, got {depth}")
         self.desc = title
         self.allow_multiple = allow_multiple
+        self.sample = sample
+        self.warn_after = warn_after
+        self.fail_after = fail_after
+        self.capture_stack = capture_stack
+        self.profile = profile
+        self.params = params
+        self.param_max_length = param_max_length
+        self.item_stats = item_stats
+        self.collapse_recursion = collapse_recursion
+        if cache is True:
+            cache = StepCache()
+        self.cache = cache if isinstance(cache, StepCache) else None
+        self.capture_logs = capture_logs
+        self.depth = depth
+        self.suppress_deeper = suppress_deeper
         self.step_context = None
+        self._sink: Optional[sinks.StepSink] = None
+        self._frame: Optional[Dict[str, Any]] = None
+        self._observation: Optional[Tuple[Any, ...]] = None
+        self._guard: Optional[SlowStepGuard] = None
+        self._profiler: Optional[StepProfiler] = None
+        self._capture: Optional[StepLogCapture] = None
+        self._scope: Optional[Dict[str, Any]] = None
+
+    def _start_guard(self, step_title: str) -> Optional[SlowStepGuard]:
+        """Start the slow step guard if any threshold applies to the step."""
+        return SlowStepGuard.start(
+            step_title, self.warn_after, self.fail_after, self.capture_stack
+        )
+
+    def _call_step(
+        self,
+        step_title: str,
+        overridden: bool,
+        func: Callable,
+        args: Any,
+        kwargs: Any,
+        scope: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """
+        Call the wrapped function of a created or overridden step.
+
+        Args:
+            step_title: Step title
+            overridden: True if the step was merged into an outer step
+            func: Wrapped function
+            args: Positional arguments
+            kwargs: Keyword arguments
+            scope: Frame counting the nesting depth of the call (optional)
+
+        Returns:
+            Function result
+        """
+        if scope is not None:
+            scope["depth"] += 1
+            try:
+                return self._call_step(step_title, overridden, func, args, kwargs)
+            finally:
+                scope["depth"] -= 1
+
+        guard = self._start_guard(step_title)
+        profiler = StepProfiler.start(step_title, self.profile)
+        # Merged steps log into the step they were merged into
+        capture = None if overridden else StepLogCapture.start(self.capture_logs)
+        if (
+            guard is None
+            and profiler is None
+            and capture is None
+            and not observers._step_observers
+        ):
+            return func(*args, **kwargs)
+        return _observed_call(
+            step_title, overridden, guard, profiler, capture, func, args, kwargs
+        )
+
+    def _is_sampled_out(self, thread_id: int, step_title: str) -> bool:
+        """
+        Check if the step takes the passthrough path because of sampling.
+
+        The decision is made once, by the outermost step, and inherited by
+        everything nested inside it.
+
+        Args:
+            thread_id: Current thread ID
+            step_title: Step title
+
+        Returns:
+            True if the step must not be recorded, False otherwise
+        """
+        external_context = _decided_frame(thread_id)
+        if external_context is not None:
+            sampled_out = not external_context["sampled"]
+        elif thread_id in _recorded_calls:
+            # Inside a decorated step that was recorded
+            return False
+        else:
+            sampler = self.sample or get_sampler()
+            sampled_out = sampler is not None and not sampler.should_record(step_title)
+        if sampled_out:
+            record_dropped()
+        return sampled_out
+
+    def _collapses_recursion(self) -> bool:
+        """Check if recursive calls of a function decorated now are collapsed."""
+        if self.collapse_recursion is None:
+            return _collapse_recursion
+        return self.collapse_recursion
 
     def __call__(self, func: Callable) -> Callable:
         """
         Decorator for wrapping a function in an Allure step.
 
+        Generator and async generator functions keep the step open until the
+        generator is exhausted, fails or is closed. With collapse_recursion,
+        calls made while the function is already running on the thread do
+        not create or override steps. With a cache, repeated calls return the
+        stored result without running the function.
+
         Args:
             func: Function to wrap
 
         Returns:
             Wrapped function
+
+        Raises:
+            ValueError: If a cache is set for a generator function
         """
+        capture_params = self._param_capture(func)
+        recursion = _RecursionTracker() if self._collapses_recursion() else None
+        if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+            if self.cache is not None:
+                raise ValueError(
+                    f"{func.__qualname__}(): cache cannot be used with generators"
+                )
+            if inspect.isgeneratorfunction(func):
+                return self._wrap_generator(func, capture_params, recursion)
+            return self._wrap_async_generator(func, capture_params, recursion)
 
         @wraps(func)
         def impl(*args, **kwargs) -> Any:
-            step_title = kwargs.pop("step_title", None) or self.desc
-            thread_id = _current_thread_id()
+            started = start_overhead()
+            # Time spent in the function is not overhead
+            target = func if started is None else TimedCall(func)
+            try:
+                step_title = kwargs.pop("step_title", None) or self.desc
+                thread_id = _current_thread_id()
+                step_title = _apply_rules(thread_id, step_title)
+
+                # Skip recording if the outermost step was not sampled
+                if self._is_sampled_out(thread_id, step_title):
+                    if _decided_frame(thread_id) is not None:
+                        return target(*args, **kwargs)
+
+                    frame = _push_frame(
+                        thread_id, _new_frame(step_title, sampled=False)
+                    )
+                    try:
+                        return target(*args, **kwargs)
+                    finally:
+                        _pop_frame(thread_id, frame)
 
-            # Check if we can override the step
-            if self._can_override_step(thread_id, step_title):
-                return func(*args, **kwargs)
+                # Steps nested below a context limiting its override depth
+                scope = _depth_scope(thread_id)
+                if _suppresses_deeper(scope):
+                    return target(*args, **kwargs)
 
-            # Create a new step
-            with allure.step(step_title):
-                return func(*args, **kwargs)
+                # Check if we can override the step
+                if self._can_override_step(thread_id, step_title):
+                    if recursion is None or not recursion.depth:
+                        return self._call_step(
+                            step_title, True, target, args, kwargs, scope
+                        )
+                    frame = _active_step_contexts[thread_id]
+                    try:
+                        return self._call_step(
+                            step_title, True, target, args, kwargs, scope
+                        )
+                    finally:
+                        counts = recursion.calls, recursion.max_depth
+                        _annotate_recursion(frame["sink"], frame["context"], counts)
+
+                # Create a new step
+                params = capture_params(args, kwargs) if capture_params else None
+                step_title = format_title(step_title, params)
+                sink = sinks.get_sink()
+                handle = sink.start_step(step_title, params)
+                _enter_recorded(thread_id)
+                try:
+                    result = self._call_step(
+                        step_title, False, target, args, kwargs, scope
+                    )
+                except BaseException as e:
+                    _leave_recorded(thread_id)
+                    if recursion is not None and recursion.depth:
+                        counts = recursion.calls, recursion.max_depth
+                        _annotate_recursion(sink, handle, counts)
+                    sink.stop_step(handle, type(e), e, e.__traceback__)
+                    raise
+                _leave_recorded(thread_id)
+                if recursion is not None and recursion.depth:
+                    counts = recursion.calls, recursion.max_depth
+                    _annotate_recursion(sink, handle, counts)
+                sink.stop_step(handle, None, None, None)
+                return result
+            finally:
+                if started is not None:
+                    add_overhead(started, target.elapsed)
+
+        wrapped = impl
+        if recursion is not None:
+
+            @wraps(func)
+            def collapsed(*args, **kwargs) -> Any:
+                if recursion.enter():
+                    try:
+                        return impl(*args, **kwargs)
+                    finally:
+                        recursion.leave()
+
+                # Recursive call: runs inside the step of the outermost call
+                kwargs.pop("step_title", None)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    recursion.leave()
+
+            wrapped = collapsed
+
+        if self.cache is not None:
+            wrapped = self._wrap_cached(func, wrapped, capture_params)
+        return wrapped
+
+    def _wrap_cached(
+        self,
+        func: Callable,
+        call: Callable,
+        capture_params: Optional[Callable[..., Dict[str, str]]],
+    ) -> Callable:
+        """Serve repeated calls from the step cache, see __call__()."""
+        cache = self.cache
+
+        @wraps(func)
+        def cached(*args, **kwargs) -> Any:
+            step_title = kwargs.pop("step_title", None)
+            key = cache.make_key(func, args, kwargs)
+            if key is not None:
+                found, result = cache.get(key)
+                if found:
+                    self._record_cached_step(
+                        step_title or self.desc, capture_params, args, kwargs
+                    )
+                    return result
+
+            if step_title is not None:
+                kwargs["step_title"] = step_title
+            result = call(*args, **kwargs)
+            if key is not None:
+                cache.put(key, result)
+            return result
+
+        return cached
+
+    def _record_cached_step(
+        self,
+        step_title: str,
+        capture_params: Optional[Callable[..., Dict[str, str]]],
+        args: Any,
+        kwargs: Any,
+    ) -> None:
+        """Record the step of a call answered from the cache."""
+        thread_id = _current_thread_id()
+        step_title = _apply_rules(thread_id, step_title)
+        if self._is_sampled_out(thread_id, step_title):
+            return
+        # No body runs, so only suppression applies from the depth limit
+        scope = _depth_scope(thread_id)
+        if _suppresses_deeper(scope):
+            return
+        if self._can_override_step(thread_id, step_title):
+            return
+
+        params = capture_params(args, kwargs) if capture_params else None
+        step_title = format_title(step_title, params)
+        sink = sinks.get_sink()
+        handle = sink.start_step(step_title, {**(params or {}), "cached": "true"})
+        sink.stop_step(handle, None, None, None)
+
+    def _streaming_step(
+        self,
+        capture_params: Optional[Callable[..., Dict[str, str]]],
+        recursion: Optional[_RecursionTracker],
+        args: Any,
+        kwargs: Any,
+    ) -> _StreamingStep:
+        """Create the step of a generator call; pops step_title from kwargs."""
+        step_title = kwargs.pop("step_title", None) or self.desc
+        return _StreamingStep(
+            self,
+            step_title,
+            lambda: capture_params(args, kwargs) if capture_params else None,
+            recursion,
+        )
+
+    def _wrap_generator(
+        self,
+        func: Callable,
+        capture_params: Optional[Callable[..., Dict[str, str]]],
+        recursion: Optional[_RecursionTracker],
+    ) -> Callable:
+        """Wrap a generator function, see __call__()."""
+
+        def drive(generator: Any, step: _StreamingStep) -> Any:
+            method, value = generator.send, None
+            while True:
+                step.resume()
+                try:
+                    item = method(value)
+                except StopIteration as stop:
+                    step.suspend(False)
+                    error = step.finish(None)
+                    if error is not None:
+                        raise error
+                    return stop.value
+                except BaseException as e:
+                    step.suspend(False)
+                    step.finish(e)
+                    raise
+                step.suspend(True)
+
+                try:
+                    value = yield item
+                    method = generator.send
+                except GeneratorExit:
+                    step.resume()
+                    try:
+                        generator.close()
+                    finally:
+                        step.suspend(False)
+                        step.finish(None)
+                    raise
+                except BaseException as e:
+                    method, value = generator.throw, e
+
+        @wraps(func)
+        def impl(*args, **kwargs) -> Any:
+            step = self._streaming_step(capture_params, recursion, args, kwargs)
+            return drive(func(*args, **kwargs), step)
+
+        return impl
+
+    def _wrap_async_generator(
+        self,
+        func: Callable,
+        capture_params: Optional[Callable[..., Dict[str, str]]],
+        recursion: Optional[_RecursionTracker],
+    ) -> Callable:
+        """Wrap an async generator function, see __call__()."""
+
+        async def drive(generator: Any, step: _StreamingStep) -> Any:
+            method, value = generator.asend, None
+            while True:
+                step.resume()
+                try:
+                    item = await method(value)
+                except StopAsyncIteration:
+                    step.suspend(False)
+                    error = step.finish(None)
+                    if error is not None:
+                        raise error
+                    return
+                except BaseException as e:
+                    step.suspend(False)
+                    step.finish(e)
+                    raise
+                step.suspend(True)
+
+                try:
+                    value = yield item
+                    method = generator.asend
+                except GeneratorExit:
+                    step.resume()
+                    try:
+                        await generator.aclose()
+                    finally:
+                        step.suspend(False)
+                        step.finish(None)
+                    raise
+                except BaseException as e:
+                    method, value = generator.athrow, e
+
+        @wraps(func)
+        def impl(*args, **kwargs) -> Any:
+            step = self._streaming_step(capture_params, recursion, args, kwargs)
+            return drive(func(*args, **kwargs), step)
 
         return impl
 
+    def _param_capture(
+        self, func: Callable
+    ) -> Optional[Callable[[Tuple[Any, ...], Dict[str, Any]], Dict[str, str]]]:
+        """
+        Resolve the parameters of a decorated function once.
+
+        Args:
+            func: Decorated function
+
+        Returns:
+            Function of the call arguments returning the step parameters, or
+            None if no parameters are recorded
+        """
+        if not self.params:
+            return None
+        if isinstance(self.params, Mapping):
+            params = format_params(self.params, self.param_max_length)
+            return lambda args, kwargs: params
+        return ParamRecorder(func, self.params, self.param_max_length).capture
+
     def _can_override_step(self, thread_id: int, step_title: str) -> bool:
         """
         Check if step can be overridden.
@@ -125,11 +1243,12 @@ class AllureStepWrapper:
             return False
 
         external_context = _active_step_contexts[thread_id]
-        if not external_context or not external_context.get("can_override"):
+        if not external_context or not _accepts_override(external_context):
             return False
 
         # Override the step title
         external_context["title"] = step_title
+        external_context["sink"].override_step(external_context["context"], step_title)
 
         # Disable further overrides if allow_multiple is False
         if not external_context.get("allow_multiple", False):
@@ -144,31 +1263,70 @@ class AllureStepWrapper:
         Returns:
             Allure step context or None if overridden
         """
-        thread_id = _current_thread_id()
+        started = start_overhead()
+        try:
+            thread_id = _current_thread_id()
 
-        # Check if we can override an existing step
-        if self._can_override_step_context(thread_id):
-            return None
+            # Rename the step if an enclosing frame has a rule for its title;
+            # the wrapper keeps its own title, as it may be entered again
+            title = _apply_rules(thread_id, self.desc)
 
-        # Create a new step context
-        _active_step_contexts[thread_id] = {
-            "title": self.desc,
-            "can_override": True,
-            "allow_multiple": self.allow_multiple,
-            "context": None,
-        }
+            # Skip recording if the outermost step was not sampled
+            if self._is_sampled_out(thread_id, title):
+                if _decided_frame(thread_id) is None:
+                    self._frame = _push_frame(
+                        thread_id, _new_frame(title, sampled=False)
+                    )
+                return None
 
-        self.step_context = allure.step(self.desc)
-        _active_step_contexts[thread_id]["context"] = self.step_context
+            # Steps nested below a context limiting its override depth; the
+            # block leaves the scope as it is, so deeper steps stay suppressed
+            scope = _depth_scope(thread_id)
+            if _suppresses_deeper(scope):
+                return None
 
-        return self.step_context.__enter__()
+            # Check if we can override an existing step
+            if self._can_override_step_context(thread_id, title):
+                # Steps inside the block are nested one level deeper
+                self._scope = _depth_scope(thread_id)
+                if self._scope is not None:
+                    self._scope["depth"] += 1
+                self._observation = _start_observation(title, True)
+                self._guard = self._start_guard(title)
+                self._profiler = StepProfiler.start(title, self.profile)
+                return None
 
-    def _can_override_step_context(self, thread_id: int) -> bool:
+            # Create a new step context
+            params = None
+            if isinstance(self.params, Mapping) and self.params:
+                params = format_params(self.params, self.param_max_length)
+                title = format_title(title, params)
+            self._sink = sinks.get_sink()
+            self.step_context = self._sink.start_step(title, params)
+
+            frame = _new_frame(title, self.allow_multiple)
+            frame["context"] = self.step_context
+            frame["sink"] = self._sink
+            frame["override_depth"] = self.depth
+            frame["suppress_deeper"] = self.suppress_deeper
+            _push_frame(thread_id, frame)
+            self._frame = frame
+
+            self._observation = _start_observation(title, False)
+            self._guard = self._start_guard(title)
+            self._profiler = StepProfiler.start(title, self.profile)
+            self._capture = StepLogCapture.start(self.capture_logs)
+            return self.step_context
+        finally:
+            add_overhead(started)
+
+    def _can_override_step_context(self, thread_id: int, title: str) -> bool:
         """
         Check if context manager can override an existing step.
 
         Args:
             thread_id: Current thread ID
+            title: Title of the step
 
         Returns:
             True if step was overridden, False otherwise
@@ -177,11 +1335,12 @@ class AllureStepWrapper:
             return False
 
         external_context = _active_step_contexts[thread_id]
-        if not external_context or not external_context.get("can_override"):
+        if not external_context or not _accepts_override(external_context):
             return False
 
         # Always override if can_override is True
-        external_context["title"] = self.desc
+        external_context["title"] = title
+        external_context["sink"].override_step(external_context["context"], title)
 
         # Disable further overrides if allow_multiple is False
         if not external_context.get("allow_multiple", False):
@@ -200,30 +1359,54 @@ class AllureStepWrapper:
             exc_val: Exception value
             exc_tb: Exception traceback
         """
-        thread_id = _current_thread_id()
+        started = start_overhead()
+        try:
+            thread_id = _current_thread_id()
 
-        # If this is an overridden context, don't close it
-        if not hasattr(self, "step_context") or self.step_context is None:
-            return
+            # Attach the profile and report a slow step while the step is open
+            profiler, self._profiler = self._profiler, None
+            if profiler is not None:
+                profiler.finish()
+
+            guard, self._guard = self._guard, None
+            error = guard.finish(exc_val) if guard is not None else None
+            if error is not None:
+                exc_type, exc_val, exc_tb = type(error), error, None
+
+            capture, self._capture = self._capture, None
+            if capture is not None:
+                capture.finish(exc_val)
 
-        # If we own the context, close it
-        if thread_id in _active_step_contexts:
+            observation, self._observation = self._observation, None
+            _finish_observation(observation, exc_val)
+
+            scope, self._scope = self._scope, None
+            if scope is not None:
+                scope["depth"] -= 1
+
+            # If this is an overridden or passthrough context, don't close it
+            frame = self._frame
+            if frame is None:
+                if error is not None:
+                    raise error
+                return
+            self._frame = None
+
+            # We own the context: close the step, if it was sampled, and restore
+            # the outer frame
+            sink, self._sink = self._sink, None
             try:
-                if self.step_context:
-                    self.step_context.__exit__(exc_type, exc_val, exc_tb)
+                if sink is not None:
+                    sink.stop_step(self.step_context, exc_type, exc_val, exc_tb)
             except Exception:
-                # Force close on error
-                try:
-                    if self.step_context:
-                        self.step_context.__exit__(exc_type, exc_val, exc_tb)
-                except Exception:
-                    pass
+                # The step is closed once; a reporting error must not replace
+                # the exception leaving the block
+                if exc_val is None:
+                    raise
             finally:
-                _active_step_contexts.pop(thread_id, None)
-        else:
-            # Just close the step without removing context
-            try:
-                if self.step_context:
-                    self.step_context.__exit__(exc_type, exc_val, exc_tb)
-            except Exception:
-                pass
+                _pop_frame(thread_id, frame)
+
+            if error is not None:
+                raise error
+        finally:
+            add_overhead(started)
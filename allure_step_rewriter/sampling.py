@@ -0,0 +1,111 @@
+"""
+Sampling of top-level steps.
+
+A sampler decides, once per outermost ``rewrite_step`` context or decorated
+call, whether the step is recorded. Unsampled steps take the passthrough
+path: no Allure step is created for them or for anything nested inside.
+"""
+
+import random
+import threading
+from typing import Dict, Optional
+
+
+class StepSampler:
+    """
+    Deterministic or random sampler for top-level steps.
+
+    Examples:
+        Record the first of every 100 iterations of each title:
+            >>> set_sampler(StepSampler(every=100))
+
+        Record about 5% of top-level steps, reproducibly:
+            >>> set_sampler(StepSampler(rate=0.05, seed=42))
+
+        Record at most 200 top-level steps until the next reset():
+            >>> set_sampler(StepSampler(budget=200))
+    """
+
+    def __init__(
+        self,
+        every: int = 1,
+        rate: float = 1.0,
+        seed: Optional[int] = None,
+        budget: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the sampler.
+
+        Args:
+            every: Record one in ``every`` steps of the same title (default: 1)
+            rate: Probability of recording a step, from 0.0 to 1.0 (default: 1.0)
+            seed: Seed for the random generator used with ``rate`` (optional)
+            budget: Record at most this many steps until reset() (optional)
+        """
+        if every < 1:
+            raise ValueError(f"every must be a positive integer, got {every}")
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"rate must be between 0.0 and 1.0, got {rate}")
+        if budget is not None and budget < 0:
+            raise ValueError(f"budget must not be negative, got {budget}")
+
+        self.every = every
+        self.rate = rate
+        self.budget = budget
+        self._recorded = 0
+        self._random = random.Random(seed)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def should_record(self, title: str) -> bool:
+        """
+        Decide whether a top-level step is recorded.
+
+        Args:
+            title: Step title
+
+        Returns:
+            True if the step should be recorded, False otherwise
+        """
+        with self._lock:
+            if self.every > 1:
+                count = self._counters.get(title, 0)
+                self._counters[title] = count + 1
+                if count % self.every:
+                    return False
+
+            if self.rate < 1.0 and self._random.random() >= self.rate:
+                return False
+
+            if self.budget is not None:
+                if self._recorded >= self.budget:
+                    return False
+                self._recorded += 1
+
+        return True
+
+    def reset(self) -> None:
+        """Reset per-title iteration counters and the budget."""
+        with self._lock:
+            self._counters.clear()
+            self._recorded = 0
+
+
+# Session-wide sampler used when a step does not define its own
+_sampler: Optional[StepSampler] = None
+
+
+def set_sampler(sampler: Optional[StepSampler]) -> None:
+    """
+    Set the session-wide sampler.
+
+    Args:
+        sampler: Sampler instance, or None to record every step
+    """
+    global _sampler
+    _sampler = sampler
+
+
+def get_sampler() -> Optional[StepSampler]:
+    """Get the session-wide sampler."""
+    return _sampler
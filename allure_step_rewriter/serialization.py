@@ -0,0 +1,189 @@
+"""
+JSON serialisation of results written by the rewriter.
+
+The fastest installed backend is used: orjson, then ujson, then the standard
+library. Allure model objects (attrs classes) and StepRecord trees are
+encoded as they are, one object at a time through the backend's ``default``
+hook, instead of being converted to a tree of dicts first. Data nested too
+deep for orjson or ujson is encoded by the standard library instead.
+"""
+
+import enum
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+import attr
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - depends on the environment
+    ujson = None
+
+BACKENDS = ("orjson", "ujson", "json")
+
+
+def encode_default(obj: Any) -> Any:
+    """
+    Encode an object the JSON backend does not know.
+
+    Attrs instances (the Allure model) become a dict of their fields, without
+    empty values, like ``AllureFileLogger`` writes them. Objects with a
+    ``__json__()`` method, e.g. StepRecord, are encoded by its return value.
+
+    Args:
+        obj: Object to encode
+
+    Returns:
+        JSON-compatible replacement, encoded further by the backend
+
+    Raises:
+        TypeError: If the object cannot be encoded
+    """
+    if attr.has(type(obj)):
+        fields: Dict[str, Any] = {}
+        for field in attr.fields(type(obj)):
+            value = getattr(obj, field.name)
+            if value or value is False:
+                fields[field.name] = value
+        return fields
+    json_method = getattr(obj, "__json__", None)
+    if json_method is not None:
+        return json_method()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_dumps(data: Any) -> bytes:
+    try:
+        return orjson.dumps(data, default=encode_default)
+    except orjson.JSONEncodeError:
+        # orjson stops at 255 levels of nesting, about 130 nested steps
+        return _json_dumps(data)
+
+
+def _ujson_dumps(data: Any) -> bytes:
+    try:
+        encoded = ujson.dumps(data, default=encode_default, ensure_ascii=False)
+    except OverflowError:
+        # ujson stops at 1024 levels of nesting
+        return _json_dumps(data)
+    return encoded.encode("utf-8")
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, default=encode_default, ensure_ascii=False).encode("utf-8")
+
+
+_DUMPS: Dict[str, Callable[[Any], bytes]] = {
+    "orjson": _orjson_dumps,
+    "ujson": _ujson_dumps,
+    "json": _json_dumps,
+}
+_LOADS: Dict[str, Callable[[bytes], Any]] = {
+    "orjson": lambda data: orjson.loads(data),
+    "ujson": lambda data: ujson.loads(data),
+    "json": json.loads,
+}
+
+_INSTALLED = {"orjson": orjson is not None, "ujson": ujson is not None, "json": True}
+
+# Backend in use
+_backend = next(name for name in BACKENDS if _INSTALLED[name])
+
+
+def available_backends() -> Dict[str, bool]:
+    """Get the known backends and whether each is installed."""
+    return dict(_INSTALLED)
+
+
+def set_backend(name: Optional[str] = None) -> str:
+    """
+    Select the JSON backend.
+
+    Args:
+        name: "orjson", "ujson" or "json"; None for the fastest installed one
+
+    Returns:
+        Name of the selected backend
+
+    Raises:
+        ValueError: If the backend is unknown or not installed
+    """
+    global _backend
+
+    if name is None:
+        name = next(backend for backend in BACKENDS if _INSTALLED[backend])
+    if name not in _INSTALLED:
+        raise ValueError(f"Unknown JSON backend: {name!r}")
+    if not _INSTALLED[name]:
+        raise ValueError(f"JSON backend {name!r} is not installed")
+    _backend = name
+    return name
+
+
+def get_backend() -> str:
+    """Get the name of the JSON backend in use."""
+    return _backend
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Encode data as UTF-8 JSON.
+
+    Args:
+        data: Data, may contain Allure model objects and StepRecords
+
+    Returns:
+        Encoded JSON
+    """
+    return _DUMPS[_backend](data)
+
+
+def loads(data: bytes) -> Any:
+    """
+    Decode JSON.
+
+    Args:
+        data: Encoded JSON
+
+    Returns:
+        Decoded data
+    """
+    return _LOADS[_backend](data)
+
+
+def read_file(path: str) -> Any:
+    """Read a JSON file."""
+    with open(path, "rb") as json_file:
+        return loads(json_file.read())
+
+
+def write_file_atomic(path: str, data: Any) -> None:
+    """
+    Write a JSON file atomically: to a temporary file, then replace.
+
+    The temporary file is removed if encoding or writing fails, and the
+    destination is left as it was.
+
+    Args:
+        path: Destination path
+        data: Data to write
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as json_file:
+            json_file.write(dumps(data))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
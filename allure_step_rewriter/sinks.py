@@ -0,0 +1,781 @@
+"""
+Step sinks.
+
+A sink is where the rewriter sends the steps it creates. AllureSink (the
+default) reports them through ``allure.step`` and ``allure.attach``,
+NullSink drops them, and MemorySink keeps them as an in-memory tree for
+assertions and benchmarks. Streamed attachments are written through an
+AttachmentWriter opened by the sink.
+"""
+
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import allure
+import allure_commons
+from allure_commons.logger import AllureFileLogger
+from allure_commons.model2 import (
+    ATTACHMENT_PATTERN,
+    Attachment,
+    ExecutableItem,
+    Parameter,
+    StatusDetails,
+    TestStepResult,
+)
+from allure_commons.reporter import AllureReporter
+from allure_commons.types import AttachmentType
+
+from allure_step_rewriter import detail, serialization
+from allure_step_rewriter.dedup import ContentIndex, get_content_index
+from allure_step_rewriter.failures import (
+    clear_failure_record,
+    failure_capture_enabled,
+    failure_details,
+    step_status,
+)
+from allure_step_rewriter.writer import BackgroundFileLogger
+
+
+def resolve_attachment_type(
+    attachment_type: Any = None, extension: Optional[str] = None
+) -> Tuple[Optional[str], str]:
+    """
+    Get the MIME type and file extension of an attachment, like Allure does.
+
+    Args:
+        attachment_type: Allure attachment type or MIME type (optional)
+        extension: File extension (optional)
+
+    Returns:
+        Tuple of MIME type and extension
+    """
+    if isinstance(attachment_type, AttachmentType):
+        return attachment_type.mime_type, attachment_type.extension
+    return attachment_type, extension or "attach"
+
+
+class AttachmentWriter:
+    """
+    Binary writer of one streamed attachment.
+
+    Written data becomes an attachment on close(); discard() drops it.
+    """
+
+    def write(self, data: bytes) -> None:
+        """Write a chunk of the attachment."""
+        raise NotImplementedError
+
+    def close(self, digest: Optional[str] = None) -> None:
+        """
+        Finish the attachment and attach it.
+
+        Args:
+            digest: Content digest of the written data, used to deduplicate
+                it (optional)
+        """
+        raise NotImplementedError
+
+    def discard(self) -> None:
+        """Drop the attachment."""
+        raise NotImplementedError
+
+    def reuse(self, digest: str) -> bool:
+        """
+        Attach an already written file with the same content instead.
+
+        Args:
+            digest: Content digest
+
+        Returns:
+            True if a file was reused and the writer is done, False if the
+            content has to be written
+        """
+        return False
+
+
+class BufferAttachmentWriter(AttachmentWriter):
+    """Writer collecting the attachment in memory."""
+
+    def __init__(self, commit: Callable[[bytes], None]) -> None:
+        """
+        Initialize the writer.
+
+        Args:
+            commit: Called with the attachment content on close
+        """
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._commit = commit
+
+    def write(self, data: bytes) -> None:
+        """Buffer a chunk."""
+        self._buffer.write(data)
+
+    def close(self, digest: Optional[str] = None) -> None:
+        """Pass the buffered content to the commit callback."""
+        if self._buffer is None:
+            return
+        body, self._buffer = self._buffer.getvalue(), None
+        self._commit(body)
+
+    def discard(self) -> None:
+        """Drop the buffered content."""
+        self._buffer = None
+
+
+class FileAttachmentWriter(AttachmentWriter):
+    """
+    Writer streaming the attachment to a file, replaced atomically on close.
+
+    With a content index, a file already holding the same content is
+    committed instead and the written copy is dropped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        commit: Callable[[str], None],
+        index: Optional[ContentIndex] = None,
+    ) -> None:
+        """
+        Initialize the writer and open a temporary file next to the path.
+
+        Args:
+            path: Destination path
+            commit: Called on close with the path of the file to attach
+            index: Content index used to deduplicate files (optional)
+        """
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        self._file: Optional[Any] = open(self._tmp_path, "wb")
+        self._commit = commit
+        self._index = index
+
+    def write(self, data: bytes) -> None:
+        """Write a chunk to the file."""
+        self._file.write(data)
+
+    def close(self, digest: Optional[str] = None) -> None:
+        """Move the file in place and pass its path to the commit callback."""
+        if self._file is None:
+            return
+        if digest is not None and self.reuse(digest):
+            return
+
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+        if digest is not None and self._index is not None:
+            self._index.add(digest, self.path)
+        self._commit(self.path)
+
+    def reuse(self, digest: str) -> bool:
+        """Commit the indexed file with the same content, if any."""
+        if self._index is None or self._file is None:
+            return False
+        existing = self._index.find(digest, os.path.dirname(self.path))
+        if existing is None:
+            return False
+
+        self.discard()
+        self._index.reference(existing)
+        self._commit(existing)
+        return True
+
+    def discard(self) -> None:
+        """Remove the temporary file."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+
+def _set_parameters(step: TestStepResult, params: Dict[str, str]) -> None:
+    """Set parameters of an Allure step, replacing those of the same name."""
+    step.parameters = [
+        parameter for parameter in step.parameters if parameter.name not in params
+    ]
+    for name, value in params.items():
+        step.parameters.append(Parameter(name=name, value=value))
+
+
+def _allure_reporter() -> Optional[AllureReporter]:
+    """Find the running Allure reporter, or None if there is none."""
+    for plugin in allure_commons.plugin_manager.get_plugins():
+        if isinstance(getattr(plugin, "allure_logger", None), AllureReporter):
+            return plugin.allure_logger
+    return None
+
+
+def _allure_results_target() -> Optional[Tuple[AllureReporter, str]]:
+    """
+    Find the running Allure reporter and its results directory.
+
+    Returns:
+        Tuple of reporter and results directory, or None if Allure does not
+        write results to a directory in this process
+    """
+    reporter = _allure_reporter()
+    report_dir = None
+    for plugin in allure_commons.plugin_manager.get_plugins():
+        if isinstance(plugin, AllureFileLogger):
+            report_dir = os.path.abspath(plugin._report_dir)
+        elif isinstance(plugin, BackgroundFileLogger):
+            report_dir = os.path.abspath(plugin.report_dir)
+    if reporter is None or report_dir is None:
+        return None
+    return reporter, report_dir
+
+
+class StepSink:
+    """Destination of the steps created by the rewriter."""
+
+    # False for sinks that drop every step
+    recording = True
+
+    def start_step(self, title: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Open a step on the current thread.
+
+        Args:
+            title: Step title
+            params: Step parameters (optional)
+
+        Returns:
+            Handle passed back to stop_step
+        """
+        raise NotImplementedError
+
+    def stop_step(self, handle: Any, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """
+        Close a step opened by start_step.
+
+        Args:
+            handle: Handle returned by start_step
+            exc_type: Exception type
+            exc_val: Exception value
+            exc_tb: Exception traceback
+        """
+        raise NotImplementedError
+
+    def override_step(self, handle: Any, title: str) -> None:
+        """
+        Note that a step was merged into an open step.
+
+        Args:
+            handle: Handle of the open step returned by start_step
+            title: Title of the merged step
+        """
+
+    def annotate_step(self, handle: Any, params: Dict[str, str]) -> None:
+        """
+        Add parameters to an open step.
+
+        Args:
+            handle: Handle of the open step returned by start_step
+            params: Parameter names and values
+        """
+
+    def annotate_current_step(self, params: Dict[str, str]) -> None:
+        """
+        Add parameters to the innermost open step of the current thread.
+
+        Args:
+            params: Parameter names and values
+        """
+
+    def attach(
+        self,
+        body: Any,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> None:
+        """
+        Attach data to the innermost open step of the current thread.
+
+        Args:
+            body: Attachment content
+            name: Attachment name (optional)
+            attachment_type: Allure attachment type or MIME type (optional)
+            extension: File extension (optional)
+        """
+        raise NotImplementedError
+
+    def open_attachment(
+        self,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> Optional[AttachmentWriter]:
+        """
+        Open a streamed attachment of the innermost open step.
+
+        The default implementation buffers the content and passes it to
+        attach() on close.
+
+        Args:
+            name: Attachment name (optional)
+            attachment_type: Allure attachment type or MIME type (optional)
+            extension: File extension (optional)
+
+        Returns:
+            Writer, or None if the sink drops attachments
+        """
+        return BufferAttachmentWriter(
+            lambda body: self.attach(body, name, attachment_type, extension)
+        )
+
+
+class AllureSink(StepSink):
+    """Sink reporting steps through allure-pytest."""
+
+    def start_step(self, title: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Open an Allure step."""
+        context = allure.step(title)
+        if params:
+            context.params = params
+        context.__enter__()
+        if detail.get_detail_mode() == detail.DETAIL_FAILURE:
+            reporter = _allure_reporter()
+            step = reporter.get_item(context.uuid) if reporter is not None else None
+            if step is not None:
+                detail.rewriter_step_started(context.uuid, step)
+        return context
+
+    def stop_step(self, handle: Any, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """
+        Close an Allure step.
+
+        With set_failure_capture(), a failed step is closed as passed and
+        then given its status and the compact details of failure_details(),
+        so allure-pytest does not format the traceback.
+        """
+        detail.rewriter_step_stopped(handle.uuid)
+        if exc_val is None or not failure_capture_enabled():
+            handle.__exit__(exc_type, exc_val, exc_tb)
+            return
+
+        reporter = _allure_reporter()
+        step = reporter.get_item(handle.uuid) if reporter is not None else None
+        if step is None:
+            handle.__exit__(exc_type, exc_val, exc_tb)
+            return
+        message, trace = failure_details(exc_val, step.name)
+        handle.__exit__(None, None, None)
+        step.status = step_status(exc_val)
+        step.statusDetails = StatusDetails(message=message, trace=trace)
+        if reporter.get_last_item(TestStepResult) is None:
+            clear_failure_record()
+
+    def annotate_step(self, handle: Any, params: Dict[str, str]) -> None:
+        """Add parameters to an open Allure step, replacing those of the same name."""
+        reporter = _allure_reporter()
+        step = reporter.get_item(handle.uuid) if reporter is not None else None
+        if step is not None:
+            _set_parameters(step, params)
+
+    def annotate_current_step(self, params: Dict[str, str]) -> None:
+        """Add parameters to the current Allure step, replacing same-named ones."""
+        reporter = _allure_reporter()
+        step = reporter.get_last_item(TestStepResult) if reporter is not None else None
+        if step is not None:
+            _set_parameters(step, params)
+
+    def attach(
+        self,
+        body: Any,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> None:
+        """
+        Attach data to the current Allure step.
+
+        In "failure" detail mode, data attached below a top-level step is
+        held until the test outcome is known, as the step may be dropped.
+        """
+        reporter = _allure_reporter() if detail.tracking_steps() else None
+        item = reporter.get_last_item(ExecutableItem) if reporter is not None else None
+        if item is not None and detail.defers_attachments_of(item):
+            mime_type, file_extension = resolve_attachment_type(
+                attachment_type, extension
+            )
+            file_name = ATTACHMENT_PATTERN.format(
+                prefix=uuid.uuid4(), ext=file_extension
+            )
+            item.attachments.append(
+                Attachment(name=name, source=file_name, type=mime_type)
+            )
+            detail.defer_attachment(file_name, body)
+            return
+        allure.attach(
+            body, name=name, attachment_type=attachment_type, extension=extension
+        )
+
+    def open_attachment(
+        self,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> Optional[AttachmentWriter]:
+        """
+        Stream an attachment into the Allure results directory.
+
+        Without a results directory in this process (e.g. another Allure
+        integration is active), the attachment is streamed to a temporary
+        file and attached with ``allure.attach.file``.
+        """
+        target = _allure_results_target()
+        if target is None:
+            fd, path = tempfile.mkstemp(prefix="allure-step-attachment-")
+            os.close(fd)
+
+            def attach_file(path: str) -> None:
+                try:
+                    allure.attach.file(
+                        path,
+                        name=name,
+                        attachment_type=attachment_type,
+                        extension=extension,
+                    )
+                finally:
+                    os.remove(path)
+
+            return FileAttachmentWriter(path, attach_file)
+
+        reporter, report_dir = target
+        mime_type, file_extension = resolve_attachment_type(attachment_type, extension)
+        file_name = ATTACHMENT_PATTERN.format(prefix=uuid.uuid4(), ext=file_extension)
+
+        def add_attachment(path: str) -> None:
+            item = reporter.get_last_item(ExecutableItem)
+            if item is None:
+                return
+            item.attachments.append(
+                Attachment(name=name, source=os.path.basename(path), type=mime_type)
+            )
+
+        return FileAttachmentWriter(
+            os.path.join(report_dir, file_name), add_attachment, get_content_index()
+        )
+
+
+class NullSink(StepSink):
+    """Sink dropping every step, for runs without reporting."""
+
+    recording = False
+
+    _HANDLE = object()
+
+    def start_step(self, title: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Drop the step."""
+        return self._HANDLE
+
+    def stop_step(self, handle: Any, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Drop the step."""
+
+    def attach(
+        self,
+        body: Any,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> None:
+        """Drop the attachment."""
+
+    def open_attachment(
+        self,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> Optional[AttachmentWriter]:
+        """Drop the attachment without reading it."""
+        return None
+
+
+class StepRecord:
+    """Step recorded by MemorySink."""
+
+    __slots__ = (
+        "title",
+        "params",
+        "status",
+        "start",
+        "stop",
+        "steps",
+        "attachments",
+        "overrides",
+        "parent",
+    )
+
+    def __init__(
+        self,
+        title: str,
+        params: Optional[Dict[str, Any]] = None,
+        parent: Optional["StepRecord"] = None,
+    ) -> None:
+        """
+        Initialize a running step.
+
+        Args:
+            title: Step title
+            params: Step parameters (optional)
+            parent: Enclosing step (optional)
+        """
+        self.title = title
+        self.params = params or {}
+        self.status: Optional[str] = None
+        self.start = time.perf_counter()
+        self.stop: Optional[float] = None
+        self.steps: List["StepRecord"] = []
+        self.attachments: List[Dict[str, Any]] = []
+        self.overrides: List[str] = []
+        self.parent = parent
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Step duration in seconds, or None while the step is running."""
+        return None if self.stop is None else self.stop - self.start
+
+    @property
+    def overridden(self) -> bool:
+        """True if other steps were merged into this one."""
+        return bool(self.overrides)
+
+    def find(self, title: str) -> Optional["StepRecord"]:
+        """
+        Find the first step of the subtree with a title, depth first.
+
+        Args:
+            title: Step title
+
+        Returns:
+            Step record, or None if not found
+        """
+        for step in self.steps:
+            if step.title == title:
+                return step
+            found = step.find(title)
+            if found is not None:
+                return found
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the subtree to plain dicts, e.g. for snapshot assertions."""
+        return {
+            "title": self.title,
+            "status": self.status,
+            "duration": self.duration,
+            "overrides": list(self.overrides),
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+    def __json__(self) -> Dict[str, Any]:
+        """Get the fields encoded by allure_step_rewriter.serialization."""
+        return {
+            "title": self.title,
+            "status": self.status,
+            "duration": self.duration,
+            "overrides": self.overrides,
+            "steps": self.steps,
+        }
+
+    def titles(self) -> List[Any]:
+        """
+        Get the titles of the subtree.
+
+        Returns:
+            Nested list: each step is its title, or a (title, children) tuple
+            when it has nested steps
+        """
+        return [
+            (step.title, step.titles()) if step.steps else step.title
+            for step in self.steps
+        ]
+
+    def __repr__(self) -> str:
+        return f"StepRecord({self.title!r}, status={self.status!r})"
+
+
+class MemorySink(StepSink):
+    """
+    Sink keeping steps as an in-memory tree.
+
+    Example:
+        >>> sink = MemorySink()
+        >>> set_sink(sink)
+        >>> with rewrite_step("Parent"):
+        >>>     with allure.step("Child"):  # Not seen: not created by the rewriter
+        >>>         pass
+        >>> sink.titles()
+        ['Parent']
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty tree."""
+        self.root = StepRecord("")
+        # Open steps of each thread, innermost last
+        self._open: Dict[int, List[StepRecord]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def steps(self) -> List[StepRecord]:
+        """Top-level recorded steps."""
+        return self.root.steps
+
+    def find(self, title: str) -> Optional[StepRecord]:
+        """Find the first recorded step with a title, see StepRecord.find()."""
+        return self.root.find(title)
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        """Convert the recorded tree to plain dicts, see StepRecord.to_dict()."""
+        return [step.to_dict() for step in self.root.steps]
+
+    def to_json(self) -> bytes:
+        """Encode the recorded tree as JSON, without building dicts first."""
+        return serialization.dumps(self.root.steps)
+
+    def titles(self) -> List[Any]:
+        """Get the titles of the recorded tree, see StepRecord.titles()."""
+        return self.root.titles()
+
+    def clear(self) -> None:
+        """Drop all recorded steps."""
+        with self._lock:
+            self.root.steps.clear()
+            self.root.attachments.clear()
+            self._open.clear()
+
+    def current_step(self) -> StepRecord:
+        """Get the innermost open step of the current thread (or the root)."""
+        steps = self._open.get(threading.get_ident())
+        return steps[-1] if steps else self.root
+
+    def start_step(self, title: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Record a new step under the innermost open step."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            steps = self._open.setdefault(thread_id, [])
+            parent = steps[-1] if steps else self.root
+            record = StepRecord(title, params, parent)
+            parent.steps.append(record)
+            steps.append(record)
+        return record
+
+    def stop_step(self, handle: Any, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """
+        Finish a recorded step.
+
+        Steps may close out of order, e.g. a generator step exhausted while
+        a step of its consumer is open: only the closed step stops being a
+        parent of new steps.
+        """
+        handle.stop = time.perf_counter()
+        handle.status = step_status(exc_val)
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            steps = self._open.get(thread_id)
+            if steps and steps[-1] is handle:
+                steps.pop()
+                if not steps:
+                    del self._open[thread_id]
+                return
+
+            for owner, steps in list(self._open.items()):
+                if handle in steps:
+                    steps.remove(handle)
+                    if not steps:
+                        del self._open[owner]
+                    break
+
+    def override_step(self, handle: Any, title: str) -> None:
+        """Record the title of a step merged into an open step."""
+        handle.overrides.append(title)
+
+    def annotate_step(self, handle: Any, params: Dict[str, str]) -> None:
+        """Record parameters added to an open step."""
+        handle.params.update(params)
+
+    def annotate_current_step(self, params: Dict[str, str]) -> None:
+        """Record parameters added to the innermost open step."""
+        self.current_step().params.update(params)
+
+    def attach(
+        self,
+        body: Any,
+        name: Optional[str] = None,
+        attachment_type: Any = None,
+        extension: Optional[str] = None,
+    ) -> None:
+        """Record an attachment on the innermost open step."""
+        self.current_step().attachments.append(
+            {
+                "name": name,
+                "body": body,
+                "attachment_type": attachment_type,
+                "extension": extension,
+            }
+        )
+
+
+# Sink used for new steps
+_sink: StepSink = AllureSink()
+
+
+def set_sink(sink: StepSink) -> StepSink:
+    """
+    Set the sink used for new steps.
+
+    Args:
+        sink: Sink instance
+
+    Returns:
+        The previous sink
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def get_sink() -> StepSink:
+    """Get the sink used for new steps."""
+    return _sink
+
+
+@contextmanager
+def capture_steps() -> Iterator[MemorySink]:
+    """
+    Capture the steps created inside the block in memory.
+
+    Steps go to a fresh MemorySink instead of the current sink; nothing is
+    reported to Allure while the block runs. Steps are still counted by the
+    metrics set with set_metrics(), if any.
+
+    Example:
+        >>> with capture_steps() as steps:
+        >>>     with rewrite_step("Parent"):
+        >>>         get_data()
+        >>> assert steps.titles() == ["Parent"]
+        >>> assert steps.find("Parent").overrides == ["Get data"]
+
+    Yields:
+        MemorySink holding the captured tree
+    """
+    # metrics imports this module
+    from allure_step_rewriter.metrics import MeteredSink, get_metrics
+
+    sink = MemorySink()
+    metrics = get_metrics()
+    previous = set_sink(sink if metrics is None else MeteredSink(sink, metrics))
+    try:
+        yield sink
+    finally:
+        set_sink(previous)
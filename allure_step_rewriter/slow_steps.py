@@ -0,0 +1,285 @@
+"""
+Slow step detection.
+
+A step that runs longer than ``warn_after`` seconds emits a SlowStepWarning,
+gets a "Slow step" attachment and is tagged with a ``slow`` parameter
+holding its duration, so slow steps can be filtered in the report. A step
+that runs longer than ``fail_after`` seconds fails with SlowStepError. With
+``capture_stack`` enabled, a watchdog thread samples the stack of the
+running thread once the warning threshold passes, so the attachment shows
+where the step was stuck.
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+import traceback
+import warnings
+from types import FrameType
+from typing import List, Optional, Tuple
+
+import allure
+
+from allure_step_rewriter.sinks import get_sink
+
+
+class SlowStepWarning(UserWarning):
+    """Warning emitted when a step exceeds its warn_after threshold."""
+
+
+class SlowStepError(AssertionError):
+    """Raised when a step exceeds its fail_after threshold."""
+
+
+# Parameter tagging slow steps with their duration
+SLOW_PARAMETER = "slow"
+
+# Session-wide thresholds used when a step does not define its own
+_default_warn_after: Optional[float] = None
+_default_fail_after: Optional[float] = None
+_default_capture_stack = False
+
+
+def set_slow_step_thresholds(
+    warn_after: Optional[float] = None,
+    fail_after: Optional[float] = None,
+    capture_stack: bool = False,
+) -> None:
+    """
+    Set session-wide slow step thresholds.
+
+    Args:
+        warn_after: Warn about steps slower than this, in seconds (optional)
+        fail_after: Fail steps slower than this, in seconds (optional)
+        capture_stack: Sample the stack of slow steps (default: False)
+    """
+    global _default_warn_after, _default_fail_after, _default_capture_stack
+    _default_warn_after = warn_after
+    _default_fail_after = fail_after
+    _default_capture_stack = capture_stack
+
+
+class _Watchdog:
+    """
+    Single background thread sampling stacks of steps past a deadline.
+
+    Guards of finished steps are purged from the heap once they make up
+    most of it, so many fast steps with long thresholds do not pile up.
+    """
+
+    # Entries of finished steps tolerated in the heap before a purge
+    PURGE_SLACK = 64
+
+    def __init__(self) -> None:
+        """Initialize the watchdog; the thread starts on first use."""
+        self._heap: List[Tuple[float, int, "SlowStepGuard"]] = []
+        self._running = 0
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, guard: "SlowStepGuard", deadline: float) -> None:
+        """
+        Sample the stack of a guarded step at a deadline.
+
+        Args:
+            guard: Guard of the running step
+            deadline: time.monotonic() value at which to sample
+        """
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), guard))
+            self._running += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="allure-step-watchdog", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def forget(self, guard: "SlowStepGuard") -> None:
+        """
+        Stop watching a finished step.
+
+        Args:
+            guard: Guard passed to watch(), already finished
+        """
+        with self._condition:
+            self._running -= 1
+            if len(self._heap) > 2 * self._running + self.PURGE_SLACK:
+                self._heap = [entry for entry in self._heap if not entry[2].finished]
+                heapq.heapify(self._heap)
+
+    def _run(self) -> None:
+        """Wait for deadlines and sample stacks of steps still running."""
+        while True:
+            with self._condition:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                deadline, _, guard = self._heap[0]
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+                heapq.heappop(self._heap)
+
+            if not guard.finished:
+                frame = sys._current_frames().get(guard.thread_id)
+                if frame is not None:
+                    guard.stack = "".join(traceback.format_stack(frame))
+
+
+_watchdog = _Watchdog()
+
+
+def _caller_frame() -> Optional[FrameType]:
+    """Get the innermost frame outside of the rewriter package."""
+    frame: Optional[FrameType] = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__", "").startswith(
+        "allure_step_rewriter"
+    ):
+        frame = frame.f_back
+    return frame
+
+
+def _warn_slow(message: str) -> None:
+    """
+    Emit a SlowStepWarning at the code that ran the step.
+
+    The number of rewriter frames between the step and its caller depends on
+    how the step was run (decorated call, context manager or generator), so
+    the warning is attributed to the first frame outside of the package.
+    """
+    frame = _caller_frame()
+    if frame is None:
+        warnings.warn(message, SlowStepWarning)
+        return
+    warnings.warn_explicit(
+        message,
+        SlowStepWarning,
+        frame.f_code.co_filename,
+        frame.f_lineno,
+        module=frame.f_globals.get("__name__"),
+        registry=frame.f_globals.setdefault("__warningregistry__", {}),
+        module_globals=frame.f_globals,
+    )
+
+
+class SlowStepGuard:
+    """Measures one step against its thresholds."""
+
+    __slots__ = (
+        "title",
+        "warn_after",
+        "fail_after",
+        "thread_id",
+        "started",
+        "finished",
+        "watched",
+        "stack",
+    )
+
+    def __init__(
+        self,
+        title: str,
+        warn_after: Optional[float],
+        fail_after: Optional[float],
+        capture_stack: bool,
+    ) -> None:
+        """
+        Start measuring a step.
+
+        Args:
+            title: Step title
+            warn_after: Warning threshold in seconds (optional)
+            fail_after: Failure threshold in seconds (optional)
+            capture_stack: Sample the stack once a threshold passes
+        """
+        self.title = title
+        self.warn_after = warn_after
+        self.fail_after = fail_after
+        self.thread_id = threading.get_ident()
+        self.finished = False
+        self.stack: Optional[str] = None
+        self.started = time.monotonic()
+
+        thresholds = [value for value in (warn_after, fail_after) if value is not None]
+        self.watched = bool(capture_stack and thresholds)
+        if self.watched:
+            _watchdog.watch(self, self.started + min(thresholds))
+
+    @classmethod
+    def start(
+        cls,
+        title: str,
+        warn_after: Optional[float] = None,
+        fail_after: Optional[float] = None,
+        capture_stack: Optional[bool] = None,
+    ) -> Optional["SlowStepGuard"]:
+        """
+        Start measuring a step if any threshold applies to it.
+
+        Args:
+            title: Step title
+            warn_after: Step threshold, or None for the session-wide one
+            fail_after: Step threshold, or None for the session-wide one
+            capture_stack: Step setting, or None for the session-wide one
+
+        Returns:
+            Guard instance, or None if the step has no thresholds
+        """
+        if warn_after is None:
+            warn_after = _default_warn_after
+        if fail_after is None:
+            fail_after = _default_fail_after
+        if warn_after is None and fail_after is None:
+            return None
+
+        if capture_stack is None:
+            capture_stack = _default_capture_stack
+        return cls(title, warn_after, fail_after, capture_stack)
+
+    def finish(
+        self, exc_val: Optional[BaseException] = None
+    ) -> Optional[SlowStepError]:
+        """
+        Stop measuring and report the step if it was slow.
+
+        Must be called while the step is still open, so the "Slow step"
+        attachment lands on it.
+
+        Args:
+            exc_val: Exception raised inside the step, if any
+
+        Returns:
+            SlowStepError to raise if the step exceeded fail_after and did not
+            fail already, None otherwise
+        """
+        self.finished = True
+        elapsed = time.monotonic() - self.started
+        if self.watched:
+            _watchdog.forget(self)
+
+        failed = self.fail_after is not None and elapsed > self.fail_after
+        warned = self.warn_after is not None and elapsed > self.warn_after
+        if not failed and not warned:
+            return None
+
+        threshold = self.fail_after if failed else self.warn_after
+        message = (
+            f"Step {self.title!r} took {elapsed:.3f}s "
+            f"({'fail' if failed else 'warn'}_after={threshold}s)"
+        )
+        body = message if self.stack is None else f"{message}\n\n{self.stack}"
+        sink = get_sink()
+        sink.attach(body, name="Slow step", attachment_type=allure.attachment_type.TEXT)
+        sink.annotate_current_step({SLOW_PARAMETER: f"{elapsed:.3f}s"})
+
+        if failed and exc_val is None:
+            return SlowStepError(message)
+        _warn_slow(message)
+        return None
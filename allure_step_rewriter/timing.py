@@ -0,0 +1,216 @@
+"""
+Per-title step timing aggregation.
+
+TimingRecorder is a step observer that aggregates wall-clock and CPU time of
+every step title into fixed-bucket histograms. Buckets are allocated once per
+title, so recording a step does not allocate.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from allure_step_rewriter.observers import StepObserver
+
+# Upper bounds of histogram buckets in seconds: four buckets per doubling,
+# from 1 microsecond to about 18 minutes. One extra bucket holds the overflow.
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** (i / 4) for i in range(121))
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """
+        Record a duration.
+
+        Args:
+            value: Duration in seconds
+        """
+        self.counts[bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile from the buckets.
+
+        Args:
+            q: Percentile, from 0 to 100
+
+        Returns:
+            Upper bound of the bucket holding the percentile, capped at max
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                if index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[index], self.max)
+                break
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        """Summarise the histogram."""
+        return {
+            "total": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max,
+        }
+
+
+class TitleStats:
+    """Timings of one step title."""
+
+    __slots__ = ("title", "wall", "cpu", "created", "overridden", "nested")
+
+    def __init__(self, title: str) -> None:
+        """
+        Initialize empty stats.
+
+        Args:
+            title: Step title
+        """
+        self.title = title
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.created = 0
+        self.overridden = 0
+        self.nested = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarise the stats."""
+        return {
+            "title": self.title,
+            "count": self.wall.count,
+            "created": self.created,
+            "overridden": self.overridden,
+            "nested": self.nested,
+            "wall": self.wall.to_dict(),
+            "cpu": self.cpu.to_dict(),
+        }
+
+
+class TimingRecorder(StepObserver):
+    """
+    Step observer aggregating timings per step title.
+
+    Steps are counted as created (outermost), nested (created inside another
+    step handled by the rewriter) or overridden (merged into an outer step).
+
+    Example:
+        >>> recorder = TimingRecorder()
+        >>> add_step_observer(recorder)
+        >>> ...
+        >>> print("\\n".join(recorder.report_lines()))
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty recorder."""
+        self._stats: Dict[str, TitleStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def step_started(self, title: str, overridden: bool) -> None:
+        """Track step nesting of the current thread."""
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+
+    def step_finished(
+        self,
+        title: str,
+        overridden: bool,
+        wall_time: float,
+        cpu_time: float,
+        exc_val: Optional[BaseException],
+    ) -> None:
+        """Record the step timings."""
+        depth = self._local.depth = self._local.depth - 1
+
+        with self._lock:
+            stats = self._stats.get(title)
+            if stats is None:
+                stats = self._stats[title] = TitleStats(title)
+
+            stats.wall.add(wall_time)
+            stats.cpu.add(cpu_time)
+            if overridden:
+                stats.overridden += 1
+            elif depth:
+                stats.nested += 1
+            else:
+                stats.created += 1
+
+    def stats(self) -> List[TitleStats]:
+        """Get stats of all recorded titles."""
+        with self._lock:
+            return list(self._stats.values())
+
+    def reset(self) -> None:
+        """Drop all recorded timings."""
+        with self._lock:
+            self._stats.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarise all titles, slowest first."""
+        stats = sorted(self.stats(), key=lambda item: item.wall.total, reverse=True)
+        return {"titles": [item.to_dict() for item in stats]}
+
+    def dump_json(self, path: str) -> None:
+        """
+        Write the summary as JSON.
+
+        Args:
+            path: Output file path
+        """
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump(self.to_dict(), json_file, indent=2, ensure_ascii=False)
+
+    def report_lines(self, top: int = 10) -> List[str]:
+        """
+        Format the slowest and most frequent steps.
+
+        Args:
+            top: Number of titles in each table (default: 10)
+
+        Returns:
+            Report lines
+        """
+        stats = self.stats()
+        if not stats:
+            return []
+
+        lines = ["Slowest steps (total wall time):"]
+        slowest = sorted(stats, key=lambda item: item.wall.total, reverse=True)
+        lines.extend(self._format(item) for item in slowest[:top])
+
+        lines.append("Most frequent steps:")
+        frequent = sorted(stats, key=lambda item: item.wall.count, reverse=True)
+        lines.extend(self._format(item) for item in frequent[:top])
+        return lines
+
+    @staticmethod
+    def _format(stats: TitleStats) -> str:
+        """Format one report line."""
+        wall = stats.wall
+        return (
+            f"  {wall.total:9.3f}s  count={wall.count:<7d} "
+            f"p50={wall.percentile(50):.4f}s p95={wall.percentile(95):.4f}s "
+            f"max={wall.max:.4f}s cpu={stats.cpu.total:.3f}s  {stats.title}"
+        )
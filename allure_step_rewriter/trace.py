@@ -0,0 +1,151 @@
+"""
+Step timeline export in Chrome trace-event format.
+
+ChromeTraceWriter is a step observer that streams a begin and an end event
+for every step to a JSON file in chunks. The file opens in chrome://tracing,
+Perfetto and speedscope, with one lane per thread (or per asyncio task).
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from allure_step_rewriter.failures import step_status
+from allure_step_rewriter.observers import StepObserver
+
+
+def _current_lane() -> Any:
+    """
+    Get the lane of the current step: the asyncio task or the thread.
+
+    Returns:
+        Tuple of lane ID and lane name
+    """
+    thread = threading.current_thread()
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+
+    if task is None:
+        return thread.ident, thread.name
+    return id(task), f"{task.get_name()} ({thread.name})"
+
+
+class ChromeTraceWriter(StepObserver):
+    """
+    Step observer writing a Chrome trace-event JSON file.
+
+    Events are buffered and written in chunks of ``chunk_size`` events; the
+    JSON array is completed by close().
+
+    Example:
+        >>> writer = ChromeTraceWriter("steps.trace.json")
+        >>> add_step_observer(writer)
+        >>> ...
+        >>> remove_step_observer(writer)
+        >>> writer.close()
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1000) -> None:
+        """
+        Initialize the writer and open the output file.
+
+        Args:
+            path: Output file path
+            chunk_size: Number of buffered events per write (default: 1000)
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._buffer: List[str] = []
+        self._lanes: Set[Any] = set()
+        self._lock = threading.Lock()
+        self._file: Optional[Any] = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._first_chunk = True
+
+    def _event(self, phase: str, title: str, args: Dict[str, Any]) -> None:
+        """Buffer one event of the current lane."""
+        timestamp = (time.perf_counter() - self._origin) * 1e6
+        lane, lane_name = _current_lane()
+
+        with self._lock:
+            if self._file is None:
+                return
+            if lane not in self._lanes:
+                self._lanes.add(lane)
+                self._buffer.append(
+                    json.dumps(
+                        {
+                            "name": "thread_name",
+                            "ph": "M",
+                            "pid": self._pid,
+                            "tid": lane,
+                            "args": {"name": lane_name},
+                        }
+                    )
+                )
+            self._buffer.append(
+                json.dumps(
+                    {
+                        "name": title,
+                        "cat": "step",
+                        "ph": phase,
+                        "ts": timestamp,
+                        "pid": self._pid,
+                        "tid": lane,
+                        "args": args,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+            if len(self._buffer) >= self.chunk_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        """Write buffered events. Must be called with the lock held."""
+        if not self._buffer or self._file is None:
+            return
+
+        if not self._first_chunk:
+            self._file.write(",\n")
+        self._file.write(",\n".join(self._buffer))
+        self._buffer.clear()
+        self._first_chunk = False
+
+    def step_started(self, title: str, overridden: bool) -> None:
+        """Write a begin event."""
+        self._event("B", title, {"overridden": overridden})
+
+    def step_finished(
+        self,
+        title: str,
+        overridden: bool,
+        wall_time: float,
+        cpu_time: float,
+        exc_val: Optional[BaseException],
+    ) -> None:
+        """Write an end event."""
+        self._event("E", title, {"status": step_status(exc_val), "cpu_time": cpu_time})
+
+    def flush(self) -> None:
+        """Write buffered events to the file."""
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        """Write remaining events and complete the JSON array."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush()
+            self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
@@ -0,0 +1,225 @@
+"""
+Background writing of Allure results.
+
+BackgroundFileLogger takes over from allure-pytest's AllureFileLogger: test
+results, containers and attachment data are queued, then serialised and
+written by a writer thread, so slow disks stop inflating test durations. The
+queue is bounded; when it is full the test thread waits for the writer
+(backpressure). Everything queued is written when the writer is closed at
+session end, or at interpreter exit if the session was interrupted. JSON is
+encoded with allure_step_rewriter.serialization; an item it fails to write
+is written by the file logger instead. Write errors are printed to stderr
+when they happen and summed up in a warning when the writer is closed.
+"""
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import uuid
+import warnings
+from typing import Any, Callable, List, Optional
+
+import allure_commons
+from allure_commons.logger import AllureFileLogger
+
+from allure_step_rewriter import serialization
+
+# Queue item telling the writer thread to stop
+_STOP = object()
+
+
+def _remove(path: str) -> None:
+    """Remove a file if it exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class BackgroundFileLogger:
+    """
+    Allure plugin writing results through a file logger on a writer thread.
+
+    Attached files are still copied on the test thread: their source is
+    often a temporary file removed right after ``allure.attach.file()``.
+
+    Example:
+        >>> writer = install_background_writer()
+        >>> ...
+        >>> uninstall_background_writer(writer)
+    """
+
+    def __init__(self, logger: AllureFileLogger, max_queue: int = 1000) -> None:
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            logger: File logger doing the actual writing
+            max_queue: Number of queued items before the test thread waits
+                (default: 1000)
+        """
+        self.logger = logger
+        self.errors: List[BaseException] = []
+        self._queue: "queue.Queue[Any]" = queue.Queue(max_queue)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="allure-step-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def report_dir(self) -> str:
+        """Allure results directory."""
+        return str(self.logger._report_dir)
+
+    def _run(self) -> None:
+        """Write queued items until stopped."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                func, args = item
+                try:
+                    func(*args)
+                except Exception as error:
+                    self._report_error(error)
+            finally:
+                self._queue.task_done()
+
+    def _report_error(self, error: BaseException) -> None:
+        """Record a write error and print it right away."""
+        self.errors.append(error)
+        print(
+            f"allure-step-rewriter: could not write an Allure report item: {error!r}",
+            file=sys.stderr,
+        )
+
+    def _write_item(self, item: Any) -> None:
+        """Write a result, container or globals item."""
+        if os.environ.get("ALLURE_INDENT_OUTPUT"):
+            # Indented output for humans: leave it to the file logger
+            self.logger._report_item(item)
+            return
+
+        file_name = item.file_pattern.format(prefix=uuid.uuid4())
+        try:
+            serialization.write_file_atomic(
+                os.path.join(self.report_dir, file_name), item
+            )
+        except Exception as error:
+            # Keep the item in the report: write it the way the file logger does
+            self._report_error(error)
+            self.logger._report_item(item)
+
+    def submit(self, func: Callable[..., None], *args: Any) -> None:
+        """
+        Queue a write, waiting while the queue is full.
+
+        Writes submitted after close() run on the calling thread.
+
+        Args:
+            func: Write function
+            *args: Arguments of the function
+        """
+        if self._closed:
+            func(*args)
+            return
+        self._queue.put((func, args))
+
+    def remove(self, file_name: str) -> None:
+        """
+        Remove a file of the results directory after the queued writes.
+
+        Args:
+            file_name: File name relative to the results directory
+        """
+        self.submit(_remove, os.path.join(self.report_dir, file_name))
+
+    def flush(self) -> None:
+        """Wait until every queued item is written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write the remaining items and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+        if self.errors:
+            warnings.warn(
+                f"allure-step-rewriter: {len(self.errors)} errors writing Allure "
+                f"report items, first error: {self.errors[0]!r}"
+            )
+
+    @allure_commons.hookimpl
+    def report_result(self, result: Any) -> None:
+        """Queue a test result."""
+        self.submit(self._write_item, result)
+
+    @allure_commons.hookimpl
+    def report_container(self, container: Any) -> None:
+        """Queue a fixture container."""
+        self.submit(self._write_item, container)
+
+    @allure_commons.hookimpl
+    def report_attached_file(self, source: str, file_name: str) -> None:
+        """Copy an attached file right away."""
+        self.logger.report_attached_file(source, file_name)
+
+    @allure_commons.hookimpl
+    def report_attached_data(self, body: Any, file_name: str) -> None:
+        """Queue attachment data."""
+        self.submit(self.logger.report_attached_data, body, file_name)
+
+    @allure_commons.hookimpl
+    def report_globals(self, globals_item: Any) -> None:
+        """Queue global links and errors."""
+        self.submit(self._write_item, globals_item)
+
+
+def install_background_writer(max_queue: int = 1000) -> Optional[BackgroundFileLogger]:
+    """
+    Replace the registered Allure file logger with a background writer.
+
+    Args:
+        max_queue: Number of queued items before the test thread waits
+            (default: 1000)
+
+    Returns:
+        Writer instance, or None if no file logger is registered (e.g. when
+        ``--alluredir`` is not set)
+    """
+    for plugin in allure_commons.plugin_manager.get_plugins():
+        if isinstance(plugin, AllureFileLogger):
+            break
+    else:
+        return None
+
+    writer = BackgroundFileLogger(plugin, max_queue)
+    allure_commons.plugin_manager.unregister(plugin)
+    allure_commons.plugin_manager.register(writer)
+    return writer
+
+
+def uninstall_background_writer(writer: BackgroundFileLogger) -> None:
+    """
+    Write the remaining items and restore the file logger.
+
+    The file logger is registered again, so that allure-pytest finds it when
+    it cleans up.
+
+    Args:
+        writer: Writer returned by install_background_writer()
+    """
+    allure_commons.plugin_manager.unregister(writer)
+    try:
+        writer.close()
+    finally:
+        allure_commons.plugin_manager.register(writer.logger)
@@ -0,0 +1,74 @@
+"""
+Benchmark of the JSON backends on a test result with 10,000 steps.
+
+Compares the stock AllureFileLogger encoding (attr.asdict + json.dumps) with
+allure_step_rewriter.serialization on every installed backend.
+
+Run with: python examples/benchmark_serialization.py
+"""
+
+import json
+import timeit
+
+from allure_commons import model2
+from attr import asdict
+
+from allure_step_rewriter import serialization
+
+STEPS = 10_000
+REPEAT = 5
+
+
+def build_result(steps: int = STEPS) -> model2.TestResult:
+    """Build a test result with 100 top-level steps of 99 children each."""
+    children_per_step = 99
+    top_level = []
+    for index in range(steps // (children_per_step + 1)):
+        children = [
+            model2.TestStepResult(
+                name=f"Request GET /items/{child}",
+                status="passed",
+                start=1_700_000_000_000 + child,
+                stop=1_700_000_000_001 + child,
+                parameters=[model2.Parameter(name="id", value=str(child))],
+            )
+            for child in range(children_per_step)
+        ]
+        top_level.append(
+            model2.TestStepResult(
+                name=f"Stage {index}", status="passed", steps=children
+            )
+        )
+    return model2.TestResult(uuid="1", name="test_benchmark", steps=top_level)
+
+
+def encode_stock(result: model2.TestResult) -> bytes:
+    """Encode like AllureFileLogger does."""
+    data = asdict(result, filter=lambda _, value: value or value is False)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def main() -> None:
+    """Print the best time of each encoder."""
+    result = build_result()
+    size = len(encode_stock(result))
+    print(f"{STEPS} steps, {size / 1024:.0f} KiB of JSON, best of {REPEAT}")
+
+    timings = {"asdict + json (stock)": lambda: encode_stock(result)}
+    for backend, installed in serialization.available_backends().items():
+        if installed:
+            timings[backend] = lambda backend=backend: (
+                serialization.set_backend(backend),
+                serialization.dumps(result),
+            )
+
+    baseline = None
+    for name, func in timings.items():
+        best = min(timeit.repeat(func, number=1, repeat=REPEAT))
+        baseline = baseline or best
+        print(f"  {name:<24} {best * 1000:8.1f} ms  {baseline / best:5.1f}x")
+    serialization.set_backend()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Tests for streamed step attachments."""
+
+import gzip
+import io
+import json
+import os
+from unittest import mock
+
+import allure
+import pytest
+
+from allure_step_rewriter import attach_stream, rewrite_step
+from allure_step_rewriter.attachments import TRUNCATED_NOTE
+from allure_step_rewriter.sinks import NullSink, capture_steps, set_sink
+
+
+def _attached(sink):
+    """Get the single attachment recorded on the "Parent" step."""
+    (attachment,) = sink.find("Parent").attachments
+    return attachment
+
+
+class TestSources:
+    """Test the accepted payload sources."""
+
+    @pytest.mark.parametrize(
+        "make_source",
+        [
+            lambda path: str(path),
+            lambda path: path,
+            lambda path: open(path, "rb"),
+            lambda path: io.StringIO("payload"),
+            lambda path: iter([b"pay", "load"]),
+            lambda path: b"payload",
+        ],
+        ids=["str-path", "pathlike", "binary-file", "text-file", "iterator", "bytes"],
+    )
+    def test_source(self, tmp_path, make_source):
+        """Test that each source kind is attached in full."""
+        path = tmp_path / "payload.txt"
+        path.write_bytes(b"payload")
+        source = make_source(path)
+
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                assert attach_stream(source, name="body", chunk_size=3) == 7
+
+        assert _attached(sink)["body"] == b"payload"
+        assert _attached(sink)["name"] == "body"
+
+
+class TestLimits:
+    """Test size caps and compression."""
+
+    def test_truncation(self):
+        """Test that payloads beyond max_size are cut and noted."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                size = attach_stream(iter([b"abcd", b"efgh"]), max_size=6)
+
+        assert size == 6
+        assert _attached(sink)["body"] == b"abcdef" + TRUNCATED_NOTE.format(
+            size=6
+        ).encode("utf-8")
+
+    def test_compression(self):
+        """Test that compressed attachments are gzip with a .gz extension."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                attach_stream(
+                    b"x" * 10000,
+                    attachment_type=allure.attachment_type.JSON,
+                    compress=True,
+                )
+
+        attachment = _attached(sink)
+        assert gzip.decompress(attachment["body"]) == b"x" * 10000
+        assert attachment["attachment_type"] == "application/gzip"
+        assert attachment["extension"] == "json.gz"
+
+    def test_error_discards(self):
+        """Test that a failing source attaches nothing."""
+
+        def broken():
+            yield b"part"
+            raise OSError("connection reset")
+
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                with pytest.raises(OSError):
+                    attach_stream(broken())
+
+        assert sink.find("Parent").attachments == []
+
+
+class TestSinks:
+    """Test streaming through the sinks."""
+
+    def test_null_sink_does_not_read(self):
+        """Test that NullSink drops the attachment without reading it."""
+        source = mock.Mock()
+        previous = set_sink(NullSink())
+        try:
+            assert attach_stream(source) is None
+        finally:
+            set_sink(previous)
+
+        source.read.assert_not_called()
+
+    def test_allure_sink_without_results_dir(self):
+        """Test the fallback to allure.attach.file with a temporary file."""
+        contents = []
+
+        def attach_file(path, **kwargs):
+            with open(path, "rb") as attached:
+                contents.append((attached.read(), kwargs["name"]))
+
+        with mock.patch("allure.attach") as attach:
+            attach.file.side_effect = attach_file
+            attach_stream(iter([b"pay", b"load"]), name="body")
+
+        assert contents == [(b"payload", "body")]
+        path = attach.file.call_args[0][0]
+        assert not os.path.exists(path)
+
+    def test_allure_results_dir(self, pytester):
+        """Test streaming straight into the results directory."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import attach_stream, rewrite_step
+
+            def test_attach():
+                with rewrite_step("Download"):
+                    attach_stream(iter([b"pay", b"load"]), name="body",
+                                  extension="txt")
+            """)
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(f"--alluredir={results_dir}").assert_outcomes(passed=1)
+
+        (result,) = results_dir.glob("*-result.json")
+        (step,) = json.loads(result.read_text())["steps"]
+        (attachment,) = step["attachments"]
+        assert attachment["name"] == "body"
+        assert attachment["source"].endswith("-attachment.txt")
+        assert (results_dir / attachment["source"]).read_bytes() == b"payload"
+        assert not list(results_dir.glob("*.tmp"))
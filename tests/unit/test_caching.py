@@ -0,0 +1,174 @@
+"""Tests for cached step functions."""
+
+import time
+
+import pytest
+
+from allure_step_rewriter import StepCache, clear_step_caches, rewrite_step
+from allure_step_rewriter.sinks import capture_steps
+
+
+class TestStepCache:
+    """Test the LRU cache."""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used result is evicted."""
+        cache = StepCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("a") == (True, 1)
+        assert cache.get("b") == (False, None)
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self):
+        """Test that results expire after the TTL."""
+        cache = StepCache(ttl=0.01)
+        cache.put("a", 1)
+        time.sleep(0.02)
+
+        assert cache.get("a") == (False, None)
+        assert len(cache) == 0
+
+    def test_unhashable_arguments_not_cached(self):
+        """Test that calls with unhashable arguments get no key."""
+        assert StepCache.make_key(len, ([1],), {}) is None
+        assert StepCache.make_key(len, (1,), {"b": 2, "a": 1}) == StepCache.make_key(
+            len, (1,), {"a": 1, "b": 2}
+        )
+
+    def test_invalid_scope(self):
+        """Test that unknown scopes are rejected."""
+        with pytest.raises(ValueError):
+            StepCache(scope="class")
+
+    def test_clear_by_scope(self):
+        """Test that only caches of the given scope are cleared."""
+        session, module = StepCache(), StepCache(scope="module")
+        session.put("a", 1)
+        module.put("a", 1)
+
+        clear_step_caches("module")
+
+        assert len(session) == 1
+        assert len(module) == 0
+
+
+class TestCachedSteps:
+    """Test rewrite_step(..., cache=...)."""
+
+    def test_hit_skips_call_and_records_cached_step(self):
+        """Test that a cache hit returns the result and records a cached step."""
+        calls = []
+
+        @rewrite_step("Log in as {user}", params=["user"], cache=True)
+        def login(user):
+            calls.append(user)
+            return f"token-{user}"
+
+        with capture_steps() as steps:
+            assert login("admin") == "token-admin"
+            assert login("admin") == "token-admin"
+            assert login("guest") == "token-guest"
+
+        assert calls == ["admin", "guest"]
+        first, hit, _ = steps.steps
+        assert first.params == {"user": "'admin'"}
+        assert hit.title == "Log in as 'admin'"
+        assert hit.params == {"user": "'admin'", "cached": "true"}
+
+    def test_exceptions_not_cached(self):
+        """Test that failing calls run again."""
+        calls = []
+
+        @rewrite_step("Fetch", cache=True)
+        def fetch():
+            calls.append(None)
+            raise RuntimeError("down")
+
+        with capture_steps():
+            for _ in range(2):
+                with pytest.raises(RuntimeError):
+                    fetch()
+
+        assert len(calls) == 2
+
+    def test_hit_inside_context_is_merged(self):
+        """Test that a cached call inside a context step overrides it."""
+
+        @rewrite_step("Load schema", cache=True)
+        def load_schema():
+            return {"type": "object"}
+
+        with capture_steps() as steps:
+            load_schema()
+            with rewrite_step("Prepare"):
+                load_schema()
+
+        assert steps.titles() == ["Load schema", "Prepare"]
+        assert steps.find("Prepare").overrides == ["Load schema"]
+
+    def test_shared_cache_keys_by_function(self):
+        """Test that functions sharing a cache do not see each other's results."""
+        cache = StepCache()
+
+        @rewrite_step("A", cache=cache)
+        def first():
+            return "a"
+
+        @rewrite_step("B", cache=cache)
+        def second():
+            return "b"
+
+        with capture_steps():
+            assert (first(), second(), first(), second()) == ("a", "b", "a", "b")
+
+        assert cache.hits == 2
+
+    def test_generator_rejected(self):
+        """Test that caching generator functions is refused."""
+        with pytest.raises(ValueError):
+
+            @rewrite_step("Rows", cache=True)
+            def rows():
+                yield 1
+
+
+class TestCachePlugin:
+    """Test cache scopes through the pytest plugin."""
+
+    def test_module_scope_cleared_between_modules(self, pytester):
+        """Test that module caches are cleared after each test module."""
+        pytester.makepyfile(
+            helpers="""
+            from allure_step_rewriter import StepCache, rewrite_step
+
+            calls = []
+
+            @rewrite_step("Setup", cache=StepCache(scope="module"))
+            def setup():
+                calls.append(None)
+                return len(calls)
+            """,
+            test_one="""
+            from helpers import setup
+
+            def test_a():
+                assert setup() == 1
+
+            def test_b():
+                assert setup() == 1
+            """,
+            test_two="""
+            from helpers import setup
+
+            def test_c():
+                assert setup() == 2
+            """,
+        )
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=3)
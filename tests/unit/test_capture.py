@@ -0,0 +1,90 @@
+"""Tests for in-memory step capture."""
+
+import pytest
+
+from allure_step_rewriter import AllureSink, capture_steps, rewrite_step
+from allure_step_rewriter.sinks import get_sink
+
+
+@rewrite_step("Get data")
+def get_data():
+    return "data"
+
+
+@rewrite_step("Save data")
+def save_data():
+    return "saved"
+
+
+class TestCaptureSteps:
+    """Test the capture_steps() context manager."""
+
+    def test_captures_tree_and_overrides(self):
+        """Test that titles, nesting and override flags are captured."""
+        with capture_steps() as steps:
+            with rewrite_step("Sync"):
+                get_data()  # Overridden
+                save_data()  # Nested
+
+        sync = steps.find("Sync")
+        assert steps.titles() == [("Sync", ["Save data"])]
+        assert sync.overridden
+        assert sync.overrides == ["Get data"]
+        assert not steps.find("Save data").overridden
+
+    def test_allow_multiple_records_every_override(self):
+        """Test that every merged step is listed."""
+        with capture_steps() as steps:
+            with rewrite_step("Sync", allow_multiple=True):
+                get_data()
+                save_data()
+
+        assert steps.to_dict() == [
+            {
+                "title": "Sync",
+                "status": "passed",
+                "duration": steps.steps[0].duration,
+                "overrides": ["Get data", "Save data"],
+                "steps": [],
+            }
+        ]
+
+    def test_failed_status_captured(self):
+        """Test that failures are captured with their status."""
+        with capture_steps() as steps:
+            with pytest.raises(ValueError):
+                with rewrite_step("Broken"):
+                    raise ValueError("boom")
+
+        assert steps.find("Broken").status == "broken"
+
+    def test_previous_sink_restored(self):
+        """Test that the previous sink is restored after the block."""
+        with capture_steps():
+            pass
+
+        assert isinstance(get_sink(), AllureSink)
+
+
+class TestCapturedStepsFixture:
+    """Test the captured_steps fixture of the pytest plugin."""
+
+    def test_fixture(self, pytester):
+        """Test that the fixture captures the steps of a test."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Login")
+            def login():
+                pass
+
+            def test_login(captured_steps):
+                with rewrite_step("Open app"):
+                    login()
+                assert captured_steps.titles() == ["Open app"]
+                assert captured_steps.find("Open app").overrides == ["Login"]
+            """)
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
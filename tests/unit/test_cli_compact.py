@@ -0,0 +1,168 @@
+"""Tests for compacting allure-results directories."""
+
+import json
+
+import pytest
+
+from allure_step_rewriter.cli import main
+from allure_step_rewriter.results import (
+    compact_directory,
+    count_repeated_steps,
+    hoist_passthrough_steps,
+)
+
+
+def _step(name, steps=None, start=0, stop=1, **extra):
+    """Build a step dict."""
+    step = {"name": name, "status": "passed", "start": start, "stop": stop}
+    if steps:
+        step["steps"] = steps
+    step.update(extra)
+    return step
+
+
+def _attachment(source):
+    """Build an attachment dict."""
+    return {"name": "body", "source": source, "type": "text/plain"}
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    """Results directory with repeated steps and duplicate attachments."""
+    (tmp_path / "a-result.json").write_text(
+        json.dumps(
+            {
+                "name": "test_a",
+                "steps": [
+                    _step("Poll", attachments=[_attachment("1-attachment.txt")]),
+                    _step("Poll", attachments=[_attachment("2-attachment.txt")]),
+                    _step("Done"),
+                ],
+            }
+        )
+    )
+    (tmp_path / "b-container.json").write_text(
+        json.dumps(
+            {
+                "befores": [
+                    {"name": "setup", "attachments": [_attachment("3-attachment.txt")]}
+                ]
+            }
+        )
+    )
+    (tmp_path / "c-result.json").write_text(
+        json.dumps({"name": "test_c", "steps": [_step("Untouched")]})
+    )
+    for index in (1, 2, 3):
+        (tmp_path / f"{index}-attachment.txt").write_text("same body")
+    (tmp_path / "4-attachment.txt").write_text("other body")
+    return tmp_path
+
+
+class TestCountRepeatedSteps:
+    """Test merging of identical siblings."""
+
+    def test_run_becomes_counted_step(self):
+        """Test that a run of identical siblings becomes one counted step."""
+        steps = [_step("Poll", start=0, stop=1), _step("Poll", start=1, stop=2)]
+        steps += [_step("Done", start=2, stop=3)]
+
+        assert count_repeated_steps(steps) == 1
+        assert steps == [
+            _step("Poll ×2", start=0, stop=2),
+            _step("Done", start=2, stop=3),
+        ]
+
+    def test_different_siblings_are_kept(self):
+        """Test that siblings differing beyond timing are kept apart."""
+        steps = [_step("Poll"), _step("Poll", status="failed"), _step("Poll")]
+
+        assert count_repeated_steps(steps) == 0
+        assert len(steps) == 3
+
+    def test_nested_runs(self):
+        """Test that runs are merged inside nested steps first."""
+        steps = [_step("Outer", [_step("Inner"), _step("Inner")]) for _ in range(2)]
+
+        assert count_repeated_steps(steps) == 3
+        assert steps == [_step("Outer ×2", [_step("Inner ×2")])]
+
+    def test_nested_timing_is_ignored(self):
+        """Test that siblings whose children differ only in timing are merged."""
+        steps = [
+            _step("Outer", [_step("Inner", start=0, stop=1)]),
+            _step("Outer", [_step("Inner", start=5, stop=6)]),
+        ]
+
+        assert count_repeated_steps(steps) == 1
+        assert [step["name"] for step in steps] == ["Outer ×2"]
+
+
+class TestHoistPassthroughSteps:
+    """Test dropping of steps that repeat their parent."""
+
+    def test_step_repeating_parent_is_replaced_by_children(self):
+        """Test that a child with its parent's title is hoisted."""
+        steps = [_step("Login", [_step("Login", [_step("Submit")])])]
+
+        assert hoist_passthrough_steps(steps) == 1
+        assert steps == [_step("Login", [_step("Submit")])]
+
+    def test_step_with_content_is_kept(self):
+        """Test that a child with attachments is kept."""
+        child = _step("Login", attachments=[_attachment("x-attachment.txt")])
+        steps = [_step("Login", [child])]
+
+        assert hoist_passthrough_steps(steps) == 0
+
+    def test_failed_child_is_kept(self):
+        """Test that a child with another status or status details is kept."""
+        details = {"message": "boom"}
+        failed = _step("Login", status="failed", statusDetails=details)
+        broken = _step("Login", status="broken", statusDetails=details)
+        steps = [
+            _step("Login", [failed]),
+            _step("Login", status="broken", steps=[broken]),
+        ]
+
+        assert hoist_passthrough_steps(steps) == 0
+        assert steps[0]["steps"] == [failed]
+        assert steps[1]["steps"] == [broken]
+
+
+class TestCompactDirectory:
+    """Test compacting a results directory."""
+
+    def test_dedupes_and_merges(self, results_dir):
+        """Test that duplicates are relinked, deleted and counted."""
+        report = compact_directory(str(results_dir), workers=1)
+
+        assert report.files == 3
+        assert report.compacted == 2
+        assert report.steps_removed == 1
+        assert report.attachments_removed == 2
+        assert report.bytes_saved > 2 * len("same body")
+
+        steps = json.loads((results_dir / "a-result.json").read_text())["steps"]
+        assert [step["name"] for step in steps] == ["Poll ×2", "Done"]
+        assert steps[0]["attachments"][0]["source"] == "1-attachment.txt"
+        container = json.loads((results_dir / "b-container.json").read_text())
+        assert container["befores"][0]["attachments"][0]["source"] == (
+            "1-attachment.txt"
+        )
+        assert sorted(path.name for path in results_dir.glob("*-attachment.txt")) == [
+            "1-attachment.txt",
+            "4-attachment.txt",
+        ]
+
+    def test_process_pool(self, results_dir):
+        """Test that the process pool gives the same outcome."""
+        report = compact_directory(str(results_dir), workers=2)
+
+        assert report.attachments_removed == 2
+        assert report.steps_removed == 1
+
+    def test_cli(self, results_dir, capsys):
+        """Test the compact command."""
+        assert main(["compact", str(results_dir), "--workers", "1"]) == 0
+        assert "removed 1 steps and 2 duplicate attachments" in capsys.readouterr().out
@@ -0,0 +1,169 @@
+"""Tests for offline rewriting of allure-results directories."""
+
+import json
+
+import pytest
+
+from allure_step_rewriter.cli import main
+from allure_step_rewriter.results import (
+    TitleRules,
+    collapse_single_child,
+    rewrite_directory,
+)
+
+
+def _step(name, steps=None, **extra):
+    """Build a step dict."""
+    step = {"name": name, "status": "passed"}
+    if steps:
+        step["steps"] = steps
+    step.update(extra)
+    return step
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    """Results directory with two result files and an attachment."""
+    (tmp_path / "a-result.json").write_text(
+        json.dumps(
+            {
+                "name": "test_a",
+                "steps": [_step("Open page", [_step("GET /users")])],
+            }
+        )
+    )
+    (tmp_path / "b-result.json").write_text(
+        json.dumps({"name": "test_b", "steps": [_step("Untouched")]})
+    )
+    (tmp_path / "c-attachment.txt").write_text("body")
+    return tmp_path
+
+
+def _steps(path):
+    """Load steps of a result file."""
+    return json.loads(path.read_text())["steps"]
+
+
+class TestTitleRules:
+    """Test title mapping rules."""
+
+    def test_exact_titles_before_patterns(self):
+        """Test that exact titles win over patterns."""
+        rules = TitleRules({"GET /": "Home"}, [(r"^GET (.*)$", r"Request \1")])
+
+        assert rules.apply("GET /") == "Home"
+        assert rules.apply("GET /users") == "Request /users"
+        assert rules.apply("POST /users") == "POST /users"
+
+    def test_from_file(self, tmp_path):
+        """Test loading rules from JSON."""
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({"patterns": [["^Step (\\d+)$", "Stage \\1"]]}))
+
+        assert TitleRules.from_file(str(path)).apply("Step 2") == "Stage 2"
+
+
+class TestCollapse:
+    """Test single-child collapsing."""
+
+    def test_outer_step_takes_over_single_child(self):
+        """Test that an outer step with one child absorbs it."""
+        attachment = {"name": "response", "source": "x-attachment.json"}
+        steps = [
+            _step("Custom title", [_step("Default title", attachments=[attachment])])
+        ]
+
+        rules = TitleRules({"Default title": "Custom title"})
+
+        assert collapse_single_child(steps, rules)
+        assert steps == [_step("Custom title", attachments=[attachment])]
+
+    def test_chains_collapse_to_outermost(self):
+        """Test that chains of single children collapse fully."""
+        steps = [_step("A", [_step("A", [_step("A", [_step("D"), _step("E")])])])]
+
+        collapse_single_child(steps)
+
+        assert steps == [_step("A", [_step("D"), _step("E")])]
+
+    def test_unrelated_child_is_kept(self):
+        """Test that a single child with another purpose is not merged."""
+        steps = [_step("Checkout", [_step("Click pay button")])]
+        rules = TitleRules({"Default title": "Custom title"})
+
+        assert not collapse_single_child(steps, rules)
+        assert steps == [_step("Checkout", [_step("Click pay button")])]
+
+    def test_steps_with_own_content_are_kept(self):
+        """Test that steps with attachments or several children stay."""
+        steps = [
+            _step("A", [_step("B")], attachments=[{"source": "a"}]),
+            _step("C", [_step("D"), _step("E")]),
+        ]
+
+        assert not collapse_single_child(steps)
+
+
+class TestRewriteCommand:
+    """Test the rewrite command."""
+
+    def test_rewrite_with_map_and_collapse(self, results_dir, capsys):
+        """Test renaming and collapsing in place."""
+        code = main(
+            [
+                "rewrite",
+                str(results_dir),
+                "--map",
+                "GET /users=Open page",
+                "--collapse",
+                "--workers",
+                "1",
+            ]
+        )
+
+        assert code == 0
+        assert _steps(results_dir / "a-result.json") == [_step("Open page")]
+        assert _steps(results_dir / "b-result.json") == [_step("Untouched")]
+        assert "Rewrote 1 of 2 result files" in capsys.readouterr().out
+        assert not list(results_dir.glob("*.tmp"))
+
+    def test_rewrite_in_process_pool(self, results_dir):
+        """Test that files are processed in parallel worker processes."""
+        rules = TitleRules(patterns=[(r"^GET (.*)$", r"Request \1")])
+
+        assert rewrite_directory(str(results_dir), rules, workers=2) == (2, 1, [])
+        assert _steps(results_dir / "a-result.json")[0]["steps"][0]["name"] == (
+            "Request /users"
+        )
+
+    def test_failing_file_reported_and_kept(self, results_dir, capsys):
+        """Test that a file that cannot be rewritten is reported and left as is."""
+        broken = results_dir / "broken-result.json"
+        broken.write_text('{"name": "test_c", "steps": [')
+
+        code = main(
+            [
+                "rewrite",
+                str(results_dir),
+                "--map",
+                "GET /users=Open page",
+                "--workers",
+                "2",
+            ]
+        )
+
+        output = capsys.readouterr()
+        assert code == 1
+        assert f"Could not rewrite {broken}" in output.err
+        assert "Rewrote 1 of 3 result files" in output.out
+        assert broken.read_text() == '{"name": "test_c", "steps": ['
+        assert not list(results_dir.glob("*.tmp"))
+
+    def test_nothing_to_do(self, results_dir):
+        """Test that the command refuses to run without rules."""
+        assert main(["rewrite", str(results_dir)]) == 2
+
+    def test_invalid_mapping(self, results_dir):
+        """Test that malformed --map values are rejected."""
+        with pytest.raises(SystemExit):
+            main(["rewrite", str(results_dir), "--map", "no-separator"])
@@ -0,0 +1,166 @@
+"""Tests for content-addressed attachment deduplication."""
+
+import json
+import os
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter.dedup import ContentIndex
+from allure_step_rewriter.sinks import FileAttachmentWriter
+
+
+@pytest.fixture
+def index():
+    """Empty content index."""
+    return ContentIndex(max_entries=2)
+
+
+class TestContentIndex:
+    """Test the LRU content index."""
+
+    def test_find_existing_file(self, index, tmp_path):
+        """Test that known content is found in its directory only."""
+        path = tmp_path / "1-attachment.txt"
+        path.write_text("body")
+        index.add("abc", str(path))
+
+        assert index.find("abc", str(tmp_path)) == str(path)
+        assert index.find("abc", str(tmp_path / "other")) is None
+
+    def test_missing_file_is_forgotten(self, index, tmp_path):
+        """Test that removed files are not reused."""
+        index.add("abc", str(tmp_path / "gone-attachment.txt"))
+
+        assert index.find("abc", str(tmp_path)) is None
+
+    def test_lru_eviction(self, index, tmp_path):
+        """Test that the least recently used digest is evicted."""
+        for name in ("a", "b", "c"):
+            (tmp_path / name).write_text(name)
+        index.add("a", str(tmp_path / "a"))
+        index.add("b", str(tmp_path / "b"))
+        index.find("a", str(tmp_path))
+        index.add("c", str(tmp_path / "c"))
+
+        assert index.find("a", str(tmp_path)) is not None
+        assert index.find("b", str(tmp_path)) is None
+
+    def test_release_counts_references(self, index, tmp_path):
+        """Test that shared files are released by their last reference."""
+        path = str(tmp_path / "1-attachment.txt")
+        index.add("abc", path)
+        index.reference(path)
+        index.reference(path)
+
+        assert [index.release(path) for _ in range(3)] == [False, False, True]
+
+    def test_paths_are_normalized(self, index, tmp_path):
+        """Test that a results directory spelled with '..' shares references."""
+        (tmp_path / "reports").mkdir()
+        spelled = str(tmp_path / "reports" / ".." / "1-attachment.txt")
+        path = os.path.abspath(spelled)
+        (tmp_path / "1-attachment.txt").write_text("abc")
+        index.add("abc", spelled)
+        index.reference(spelled)
+
+        assert index.find("abc", str(tmp_path / "reports" / "..")) == path
+        assert index.release(path) is False
+        assert index.release(spelled) is True
+
+    def test_path_digest_tracks_changes(self, index, tmp_path):
+        """Test that a changed source file needs hashing again."""
+        path = tmp_path / "payload.bin"
+        path.write_bytes(b"one")
+        index.add_path_digest(path, "abc")
+        assert index.path_digest(path) == "abc"
+
+        path.write_bytes(b"three")
+        assert index.path_digest(path) is None
+
+
+class TestFileAttachmentWriter:
+    """Test deduplicating file writers."""
+
+    def _write(self, tmp_path, index, name, digest):
+        """Write one attachment and return the committed path."""
+        commit = mock.Mock()
+        writer = FileAttachmentWriter(str(tmp_path / name), commit, index)
+        writer.write(b"body")
+        writer.close(digest)
+        return commit.call_args[0][0]
+
+    def test_identical_content_written_once(self, index, tmp_path):
+        """Test that the second copy commits the first file."""
+        first = self._write(tmp_path, index, "1-attachment.txt", "abc")
+        second = self._write(tmp_path, index, "2-attachment.txt", "abc")
+
+        assert first == second == str(tmp_path / "1-attachment.txt")
+        assert sorted(os.listdir(tmp_path)) == ["1-attachment.txt"]
+
+    def test_without_index(self, tmp_path):
+        """Test that every copy is written without an index."""
+        self._write(tmp_path, None, "1-attachment.txt", "abc")
+        self._write(tmp_path, None, "2-attachment.txt", "abc")
+
+        assert len(os.listdir(tmp_path)) == 2
+
+
+class TestResultsDirectory:
+    """Test deduplication end to end."""
+
+    def test_steps_share_one_file(self, pytester):
+        """Test that identical payloads are written once and referenced twice."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import attach_stream, rewrite_step
+
+            def test_first(tmp_path):
+                path = tmp_path / "screenshot.png"
+                path.write_bytes(b"png" * 1000)
+                for attempt in range(2):
+                    with rewrite_step(f"Attempt {attempt}"):
+                        attach_stream(path, name="screenshot", extension="png")
+
+            def test_second():
+                with rewrite_step("Payload"):
+                    attach_stream(iter([b"png" * 1000]), extension="png")
+            """)
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(f"--alluredir={results_dir}").assert_outcomes(passed=2)
+
+        sources = set()
+        for result in results_dir.glob("*-result.json"):
+            for step in json.loads(result.read_text())["steps"]:
+                sources.update(item["source"] for item in step["attachments"])
+        assert len(sources) == 1
+        assert len(list(results_dir.glob("*-attachment.png"))) == 1
+
+    def test_pruning_keeps_shared_file(self, pytester):
+        """Test that the detail mode does not remove files still referenced."""
+        pytester.makepyfile("""
+            import allure
+            import pytest
+            from allure_step_rewriter import attach_stream, rewrite_step
+
+            @pytest.mark.allure_step_detail("full")
+            def test_kept():
+                with rewrite_step("Top"):
+                    attach_stream(b"shared", extension="txt")
+
+            def test_pruned():
+                with rewrite_step("Top"):
+                    with allure.step("Inner"):
+                        attach_stream(b"shared", extension="txt")
+            """)
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(
+            "-p",
+            "allure_step_rewriter.plugin",
+            f"--alluredir={results_dir}",
+            "-o",
+            "allure_step_detail=failure",
+        ).assert_outcomes(passed=2)
+
+        assert len(list(results_dir.glob("*-attachment.txt"))) == 1
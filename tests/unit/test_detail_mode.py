@@ -0,0 +1,278 @@
+"""Tests for failure-focused step detail mode."""
+
+import json
+import threading
+
+import pytest
+from allure_commons import model2
+
+from allure_step_rewriter import detail
+
+
+def _result(status):
+    """Build a test result with a two-level step tree."""
+    child = model2.TestStepResult(
+        name="Child", attachments=[model2.Attachment(source="child-attachment.txt")]
+    )
+    top = model2.TestStepResult(name="Top", steps=[child])
+    return model2.TestResult(name="test", status=status, steps=[top])
+
+
+def _track(result):
+    """Mark the top-level steps of a result as created by the rewriter."""
+    for number, step in enumerate(result.steps):
+        detail.rewriter_step_started(number, step)
+        detail.rewriter_step_stopped(number)
+    return result
+
+
+@pytest.fixture(autouse=True)
+def reset_detail_mode():
+    """Restore the default detail mode after each test."""
+    yield
+    detail.set_detail_mode(detail.DETAIL_FULL)
+    detail.set_item_detail_mode(None)
+    detail._rewriter_steps.clear()
+    detail._open_steps().clear()
+    detail._pending_attachments().clear()
+
+
+class TestDetailMode:
+    """Test detail mode selection and step tree pruning."""
+
+    def test_default_mode_is_full(self):
+        """Test that the full tree is kept by default."""
+        assert detail.get_detail_mode() == detail.DETAIL_FULL
+
+    def test_item_mode_takes_precedence(self):
+        """Test that the item mode overrides the session default."""
+        detail.set_item_detail_mode(detail.DETAIL_FAILURE)
+        assert detail.get_detail_mode() == detail.DETAIL_FAILURE
+
+        detail.set_item_detail_mode(None)
+        assert detail.get_detail_mode() == detail.DETAIL_FULL
+
+    def test_unknown_mode_rejected(self):
+        """Test that an unknown mode raises ValueError."""
+        with pytest.raises(ValueError, match="Unknown step detail mode"):
+            detail.set_detail_mode("verbose")
+
+    def test_prune_keeps_top_level_steps(self):
+        """Test that pruning drops nested steps and reports their attachments."""
+        result = _result("passed")
+
+        dropped = detail.prune_step_tree(result)
+
+        assert [step.name for step in result.steps] == ["Top"]
+        assert result.steps[0].steps == []
+        assert dropped == ["child-attachment.txt"]
+
+    def test_prune_only_rewriter_steps(self):
+        """Test that other steps are kept and searched for rewriter steps."""
+        inner = _result("passed").steps[0]
+        outer = model2.TestStepResult(name="Outer", steps=[inner])
+        result = model2.TestResult(name="test", status="passed", steps=[outer])
+
+        dropped = detail.prune_step_tree(result, {id(inner): inner})
+
+        assert result.steps[0].steps[0].name == "Top"
+        assert result.steps[0].steps[0].steps == []
+        assert dropped == ["child-attachment.txt"]
+
+    @pytest.mark.parametrize("status", ["failed", "broken"])
+    def test_pruner_keeps_failed_tests(self, status):
+        """Test that failed and broken tests keep the full tree."""
+        detail.set_detail_mode(detail.DETAIL_FAILURE)
+        result = _track(_result(status))
+
+        detail.StepTreePruner().report_result(result)
+
+        assert result.steps[0].steps[0].name == "Child"
+
+    def test_pruner_removes_dropped_attachments(self, tmp_path):
+        """Test that attachments of dropped steps are removed from disk."""
+        detail.set_detail_mode(detail.DETAIL_FAILURE)
+        attachment = tmp_path / "child-attachment.txt"
+        attachment.write_text("body")
+
+        detail.StepTreePruner(str(tmp_path)).report_result(_track(_result("passed")))
+
+        assert not attachment.exists()
+
+    def test_pruner_inactive_in_full_mode(self):
+        """Test that nothing is pruned in full mode."""
+        result = _track(_result("passed"))
+
+        detail.StepTreePruner().report_result(result)
+
+        assert result.steps[0].steps[0].name == "Child"
+
+    def test_open_steps_and_attachments_per_thread(self):
+        """Test that steps open on another thread do not hold attachments here."""
+        detail.set_detail_mode(detail.DETAIL_FAILURE)
+        top, child = object(), object()
+        opened, done = threading.Event(), threading.Event()
+
+        def work():
+            detail.rewriter_step_started("worker", top)
+            detail.defer_attachment("worker-attachment.txt", b"body")
+            opened.set()
+            done.wait()
+            detail.rewriter_step_stopped("worker")
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        try:
+            opened.wait()
+            assert not detail.tracking_steps()
+            assert not detail.defers_attachments_of(child)
+            assert detail._pending_attachments() == {}
+        finally:
+            done.set()
+            thread.join()
+
+
+class TestDetailModePlugin:
+    """Test the detail mode marker through the pytest plugin."""
+
+    def test_marker_prunes_passing_tests_only(self, pytester):
+        """Test that the marker keeps nested steps only for failed tests."""
+        pytester.makepyfile(
+            """
+            import allure
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            pytestmark = pytest.mark.allure_step_detail("failure")
+
+            @rewrite_step("Nested")
+            def nested():
+                pass
+
+            def test_passing():
+                with rewrite_step("Top"):
+                    with allure.step("Inner"):
+                        nested()
+
+            def test_failing():
+                with rewrite_step("Top"):
+                    with allure.step("Inner"):
+                        nested()
+                        assert False
+            """
+        )
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", f"--alluredir={results_dir}"
+        )
+
+        results = {}
+        for path in results_dir.glob("*-result.json"):
+            data = json.loads(path.read_text())
+            results[data["name"]] = data
+        assert "steps" not in results["test_passing"]["steps"][0]
+        assert results["test_failing"]["steps"][0]["steps"][0]["name"] == "Inner"
+
+    def test_marker_mode_keyword(self, pytester):
+        """Test that the mode can be given as a keyword argument."""
+        pytester.makepyfile(
+            """
+            import pytest
+            from allure_step_rewriter import detail
+
+            @pytest.mark.allure_step_detail(mode="failure")
+            def test_mode():
+                assert detail.get_detail_mode() == "failure"
+            """
+        )
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
+
+    def test_conftest_mode_kept_without_ini_option(self, pytester):
+        """Test that the plugin keeps a mode set through the API in conftest.py."""
+        pytester.makeconftest(
+            """
+            from allure_step_rewriter import detail
+
+            detail.set_detail_mode("failure")
+            """
+        )
+        pytester.makepyfile(
+            """
+            from allure_step_rewriter import detail
+
+            def test_mode():
+                assert detail.get_detail_mode() == "failure"
+            """
+        )
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
+
+    def test_only_rewriter_steps_pruned(self, pytester):
+        """Test that steps not created by the rewriter keep their children."""
+        pytester.makepyfile(
+            """
+            import allure
+            import pytest
+
+            pytestmark = pytest.mark.allure_step_detail("failure")
+
+            def test_plain_steps():
+                with allure.step("Top"):
+                    with allure.step("Inner"):
+                        pass
+            """
+        )
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", f"--alluredir={results_dir}"
+        )
+
+        (path,) = results_dir.glob("*-result.json")
+        data = json.loads(path.read_text())
+        assert data["steps"][0]["steps"][0]["name"] == "Inner"
+
+    def test_nested_attachments_written_for_failed_tests_only(self, pytester):
+        """Test that attachments of dropped steps are never written."""
+        pytester.makepyfile(
+            """
+            import allure
+            import pytest
+            from allure_step_rewriter import rewrite_step
+            from allure_step_rewriter.sinks import get_sink
+
+            pytestmark = pytest.mark.allure_step_detail("failure")
+
+            def run(fail):
+                with rewrite_step("Top"):
+                    get_sink().attach("top", name="top")
+                    with allure.step("Nested"):
+                        get_sink().attach("nested", name="nested")
+                        assert not fail
+
+            def test_passing():
+                run(False)
+
+            def test_failing():
+                run(True)
+            """
+        )
+        results_dir = pytester.path / "allure-results"
+
+        pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", f"--alluredir={results_dir}"
+        )
+
+        bodies = sorted(path.read_text() for path in results_dir.glob("*-attachment.*"))
+        assert bodies == ["nested", "top", "top"]
+        for path in results_dir.glob("*-result.json"):
+            data = json.loads(path.read_text())
+            if data["name"] == "test_failing":
+                (nested,) = data["steps"][0]["steps"]
+                assert nested["attachments"][0]["name"] == "nested"
@@ -0,0 +1,252 @@
+"""Tests for compact step failure details."""
+
+import json
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import rewrite_step, set_failure_capture
+from allure_step_rewriter.failures import (
+    clear_failure_record,
+    failure_capture_enabled,
+    failure_details,
+    format_traceback,
+    step_status,
+)
+from allure_step_rewriter.sinks import StepSink, set_sink
+
+
+@pytest.fixture(autouse=True)
+def reset_failure_capture():
+    """Restore the allure-pytest failure details after each test."""
+    yield
+    set_failure_capture(None)
+
+
+def _raise_at_depth(depth):
+    """Raise a ValueError below depth nested calls."""
+    if depth:
+        _raise_at_depth(depth - 1)
+    raise ValueError("deep failure")
+
+
+class TestFailureDetails:
+    """Test the recorded message and traceback."""
+
+    def test_traceback_limited_to_innermost_frames(self):
+        """Test that only the innermost frames are formatted."""
+        with pytest.raises(ValueError) as excinfo:
+            _raise_at_depth(20)
+
+        trace = format_traceback(excinfo.value.__traceback__, 3)
+
+        assert trace.startswith("... 19 outer frames not shown")
+        assert trace.count("in _raise_at_depth") == 3
+
+    def test_framework_frames_hidden(self):
+        """Test that frames of hidden modules are left out."""
+
+        @rewrite_step("Step")
+        def step():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError) as excinfo:
+            step()
+
+        trace = format_traceback(excinfo.value.__traceback__, 10)
+
+        assert "rewrite_step.py" not in trace
+        assert "test_failures.py" in trace
+
+    def test_exception_recorded_once(self):
+        """Test that outer steps failed by the same exception link to it."""
+        set_failure_capture(5)
+        error = ValueError("boom")
+
+        message, trace = failure_details(error, "Inner")
+        linked_message, linked_trace = failure_details(error, "Outer")
+
+        assert message == "ValueError: boom"
+        assert trace == ""
+        assert linked_message == "ValueError raised in step 'Inner'"
+        assert linked_trace is None
+
+    def test_cleared_record_not_linked(self):
+        """Test that an exception raised again after clearing is recorded again."""
+        set_failure_capture(5)
+        error = ValueError("boom")
+
+        failure_details(error, "First")
+        clear_failure_record()
+        message, trace = failure_details(error, "Second")
+
+        assert message == "ValueError: boom"
+        assert trace is not None
+
+    def test_status_like_allure_pytest(self):
+        """Test that statuses follow allure-pytest, pytest outcomes included."""
+        with pytest.raises(pytest.fail.Exception) as failed:
+            pytest.fail("no")
+        with pytest.raises(pytest.skip.Exception) as skipped:
+            pytest.skip("later")
+
+        assert step_status(None) == "passed"
+        assert step_status(AssertionError()) == "failed"
+        assert step_status(failed.value) == "failed"
+        assert step_status(skipped.value) == "skipped"
+        assert step_status(ValueError()) == "broken"
+
+    def test_negative_frames_rejected(self):
+        """Test that a negative frame count is rejected."""
+        with pytest.raises(ValueError, match="max_frames"):
+            set_failure_capture(-1)
+
+
+class TestSingleClose:
+    """Test that a step is closed exactly once."""
+
+    def test_failing_close_is_not_retried(self):
+        """Test that a reporting error does not close the step again."""
+        sink = mock.Mock(spec=StepSink)
+        sink.stop_step.side_effect = RuntimeError("report failed")
+        previous = set_sink(sink)
+        try:
+            with pytest.raises(ValueError, match="boom"):
+                with rewrite_step("Step"):
+                    raise ValueError("boom")
+            with pytest.raises(RuntimeError, match="report failed"):
+                with rewrite_step("Step"):
+                    pass
+        finally:
+            set_sink(previous)
+
+        assert sink.stop_step.call_count == 2
+
+
+class TestAllureResults:
+    """Test the failure details written to Allure results."""
+
+    def test_nested_failure_recorded_on_innermost_step(self, pytester):
+        """Test that only the innermost failed step carries the traceback."""
+        pytester.makeini("""
+            [pytest]
+            allure_step_failure_frames = 2
+            """)
+        pytester.makepyfile("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Inner")
+            def inner():
+                raise ValueError("boom")
+
+            @rewrite_step("Middle")
+            def middle():
+                inner()
+
+            @rewrite_step("Outer")
+            def outer():
+                middle()
+
+            def test_failure():
+                outer()
+            """)
+
+        result = pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", "--alluredir", "results"
+        )
+
+        result.assert_outcomes(failed=1)
+        (path,) = (pytester.path / "results").glob("*-result.json")
+        (outer,) = json.loads(path.read_text())["steps"]
+        (middle,) = outer["steps"]
+        (inner,) = middle["steps"]
+        assert inner["name"] == "Inner"
+        assert inner["statusDetails"]["message"] == "ValueError: boom"
+        assert "in inner" in inner["statusDetails"]["trace"]
+        assert outer["status"] == middle["status"] == "broken"
+        assert middle["statusDetails"] == {
+            "message": "ValueError raised in step 'Inner'"
+        }
+
+    def test_reraised_instance_recorded_per_outermost_step(self, pytester):
+        """Test that a cached exception raised in two steps is recorded twice."""
+        pytester.makeini("""
+            [pytest]
+            allure_step_failure_frames = 2
+            """)
+        pytester.makepyfile("""
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            ERROR = ValueError("cached")
+
+            @rewrite_step("Step")
+            def step():
+                raise ERROR
+
+            def test_failure():
+                for _ in range(2):
+                    with pytest.raises(ValueError):
+                        step()
+            """)
+
+        result = pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", "--alluredir", "results"
+        )
+
+        result.assert_outcomes(passed=1)
+        (path,) = (pytester.path / "results").glob("*-result.json")
+        first, second = json.loads(path.read_text())["steps"]
+        for step in (first, second):
+            assert step["statusDetails"]["message"] == "ValueError: cached"
+            assert "in step" in step["statusDetails"]["trace"]
+
+    def test_conftest_capture_kept_without_ini_option(self, pytester):
+        """Test that the plugin neither overrides nor resets a conftest.py setting."""
+        pytester.makeconftest("""
+            from allure_step_rewriter import set_failure_capture
+
+            set_failure_capture(3)
+            """)
+        pytester.makepyfile("""
+            from allure_step_rewriter.failures import failure_capture_enabled
+
+            def test_enabled():
+                assert failure_capture_enabled()
+            """)
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
+        assert failure_capture_enabled()
+
+    def test_pytest_outcomes_in_captured_steps(self, pytester):
+        """Test that pytest.fail() and pytest.skip() keep their step status."""
+        pytester.makeini("""
+            [pytest]
+            allure_step_failure_frames = 2
+            """)
+        pytester.makepyfile("""
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            def test_fail():
+                with rewrite_step("Fail"):
+                    pytest.fail("not ready")
+
+            def test_skip():
+                with rewrite_step("Skip"):
+                    pytest.skip("later")
+            """)
+
+        result = pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", "--alluredir", "results"
+        )
+
+        result.assert_outcomes(failed=1, skipped=1)
+        steps = {}
+        for path in (pytester.path / "results").glob("*-result.json"):
+            (step,) = json.loads(path.read_text())["steps"]
+            steps[step["name"]] = step
+        assert steps["Fail"]["status"] == "failed"
+        assert steps["Skip"]["status"] == "skipped"
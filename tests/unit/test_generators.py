@@ -0,0 +1,187 @@
+"""Tests for steps of generator and async generator functions."""
+
+import asyncio
+
+import pytest
+
+from allure_step_rewriter import rewrite_step
+from allure_step_rewriter.sinks import capture_steps
+
+
+class TestGeneratorSteps:
+    """Test steps of generator functions."""
+
+    def test_step_open_until_exhausted(self):
+        """Test that the step stays open while the generator is consumed."""
+
+        @rewrite_step("Produce rows")
+        def produce():
+            yield 1
+            yield 2
+            return "done"
+
+        with capture_steps() as steps:
+            generator = produce()
+            assert steps.titles() == []
+
+            assert next(generator) == 1
+            step = steps.find("Produce rows")
+            assert step.stop is None
+
+            assert next(generator) == 2
+            with pytest.raises(StopIteration) as stop:
+                next(generator)
+
+        assert stop.value.value == "done"
+        assert step.stop is not None
+        assert step.status == "passed"
+
+    def test_nested_steps_of_the_body(self):
+        """Test that steps of the generator body nest in its step."""
+
+        @rewrite_step("Fetch page")
+        def fetch_page(number):
+            return number
+
+        @rewrite_step("Fetch pages")
+        def fetch_pages():
+            for number in range(2):
+                yield fetch_page(number)
+
+        with capture_steps() as steps:
+            assert list(fetch_pages()) == [0, 1]
+
+        assert steps.titles() == [("Fetch pages", ["Fetch page", "Fetch page"])]
+
+    def test_item_stats(self):
+        """Test that item count and timing are attached."""
+
+        @rewrite_step("Produce", item_stats=True)
+        def produce():
+            yield from range(3)
+
+        with capture_steps() as steps:
+            list(produce())
+
+        attachment = steps.find("Produce").attachments[0]
+        assert attachment["name"] == "Items"
+        assert attachment["body"].startswith("Items: 3\n")
+
+    def test_early_close(self):
+        """Test that closing the generator closes the step and the body."""
+        closed = []
+
+        @rewrite_step("Produce")
+        def produce():
+            try:
+                yield 1
+                yield 2
+            finally:
+                closed.append(True)
+
+        with capture_steps() as steps:
+            generator = produce()
+            next(generator)
+            generator.close()
+
+        assert closed == [True]
+        assert steps.find("Produce").status == "passed"
+
+    def test_exception_fails_step(self):
+        """Test that an exception of the body fails the step."""
+
+        @rewrite_step("Produce")
+        def produce():
+            yield 1
+            raise RuntimeError("broken")
+
+        with capture_steps() as steps:
+            with pytest.raises(RuntimeError):
+                list(produce())
+
+        assert steps.find("Produce").status == "broken"
+
+    def test_send_and_throw(self):
+        """Test that send() and throw() reach the generator."""
+
+        @rewrite_step("Accumulate")
+        def accumulate():
+            total = 0
+            while True:
+                try:
+                    total += yield total
+                except ValueError:
+                    total = 0
+
+        with capture_steps():
+            generator = accumulate()
+            next(generator)
+            assert generator.send(5) == 5
+            assert generator.throw(ValueError) == 0
+            generator.close()
+
+    def test_params_and_step_title(self):
+        """Test that parameters and step_title apply to generator steps."""
+
+        @rewrite_step("Read {name}", params=["name"])
+        def read(name):
+            yield name
+
+        with capture_steps() as steps:
+            list(read("log"))
+            list(read("log", step_title="Custom"))
+
+        assert steps.titles() == ["Read 'log'", "Custom"]
+
+    def test_overridden_inside_step(self):
+        """Test that a generator step inside a context step is merged."""
+
+        @rewrite_step("Produce")
+        def produce():
+            yield 1
+
+        with capture_steps() as steps:
+            with rewrite_step("Outer"):
+                list(produce())
+
+        assert steps.titles() == ["Outer"]
+
+
+class TestAsyncGeneratorSteps:
+    """Test steps of async generator functions."""
+
+    def test_step_open_until_exhausted(self):
+        """Test that the step closes when the async generator is exhausted."""
+
+        @rewrite_step("Stream events", item_stats=True)
+        async def stream():
+            for event in range(3):
+                await asyncio.sleep(0)
+                yield event
+
+        async def consume():
+            return [event async for event in stream()]
+
+        with capture_steps() as steps:
+            assert asyncio.run(consume()) == [0, 1, 2]
+
+        step = steps.find("Stream events")
+        assert step.status == "passed"
+        assert step.attachments[0]["body"].startswith("Items: 3\n")
+
+    def test_exception_fails_step(self):
+        """Test that an exception of the async body fails the step."""
+
+        @rewrite_step("Stream events")
+        async def stream():
+            yield 1
+            raise RuntimeError("broken")
+
+        async def consume():
+            return [event async for event in stream()]
+
+        with capture_steps() as steps:
+            with pytest.raises(RuntimeError):
+                asyncio.run(consume())
+
+        assert steps.find("Stream events").status == "broken"
@@ -0,0 +1,74 @@
+"""Tests for the rewriter state queries."""
+
+from allure_step_rewriter import (
+    NullSink,
+    StepFrame,
+    StepSampler,
+    current_frame,
+    is_recording,
+    rewrite_step,
+    will_override,
+)
+from allure_step_rewriter.metrics import MeteredSink, StepMetrics
+from allure_step_rewriter.sinks import MemorySink, capture_steps, set_sink
+
+
+class TestIntrospection:
+    """Test current_frame(), will_override() and is_recording()."""
+
+    def test_outside_of_any_context(self):
+        """Test the state without an open context."""
+        with capture_steps():
+            assert current_frame() is None
+            assert not will_override()
+            assert is_recording()
+
+    def test_override_consumed(self):
+        """Test that will_override() turns false after the first override."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        with capture_steps():
+            with rewrite_step("Parent"):
+                assert current_frame() == StepFrame("Parent", True, False, True)
+                assert will_override()
+                helper()
+                assert current_frame() == StepFrame("Helper", False, False, True)
+                assert not will_override()
+
+    def test_allow_multiple_keeps_overriding(self):
+        """Test that allow_multiple contexts can always be overridden."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        with capture_steps():
+            with rewrite_step("Parent", allow_multiple=True):
+                helper()
+                assert will_override()
+
+    def test_not_recording_when_sampled_out(self):
+        """Test that nothing is recorded inside a step that was not sampled."""
+        with capture_steps():
+            with rewrite_step("Dropped", sample=StepSampler(rate=0.0)):
+                assert not is_recording()
+                assert not will_override()
+                assert not current_frame().recording
+
+    def test_not_recording_with_null_sink(self):
+        """Test that a sink dropping every step is not recording."""
+        for sink in (NullSink(), MeteredSink(NullSink(), StepMetrics())):
+            previous = set_sink(sink)
+            try:
+                assert not is_recording()
+            finally:
+                set_sink(previous)
+
+        previous = set_sink(MeteredSink(MemorySink(), StepMetrics()))
+        try:
+            assert is_recording()
+        finally:
+            set_sink(previous)
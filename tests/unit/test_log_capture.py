@@ -0,0 +1,127 @@
+"""Tests for per-step log capture."""
+
+import logging
+
+import pytest
+
+from allure_step_rewriter import rewrite_step, set_step_log_capture
+from allure_step_rewriter.sinks import capture_steps
+
+log = logging.getLogger("tests.log_capture")
+
+
+@pytest.fixture(autouse=True)
+def log_level():
+    """Let INFO records of the test logger reach the handlers."""
+    log.setLevel(logging.INFO)
+    yield
+    log.setLevel(logging.NOTSET)
+    set_step_log_capture(False)
+
+
+def _logs(step):
+    """Get the bodies of the "Log" attachments of a step."""
+    return [a["body"] for a in step.attachments if a["name"] == "Log"]
+
+
+class TestLogCapture:
+    """Test attaching log records to the step they were emitted in."""
+
+    def test_records_attached_once_per_step(self):
+        """Test that the records of each step form a single attachment."""
+
+        @rewrite_step("Child", capture_logs=True)
+        def child():
+            log.info("in child")
+
+        with capture_steps() as sink:
+            with rewrite_step("Parent", capture_logs=True):
+                log.info("first")
+                with rewrite_step("Nested"):
+                    log.info("second")
+                child()
+                log.info("third")
+
+        (parent_log,) = _logs(sink.find("Parent"))
+        assert [line.split(": ")[-1] for line in parent_log.splitlines()] == [
+            "first",
+            "second",
+            "third",
+        ]
+        assert "INFO tests.log_capture: in child" in _logs(sink.find("Child"))[0]
+
+    def test_no_attachment_without_records(self):
+        """Test that a step without records gets no attachment."""
+        with capture_steps() as sink:
+            with rewrite_step("Quiet", capture_logs=True):
+                pass
+
+        assert sink.find("Quiet").attachments == []
+
+    def test_overridden_step_logs_into_outer_step(self):
+        """Test that records of a merged step go to the step it was merged into."""
+
+        @rewrite_step("Helper", capture_logs=True)
+        def helper():
+            log.info("helper")
+
+        with capture_steps() as sink:
+            with rewrite_step("Parent", capture_logs=True):
+                helper()
+
+        (step,) = sink.steps
+        assert step.overrides == ["Helper"]
+        assert "helper" in _logs(step)[0]
+
+    def test_failure_mode(self):
+        """Test that "failure" mode only attaches the records of failed steps."""
+
+        @rewrite_step("Step", capture_logs="failure")
+        def step(fail):
+            log.info("working")
+            if fail:
+                raise ValueError("boom")
+
+        with capture_steps() as sink:
+            step(False)
+            with pytest.raises(ValueError):
+                step(True)
+
+        passed, failed = sink.steps
+        assert _logs(passed) == []
+        assert "working" in _logs(failed)[0]
+
+    def test_ring_buffer_keeps_latest_records(self):
+        """Test that only the newest records are kept, with a dropped count."""
+        set_step_log_capture(True, max_records=2)
+
+        with capture_steps() as sink:
+            with rewrite_step("Chatty"):
+                for number in range(5):
+                    log.info("record %d", number)
+
+        lines = _logs(sink.find("Chatty"))[0].splitlines()
+        assert lines[0] == "... 3 earlier records dropped"
+        assert lines[1].endswith("record 3")
+        assert lines[2].endswith("record 4")
+
+    def test_generator_step_captures_only_its_body(self):
+        """Test that records of the consumer are not attached to a generator."""
+
+        @rewrite_step("Produce", capture_logs=True)
+        def produce():
+            for number in range(2):
+                log.info("produce %d", number)
+                yield number
+
+        with capture_steps() as sink:
+            for _ in produce():
+                log.info("consume")
+
+        lines = _logs(sink.find("Produce"))[0].splitlines()
+        assert [line.split(": ")[-1] for line in lines] == ["produce 0", "produce 1"]
+
+    def test_invalid_mode(self):
+        """Test that an unknown capture_logs value is rejected."""
+        with pytest.raises(ValueError, match="capture_logs"):
+            rewrite_step("Step", capture_logs="sometimes")
@@ -1,7 +1,10 @@
 """Tests for multiple step overrides in single context."""
 
 import allure
-from allure_step_rewriter import rewrite_step
+import pytest
+
+from allure_step_rewriter import rewrite_step, will_override
+from allure_step_rewriter.sinks import capture_steps
 
 
 class TestMultipleOverrides:
@@ -153,3 +156,141 @@ class TestMultipleOverrides:
         assert r2 == "result"
         assert r3 == "result"
         assert r4 == "result"
+
+
+@rewrite_step("Lookup")
+def lookup():
+    """Innermost helper."""
+    return "found"
+
+
+@rewrite_step("Search")
+def search():
+    """Helper calling another helper."""
+    return lookup()
+
+
+class TestOverrideDepth:
+    """Test limiting overrides to steps nested at most depth levels deep."""
+
+    def test_unlimited_depth_overrides_nested_helpers(self):
+        """Test that without depth, helpers of helpers are merged too."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent", allow_multiple=True):
+                search()
+
+        (parent,) = sink.steps
+        assert parent.overrides == ["Search", "Lookup"]
+        assert parent.steps == []
+
+    def test_depth_one_records_deeper_steps(self):
+        """Test that only direct children are merged with depth=1."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent", allow_multiple=True, depth=1):
+                assert search() == "found"
+                search()
+
+        (parent,) = sink.steps
+        assert parent.overrides == ["Search", "Search"]
+        assert [step.title for step in parent.steps] == ["Lookup", "Lookup"]
+
+    def test_suppress_deeper(self):
+        """Test that steps deeper than depth are dropped with suppress_deeper."""
+        with capture_steps() as sink:
+            with rewrite_step(
+                "Parent", allow_multiple=True, depth=1, suppress_deeper=True
+            ):
+                assert search() == "found"
+
+        (parent,) = sink.steps
+        assert parent.overrides == ["Search"]
+        assert parent.steps == []
+
+    def test_suppress_deeper_context(self):
+        """Test that a context manager deeper than depth is dropped too."""
+
+        @rewrite_step("Helper")
+        def helper():
+            with rewrite_step("Deep ctx"):
+                lookup()
+
+        with capture_steps() as sink:
+            with rewrite_step("Outer", depth=1, suppress_deeper=True):
+                helper()
+
+        (outer,) = sink.steps
+        assert outer.overrides == ["Helper"]
+        assert outer.steps == []
+
+    def test_generator_body_counts_as_a_level(self):
+        """Test that steps inside an overridden generator are one level deeper."""
+
+        @rewrite_step("Gen")
+        def gen():
+            yield lookup()
+
+        with capture_steps() as sink:
+            with rewrite_step("Parent", allow_multiple=True, depth=1):
+                assert list(gen()) == ["found"]
+                assert will_override()
+
+        (parent,) = sink.steps
+        assert parent.overrides == ["Gen"]
+        assert [step.title for step in parent.steps] == ["Lookup"]
+
+    def test_suppress_deeper_generator(self):
+        """Test that a generator deeper than depth is dropped with its steps."""
+
+        @rewrite_step("Gen")
+        def gen():
+            yield lookup()
+
+        @rewrite_step("Helper")
+        def helper():
+            return list(gen())
+
+        with capture_steps() as sink:
+            with rewrite_step("Outer", depth=1, suppress_deeper=True):
+                assert helper() == ["found"]
+
+        (outer,) = sink.steps
+        assert outer.overrides == ["Helper"]
+        assert outer.steps == []
+
+    def test_suppress_deeper_cached_call(self):
+        """Test that a cached call deeper than depth is dropped."""
+
+        @rewrite_step("Cached", cache=True)
+        def cached():
+            return "value"
+
+        @rewrite_step("Helper")
+        def helper():
+            return cached()
+
+        cached()
+        with capture_steps() as sink:
+            with rewrite_step("Outer", depth=1, suppress_deeper=True):
+                assert helper() == "value"
+
+        (outer,) = sink.steps
+        assert outer.overrides == ["Helper"]
+        assert outer.steps == []
+
+    def test_overriding_context_counts_as_a_level(self):
+        """Test that steps inside an overriding context are one level deeper."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent", allow_multiple=True, depth=1):
+                with rewrite_step("Child"):
+                    assert not will_override()
+                    lookup()
+                assert will_override()
+
+        (parent,) = sink.steps
+        assert parent.overrides == ["Child"]
+        assert [step.title for step in parent.steps] == ["Lookup"]
+
+    def test_invalid_depth(self):
+        """Test that a depth below 1 is rejected."""
+        with pytest.raises(ValueError, match="depth"):
+            rewrite_step("Parent", depth=0)
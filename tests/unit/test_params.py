@@ -0,0 +1,160 @@
+"""Tests for step parameters captured from function arguments."""
+
+import inspect
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import rewrite_step
+from allure_step_rewriter.params import BoundedRepr, ParamRecorder
+from allure_step_rewriter.sinks import capture_steps
+
+
+class FakeFrame:
+    """Array-like object with an expensive repr."""
+
+    shape = (100000, 20)
+
+    def __repr__(self):
+        raise AssertionError("repr() must not be called")
+
+
+class TestBoundedRepr:
+    """Test the size-capped repr."""
+
+    def test_long_string_is_cut(self):
+        """Test that long strings are cut to the maximum length."""
+        text = BoundedRepr(20).repr("x" * 10**6)
+
+        assert len(text) <= 20
+
+    def test_large_containers_are_cut(self):
+        """Test that large containers are cut."""
+        text = BoundedRepr(50).repr({str(key): list(range(100)) for key in range(100)})
+
+        assert len(text) <= 50
+        assert text.endswith("...")
+
+    def test_bytes_head(self):
+        """Test that long bytes show their head and size."""
+        text = BoundedRepr(40).repr(b"x" * 1000)
+
+        assert text.startswith("b'xxx")
+        assert text.endswith("... (1000 bytes)")
+        assert len(text) <= 40
+
+    def test_shape_summary(self):
+        """Test that array-like objects are summarised without repr()."""
+        assert BoundedRepr().repr(FakeFrame()) == "<FakeFrame shape=(100000, 20)>"
+
+
+class TestParamRecorder:
+    """Test argument resolution."""
+
+    def test_positional_keyword_and_default(self):
+        """Test that arguments are found wherever they are passed."""
+
+        def load(report_id, frame, limit=10, *rest, **options):
+            pass
+
+        recorder = ParamRecorder(load, ["report_id", "limit", "rest", "options"])
+
+        assert recorder.capture((1, None), {"verbose": True}) == {
+            "report_id": "1",
+            "limit": "10",
+            "rest": "()",
+            "options": "{'verbose': True}",
+        }
+        assert recorder.capture((1, None, 5, 6), {})["rest"] == "(6,)"
+
+    def test_all_arguments_skip_self(self):
+        """Test that params=True records everything but self."""
+
+        class Client:
+            def get(self, path, timeout=1.0):
+                pass
+
+        recorder = ParamRecorder(Client.get, True)
+
+        assert recorder.capture((Client(), "/users"), {}) == {
+            "path": "'/users'",
+            "timeout": "1.0",
+        }
+
+    def test_single_name(self):
+        """Test that a plain string is one argument name, not its letters."""
+
+        def load(report_id, frame):
+            pass
+
+        recorder = ParamRecorder(load, "report_id")
+
+        assert recorder.capture((1, None), {}) == {"report_id": "1"}
+
+    def test_unknown_name(self):
+        """Test that misspelt names fail at decoration time."""
+        with pytest.raises(ValueError, match="usr_id"):
+            rewrite_step("Load", params=["usr_id"])(lambda user_id: None)
+
+
+class TestRewriteStepParams:
+    """Test parameters of created steps."""
+
+    def test_decorated_function(self):
+        """Test that selected arguments become parameters and fill the title."""
+
+        @rewrite_step("Load report {report_id}", params=["report_id", "frame"])
+        def load_report(report_id, frame):
+            pass
+
+        with capture_steps() as sink:
+            load_report(7, FakeFrame())
+
+        (step,) = sink.steps
+        assert step.title == "Load report 7"
+        assert step.params == {
+            "report_id": "7",
+            "frame": "<FakeFrame shape=(100000, 20)>",
+        }
+
+    def test_signature_resolved_once(self):
+        """Test that the signature is inspected at decoration time only."""
+        with mock.patch(
+            "allure_step_rewriter.params.inspect.signature",
+            wraps=inspect.signature,
+        ) as signature:
+
+            @rewrite_step("Load", params=True)
+            def load(report_id):
+                pass
+
+            with capture_steps():
+                for report_id in range(3):
+                    load(report_id)
+
+        assert signature.call_count == 1
+
+    def test_overridden_step_skips_formatting(self):
+        """Test that parameters are not formatted for overridden steps."""
+
+        @rewrite_step("Load", params=["frame"])
+        def load(frame):
+            pass
+
+        frame = FakeFrame()
+        frame.shape = None  # repr() would raise if it were formatted
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                load(frame)
+
+        assert sink.titles() == ["Parent"]
+
+    def test_context_manager_mapping(self):
+        """Test parameters passed to the context manager."""
+        with capture_steps() as sink:
+            with rewrite_step("Open {page}", params={"page": "/" + "x" * 500}):
+                pass
+
+        (step,) = sink.steps
+        assert len(step.params["page"]) <= 100
+        assert step.title.startswith("Open '/xxx")
@@ -0,0 +1,330 @@
+"""Tests for the per-test state and options of the pytest plugin."""
+
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import (
+    StepSampler,
+    plugin,
+    rewrite_step,
+    set_sampler,
+    set_sink,
+    set_step_log_capture,
+)
+from allure_step_rewriter.metrics import MeteredSink, StepMetrics, set_metrics
+from allure_step_rewriter.sinks import MemorySink, capture_steps
+
+
+def run(pytester, *args):
+    """Run pytest in the pytester directory with the plugin enabled."""
+    return pytester.runpytest("-p", "allure_step_rewriter.plugin", *args)
+
+
+class TestStepMetrics:
+    """Test step counters."""
+
+    def test_metered_sink_counts_steps(self):
+        """Test that created, overridden and dropped steps are counted."""
+        metrics = StepMetrics()
+        sink = MeteredSink(MemorySink(), metrics)
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        previous = set_sink(sink)
+        set_metrics(metrics)
+        try:
+            with rewrite_step("Parent"):
+                helper()
+            set_sampler(StepSampler(budget=0))
+            helper()
+        finally:
+            set_sampler(None)
+            set_metrics(None)
+            set_sink(previous)
+
+        counts = metrics.snapshot()
+        assert (counts.created, counts.overridden, counts.dropped) == (1, 1, 1)
+        assert counts.overhead > 0
+
+    def test_overhead_is_wrapper_time(self):
+        """Test that the overhead covers the wrapper but not the function."""
+
+        @rewrite_step("Slow")
+        def slow():
+            time.sleep(0.05)
+
+        metrics = StepMetrics()
+        previous = set_sink(MemorySink())
+        set_metrics(metrics)
+        try:
+            slow()
+        finally:
+            set_metrics(None)
+            set_sink(previous)
+
+        assert 0 < metrics.overhead < 0.05
+
+    def test_capture_steps_keeps_counting(self):
+        """Test that steps captured in memory are still counted."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        metrics = StepMetrics()
+        set_metrics(metrics)
+        try:
+            with capture_steps() as steps:
+                helper()
+        finally:
+            set_metrics(None)
+
+        assert steps.titles() == ["Helper"]
+        assert metrics.created == 1
+
+
+class TestPluginState:
+    """Test per-test isolation of the rewriter state."""
+
+    def test_leaked_context_is_reset_with_warning(self, pytester):
+        """Test that an open context does not leak into the next test."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Helper")
+            def helper():
+                pass
+
+            def test_leak():
+                rewrite_step("Leaked").__enter__()
+
+            def test_clean(captured_steps):
+                helper()
+                assert captured_steps.titles() == ["Helper"]
+            """)
+
+        result = run(pytester)
+
+        result.assert_outcomes(passed=2)
+        result.stdout.fnmatch_lines(["*StepStateWarning*'Leaked'*"])
+
+
+class TestPluginOptions:
+    """Test the command-line modes of the plugin."""
+
+    def test_disable(self, pytester):
+        """Test that --allure-step-disable drops every step."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import NullSink
+            from allure_step_rewriter.sinks import get_sink
+
+            def test_sink():
+                assert isinstance(get_sink(), NullSink)
+            """)
+
+        run(pytester, "--allure-step-disable").assert_outcomes(passed=1)
+
+    def test_budget_per_test(self, pytester):
+        """Test that the step budget restarts with each test."""
+        pytester.makepyfile("""
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            @pytest.mark.parametrize("run", [1, 2])
+            def test_budget(captured_steps, run):
+                for title in "ABC":
+                    with rewrite_step(title):
+                        pass
+                assert captured_steps.titles() == ["A", "B"]
+            """)
+
+        run(pytester, "--allure-step-budget=2").assert_outcomes(passed=2)
+
+    def test_collapse(self, pytester):
+        """Test that --allure-step-collapse collapses recursion by default."""
+        pytester.makeconftest("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Count up")
+            def count_up(n):
+                if n:
+                    count_up(n - 1)
+            """)
+        pytester.makepyfile("""
+            from conftest import count_up
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Count down")
+            def count_down(n):
+                if n:
+                    count_down(n - 1)
+
+            def test_collapse(captured_steps):
+                count_down(3)
+                count_up(3)
+                assert captured_steps.titles() == ["Count down", "Count up"]
+            """)
+
+        run(pytester, "--allure-step-collapse").assert_outcomes(passed=1)
+
+    def test_metrics_summary(self, pytester):
+        """Test that --allure-step-metrics shows counts per test."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Helper")
+            def helper():
+                pass
+
+            def test_steps():
+                with rewrite_step("Parent"):
+                    helper()
+                helper()
+            """)
+
+        result = run(pytester, "--allure-step-metrics")
+
+        result.assert_outcomes(passed=1)
+        result.stdout.fnmatch_lines(
+            [
+                "*allure-step-rewriter: step metrics*",
+                "1 tests: created 2, overridden 1, dropped 0, *",
+                "*created     2  overridden     1  dropped     0  *::test_steps",
+            ]
+        )
+
+    def test_capture_logs_ini(self, pytester):
+        """Test that allure_step_capture_logs captures the records of steps."""
+        pytester.makeini("""
+            [pytest]
+            allure_step_capture_logs = failure
+            allure_step_log_records = 5
+            """)
+        pytester.makepyfile("""
+            import logging
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            def test_failed_step(captured_steps):
+                with pytest.raises(ValueError):
+                    with rewrite_step("Step"):
+                        logging.getLogger().warning("about to fail")
+                        raise ValueError("boom")
+                (attachment,) = captured_steps.find("Step").attachments
+                assert attachment["name"] == "Log"
+                assert "about to fail" in attachment["body"]
+            """)
+
+        run(pytester).assert_outcomes(passed=1)
+
+    def test_conftest_log_capture_kept_without_ini_options(self, pytester):
+        """Test that the plugin keeps log capture enabled through the API."""
+        pytester.makeconftest("""
+            from allure_step_rewriter import set_step_log_capture
+
+            set_step_log_capture(True)
+            """)
+        pytester.makepyfile("""
+            import logging
+
+            from allure_step_rewriter import rewrite_step
+
+            def test_logs(captured_steps):
+                with rewrite_step("Step"):
+                    logging.getLogger().warning("captured")
+                (step,) = captured_steps.steps
+                assert step.attachments[0]["name"] == "Log"
+            """)
+
+        try:
+            run(pytester).assert_outcomes(passed=1)
+        finally:
+            set_step_log_capture(False)
+
+
+class TestRewriteStepMarker:
+    """Test title overrides declared with the rewrite_step marker."""
+
+    def test_rules_from_mapping_and_target(self, pytester):
+        """Test that marker rules rename steps, the closest marker winning."""
+        pytester.makepyfile("""
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Open page")
+            def open_page():
+                pass
+
+            @rewrite_step("Log in")
+            def log_in():
+                pass
+
+            @pytest.mark.rewrite_step({"Open page": "Open cart", "Log in": "Sign in"})
+            class TestCart:
+                @pytest.mark.rewrite_step("Open checkout", target="Open page")
+                @pytest.mark.parametrize("run", [1, 2])
+                def test_checkout(self, captured_steps, run):
+                    open_page()
+                    log_in()
+                    with rewrite_step("Pay"):
+                        pass
+                    assert captured_steps.titles() == [
+                        "Open checkout", "Sign in", "Pay"
+                    ]
+
+            def test_unmarked(captured_steps):
+                open_page()
+                assert captured_steps.titles() == ["Open page"]
+            """)
+
+        run(pytester).assert_outcomes(passed=3)
+
+    def test_title_wraps_test(self, pytester):
+        """Test that a title marker records a step around the test body."""
+        pytester.makepyfile("""
+            import pytest
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Helper")
+            def helper():
+                pass
+
+            @pytest.mark.rewrite_step("Checkout")
+            def test_wrapped(captured_steps):
+                helper()
+                helper()
+                assert captured_steps.titles() == [("Checkout", ["Helper"])]
+            """)
+
+        run(pytester).assert_outcomes(passed=1)
+
+    def test_step_error_without_force_exception(self):
+        """Test that a marker step error propagates with older pluggy."""
+        wrapper = mock.MagicMock()
+        wrapper.__exit__.side_effect = RuntimeError("report failed")
+        item = SimpleNamespace(stash={plugin._compiled_marks_key: (None, wrapper)})
+
+        hook = plugin.pytest_runtest_call(item)
+        next(hook)
+        with pytest.raises(RuntimeError, match="report failed"):
+            hook.send(SimpleNamespace(excinfo=None))
+
+    def test_invalid_marker(self, pytester):
+        """Test that a marker without a title is a usage error."""
+        pytester.makepyfile("""
+            import pytest
+
+            @pytest.mark.rewrite_step(42)
+            def test_invalid():
+                pass
+            """)
+
+        result = run(pytester)
+
+        assert result.ret == pytest.ExitCode.USAGE_ERROR
+        result.stderr.fnmatch_lines(["*invalid rewrite_step marker*"])
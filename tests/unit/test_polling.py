@@ -0,0 +1,117 @@
+"""Tests for rewrite_step.poll() and rewrite_step.retry()."""
+
+import pytest
+
+from allure_step_rewriter import PollTimeoutError, rewrite_step
+from allure_step_rewriter.sinks import capture_steps
+
+
+def flaky(failures, result="ok"):
+    """Create a function failing a number of times before returning."""
+    calls = []
+
+    @rewrite_step("Check")
+    def check():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise AssertionError(f"attempt {len(calls)} failed")
+        return result
+
+    return check
+
+
+class TestRetry:
+    """Test rewrite_step.retry()."""
+
+    def test_single_step_for_all_attempts(self):
+        """Test that attempts are merged into one step with statistics."""
+        with capture_steps() as steps:
+            assert rewrite_step.retry("Get token", flaky(2), attempts=3) == "ok"
+
+        step = steps.find("Get token")
+        assert steps.titles() == ["Get token"]
+        assert step.overrides == ["Check", "Check", "Check"]
+        assert step.params["attempts"] == "3"
+        assert step.params["attempt time"].startswith("min ")
+        assert step.status == "passed"
+        assert step.attachments == []
+
+    def test_last_failure_raised(self):
+        """Test that the last exception propagates once attempts run out."""
+        with capture_steps() as steps:
+            with pytest.raises(AssertionError, match="attempt 2 failed"):
+                rewrite_step.retry("Get token", flaky(5), attempts=2)
+
+        step = steps.find("Get token")
+        assert step.status == "failed"
+        assert step.params["attempts"] == "2"
+        # The raised exception is the step's failure, not attached again
+        assert step.attachments == []
+
+    def test_other_exceptions_propagate(self):
+        """Test that exceptions outside `exceptions` are not retried."""
+        calls = []
+
+        def fail():
+            calls.append(None)
+            raise KeyError("missing")
+
+        with capture_steps():
+            with pytest.raises(KeyError):
+                rewrite_step.retry("Read", fail, exceptions=(AssertionError,))
+
+        assert len(calls) == 1
+
+    def test_invalid_attempts(self):
+        """Test that at least one attempt is required."""
+        with pytest.raises(ValueError):
+            rewrite_step.retry("Read", lambda: None, attempts=0)
+
+
+class TestPoll:
+    """Test rewrite_step.poll()."""
+
+    def test_until_predicate(self):
+        """Test that polling stops at the first accepted result."""
+        values = iter([1, 2, 3, 4])
+
+        with capture_steps() as steps:
+            result = rewrite_step.poll(
+                "Wait for 3",
+                lambda: next(values),
+                until=lambda value: value == 3,
+                interval=0,
+            )
+
+        assert result == 3
+        assert steps.find("Wait for 3").params["attempts"] == "3"
+
+    def test_exceptions_count_as_failed_attempts(self):
+        """Test that ignored exceptions lead to another attempt."""
+        with capture_steps() as steps:
+            assert rewrite_step.poll("Wait", flaky(2), interval=0) == "ok"
+
+        assert steps.titles() == ["Wait"]
+        assert steps.find("Wait").params["attempts"] == "3"
+
+    def test_timeout_attaches_last_failure(self):
+        """Test that a timeout fails the step with the last failure attached."""
+        with capture_steps() as steps:
+            with pytest.raises(PollTimeoutError) as error:
+                rewrite_step.poll("Wait", flaky(10**6), timeout=0.05, interval=0.01)
+
+        step = steps.find("Wait")
+        assert step.status == "failed"
+        assert isinstance(error.value.__cause__, AssertionError)
+        (attachment,) = step.attachments
+        assert attachment["name"] == "Last failure"
+        assert "AssertionError: attempt" in attachment["body"]
+
+    def test_timeout_with_rejected_result(self):
+        """Test that a rejected result is described as the last failure."""
+        with capture_steps() as steps:
+            with pytest.raises(PollTimeoutError):
+                rewrite_step.poll("Wait", lambda: [], timeout=0.02, interval=0.01)
+
+        (attachment,) = steps.find("Wait").attachments
+        assert attachment["body"].endswith("returned []")
@@ -0,0 +1,151 @@
+"""Tests for opt-in per-step profiling."""
+
+import marshal
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import rewrite_step, set_profiled_titles
+from allure_step_rewriter.profiling import should_profile
+
+
+@pytest.fixture
+def attachments():
+    """Collect Allure attachments by name."""
+    with mock.patch("allure.attach") as attach:
+        yield lambda: {
+            call.kwargs["name"]: call.args[0] for call in attach.call_args_list
+        }
+
+
+@pytest.fixture(autouse=True)
+def reset_patterns():
+    """Remove profiled title patterns after each test."""
+    yield
+    set_profiled_titles([])
+
+
+def busy_function():
+    """Function expected to show up in the profile."""
+    return sum(range(1000))
+
+
+class TestProfiling:
+    """Test profiling of matching steps."""
+
+    def test_title_patterns(self):
+        """Test shell-style matching of step titles."""
+        set_profiled_titles(["Login*", "Load schema"])
+
+        assert should_profile("Login as admin")
+        assert should_profile("Load schema")
+        assert not should_profile("Logout")
+        assert should_profile("Logout", profile=True)
+        assert not should_profile("Login", profile=False)
+
+    def test_profile_flag_attaches_results(self, attachments):
+        """Test that a profiled decorated call attaches pstats and a summary."""
+
+        @rewrite_step("Suspicious", profile=True)
+        def suspicious():
+            return busy_function()
+
+        assert suspicious() == 499500
+
+        stats = marshal.loads(attachments()["Profile (pstats)"])
+        assert any(key[2] == "busy_function" for key in stats)
+        assert "busy_function" in attachments()["Profile summary"]
+
+    def test_matching_context_is_profiled(self, attachments):
+        """Test that a context whose title matches a pattern is profiled."""
+        set_profiled_titles(["Suspicious*"])
+
+        with rewrite_step("Suspicious block"):
+            busy_function()
+
+        assert "busy_function" in attachments()["Profile summary"]
+
+    def test_other_steps_are_not_profiled(self, attachments):
+        """Test that no profiler is created for non-matching steps."""
+        set_profiled_titles(["Suspicious*"])
+
+        with mock.patch("cProfile.Profile") as profile:
+            with rewrite_step("Regular block"):
+                busy_function()
+
+        profile.assert_not_called()
+        assert attachments() == {}
+
+    def test_nested_matching_steps_profiled_once(self, attachments):
+        """Test that nested matching steps reuse the outer profile."""
+
+        @rewrite_step("Inner", profile=True)
+        def inner():
+            return busy_function()
+
+        with rewrite_step("Outer", profile=True):
+            with rewrite_step("Block"):
+                inner()
+
+        assert len(attachments()) == 2
+
+    def test_generator_body_is_profiled(self, attachments):
+        """Test that a generator step profiles its body, not its consumer."""
+
+        def consumer_function():
+            return sum(range(10))
+
+        @rewrite_step("Produce", profile=True)
+        def produce():
+            for _ in range(3):
+                yield busy_function()
+
+        for _ in produce():
+            consumer_function()
+
+        stats = marshal.loads(attachments()["Profile (pstats)"])
+        functions = {key[2] for key in stats}
+        assert "busy_function" in functions
+        assert "consumer_function" not in functions
+
+
+class TestProfilingOptions:
+    """Test the profiling ini option of the plugin."""
+
+    def test_conftest_titles_kept_without_ini_option(self, pytester):
+        """Test that the plugin keeps titles set through the API in conftest.py."""
+        pytester.makeconftest("""
+            from allure_step_rewriter import set_profiled_titles
+
+            set_profiled_titles(["Login*"])
+            """)
+        pytester.makepyfile("""
+            from allure_step_rewriter.profiling import should_profile
+
+            def test_profiled():
+                assert should_profile("Login as admin")
+            """)
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
+
+    def test_ini_option_sets_titles(self, pytester):
+        """Test that allure_step_profile selects the profiled titles."""
+        pytester.makeini("""
+            [pytest]
+            allure_step_profile =
+                Login*
+                Export*
+            """)
+        pytester.makepyfile("""
+            from allure_step_rewriter.profiling import should_profile
+
+            def test_profiled():
+                assert should_profile("Export users")
+                assert not should_profile("Open page")
+            """)
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
@@ -0,0 +1,158 @@
+"""Tests for collapsing recursive decorated calls."""
+
+import sys
+import threading
+
+import pytest
+
+from allure_step_rewriter import rewrite_step, set_collapse_recursion
+from allure_step_rewriter.sinks import capture_steps
+
+
+@rewrite_step("Walk", collapse_recursion=True)
+def walk(depth):
+    """Count the calls of a walk with two children per level above 2."""
+    if depth <= 1:
+        return 1
+    return 1 + sum(walk(depth - 1) for _ in range(2 if depth > 2 else 1))
+
+
+class TestCollapseRecursion:
+    """Test that recursive calls record a single step."""
+
+    def test_single_step_with_depth_and_calls(self):
+        """Test that only the outermost call is recorded and annotated."""
+        with capture_steps() as steps:
+            assert walk(4) == 11
+
+        assert steps.titles() == ["Walk"]
+        assert steps.find("Walk").params == {"recursion depth": "4", "calls": "11"}
+
+    def test_deep_recursion(self):
+        """Test that deep recursion does not build a deep step tree."""
+
+        @rewrite_step("Count down", collapse_recursion=True)
+        def count_down(n):
+            return 0 if n == 0 else count_down(n - 1)
+
+        depth = min(1000, sys.getrecursionlimit() // 4)
+        with capture_steps() as steps:
+            count_down(depth)
+
+        assert steps.titles() == ["Count down"]
+        assert steps.find("Count down").params["calls"] == str(depth + 1)
+
+    def test_non_recursive_call_not_annotated(self):
+        """Test that calls without recursion get no parameters."""
+        with capture_steps() as steps:
+            walk(1)
+            walk(1)
+
+        assert steps.titles() == ["Walk", "Walk"]
+        assert steps.find("Walk").params == {}
+
+    def test_session_default_read_at_decoration(self):
+        """Test that set_collapse_recursion() covers functions decorated later."""
+
+        def count_down(n):
+            if n:
+                recurse(n - 1)
+
+        recurse = rewrite_step("Before")(count_down)
+        set_collapse_recursion(True)
+        try:
+            with capture_steps() as before:
+                recurse(2)
+            recurse = rewrite_step("After")(count_down)
+            with capture_steps() as after:
+                recurse(2)
+        finally:
+            set_collapse_recursion(False)
+
+        assert before.titles() == [("Before", [("Before", ["Before"])])]
+        assert after.titles() == ["After"]
+
+    def test_other_steps_still_nest(self):
+        """Test that other decorated functions nest inside the collapsed step."""
+
+        @rewrite_step("Visit")
+        def visit(n):
+            return n
+
+        @rewrite_step("Traverse", collapse_recursion=True)
+        def traverse(n):
+            visit(n)
+            if n:
+                traverse(n - 1)
+
+        with capture_steps() as steps:
+            traverse(1)
+
+        assert steps.titles() == [("Traverse", ["Visit", "Visit"])]
+
+    def test_overridden_outermost_call_annotates_context(self):
+        """Test that a merged outermost call annotates the context step."""
+        with capture_steps() as steps:
+            with rewrite_step("Load tree"):
+                walk(3)
+
+        assert steps.titles() == ["Load tree"]
+        assert steps.find("Load tree").params == {
+            "recursion depth": "3",
+            "calls": "5",
+        }
+
+    def test_exception_unwinds_depth(self):
+        """Test that an exception in a recursive call resets the depth."""
+
+        @rewrite_step("Fail deep", collapse_recursion=True)
+        def fail_deep(n):
+            if n == 0:
+                raise RuntimeError("bottom")
+            fail_deep(n - 1)
+
+        with capture_steps() as steps:
+            with pytest.raises(RuntimeError):
+                fail_deep(3)
+            with pytest.raises(RuntimeError):
+                fail_deep(0)
+
+        assert steps.titles() == ["Fail deep", "Fail deep"]
+        assert steps.steps[0].params["calls"] == "4"
+        assert steps.steps[1].params == {}
+
+    def test_threads_tracked_separately(self):
+        """Test that calls on another thread are not taken for recursion."""
+        results = []
+
+        @rewrite_step("Spawn", collapse_recursion=True)
+        def spawn(n):
+            if n:
+                thread = threading.Thread(target=lambda: results.append(spawn(0)))
+                thread.start()
+                thread.join()
+            return n
+
+        with capture_steps() as steps:
+            spawn(1)
+
+        assert steps.titles() == ["Spawn", "Spawn"]
+
+    def test_recursive_generator(self):
+        """Test that a recursive generator records one step."""
+
+        @rewrite_step("Iterate tree", collapse_recursion=True)
+        def iterate(node):
+            yield node["name"]
+            for child in node.get("children", []):
+                yield from iterate(child)
+
+        tree = {"name": "a", "children": [{"name": "b"}, {"name": "c"}]}
+        with capture_steps() as steps:
+            assert list(iterate(tree)) == ["a", "b", "c"]
+
+        assert steps.titles() == ["Iterate tree"]
+        assert steps.find("Iterate tree").params == {
+            "recursion depth": "2",
+            "calls": "3",
+        }
@@ -2,6 +2,13 @@
 
 import pytest
 from allure_step_rewriter import rewrite_step
+from allure_step_rewriter.rewrite_step import (
+    _current_thread_id,
+    _new_rules_frame,
+    _pop_frame,
+    _push_frame,
+)
+from allure_step_rewriter.sinks import capture_steps
 
 
 class TestRewriteStepContext:
@@ -64,3 +71,21 @@ class TestRewriteStepContext:
         assert result1 == "first"
         assert result2 == "second"
         assert result3 == "third"
+
+    def test_reused_context_keeps_its_title(self):
+        """Test that a title rule applies to one entry of a reused context."""
+        step = rewrite_step("Original")
+        thread_id = _current_thread_id()
+        frame = _push_frame(thread_id, _new_rules_frame({"Original": "Renamed"}))
+        try:
+            with capture_steps() as renamed:
+                with step:
+                    pass
+        finally:
+            _pop_frame(thread_id, frame)
+        with capture_steps() as plain:
+            with step:
+                pass
+
+        assert renamed.titles() == ["Renamed"]
+        assert plain.titles() == ["Original"]
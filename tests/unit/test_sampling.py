@@ -0,0 +1,161 @@
+"""Tests for sampling of top-level steps."""
+
+from unittest import mock
+
+import allure
+import pytest
+
+from allure_step_rewriter import StepSampler, rewrite_step, set_sampler
+from allure_step_rewriter.rewrite_step import _active_step_contexts, _current_thread_id
+
+
+@pytest.fixture
+def recorded_titles():
+    """Collect titles of the Allure steps actually created."""
+    with mock.patch("allure.step", wraps=allure.step) as step:
+        yield lambda: [call.args[0] for call in step.call_args_list]
+
+
+@pytest.fixture(autouse=True)
+def reset_sampler():
+    """Remove the session-wide sampler after each test."""
+    yield
+    set_sampler(None)
+
+
+class TestStepSampler:
+    """Test sampler decisions."""
+
+    def test_every_nth_per_title(self):
+        """Test that one in N steps of each title is recorded."""
+        sampler = StepSampler(every=3)
+
+        decisions = [sampler.should_record("A") for _ in range(6)]
+
+        assert decisions == [True, False, False, True, False, False]
+        assert sampler.should_record("B") is True
+
+    def test_rate_is_reproducible_with_seed(self):
+        """Test that seeded random sampling is deterministic."""
+        first = StepSampler(rate=0.5, seed=7)
+        second = StepSampler(rate=0.5, seed=7)
+
+        decisions = [first.should_record("A") for _ in range(50)]
+
+        assert decisions == [second.should_record("A") for _ in range(50)]
+        assert True in decisions and False in decisions
+
+    def test_budget_until_reset(self):
+        """Test that the budget caps recorded steps until reset()."""
+        sampler = StepSampler(budget=2)
+
+        decisions = [sampler.should_record(title) for title in "ABC"]
+        sampler.reset()
+
+        assert decisions == [True, True, False]
+        assert sampler.should_record("D") is True
+
+    @pytest.mark.parametrize("kwargs", [{"every": 0}, {"rate": 1.5}, {"budget": -1}])
+    def test_invalid_arguments(self, kwargs):
+        """Test that invalid sampler arguments raise ValueError."""
+        with pytest.raises(ValueError):
+            StepSampler(**kwargs)
+
+
+class TestSampledSteps:
+    """Test sampling applied to rewrite_step."""
+
+    def test_unsampled_context_creates_no_steps(self, recorded_titles):
+        """Test that nested calls inherit the outer sampling decision."""
+
+        @rewrite_step("Helper")
+        def helper():
+            return "value"
+
+        sampler = StepSampler(every=2)
+        results = []
+        for _ in range(4):
+            with rewrite_step("Iteration", sample=sampler):
+                with rewrite_step("Inner"):
+                    pass
+                results.append(helper())
+
+        assert results == ["value"] * 4
+        assert recorded_titles() == ["Iteration", "Helper", "Iteration", "Helper"]
+
+    def test_unsampled_frame_removed_on_exit(self):
+        """Test that the passthrough frame is cleaned up."""
+        thread_id = _current_thread_id()
+        sampler = StepSampler(rate=0.0)
+
+        with rewrite_step("Iteration", sample=sampler):
+            assert _active_step_contexts[thread_id]["sampled"] is False
+
+        assert thread_id not in _active_step_contexts
+
+    def test_session_sampler_applies_to_decorated_calls(self, recorded_titles):
+        """Test that top-level decorated calls use the session-wide sampler."""
+
+        @rewrite_step("Inner")
+        def inner():
+            return "inner"
+
+        @rewrite_step("Outer")
+        def outer():
+            return inner()
+
+        set_sampler(StepSampler(rate=0.0))
+
+        assert outer() == "inner"
+        assert recorded_titles() == []
+
+    def test_nested_steps_are_not_sampled_again(self, recorded_titles):
+        """Test that only the outermost step consults the sampler."""
+        sampler = mock.Mock(spec=StepSampler)
+        sampler.should_record.return_value = True
+
+        with rewrite_step("Outer", sample=sampler):
+            with rewrite_step("Inner"):
+                pass
+
+        sampler.should_record.assert_called_once_with("Outer")
+
+    def test_sampled_decorated_step_keeps_all_children(self, recorded_titles):
+        """Test that a recorded decorated step records every nested step."""
+
+        @rewrite_step("Inner")
+        def inner():
+            pass
+
+        @rewrite_step("Outer")
+        def outer():
+            for _ in range(20):
+                inner()
+
+        set_sampler(StepSampler(rate=0.5, seed=3))
+        for _ in range(10):
+            outer()
+
+        titles = recorded_titles()
+        assert "Outer" in titles
+        assert titles == (["Outer"] + ["Inner"] * 20) * titles.count("Outer")
+
+    def test_sampled_generator_step_keeps_all_children(self, recorded_titles):
+        """Test that a recorded generator step records every nested step."""
+
+        @rewrite_step("Inner")
+        def inner():
+            pass
+
+        @rewrite_step("Produce")
+        def produce():
+            for number in range(5):
+                inner()
+                yield number
+
+        set_sampler(StepSampler(rate=0.5, seed=3))
+        for _ in range(10):
+            list(produce())
+
+        titles = recorded_titles()
+        assert titles == (["Produce"] + ["Inner"] * 5) * titles.count("Produce")
@@ -0,0 +1,108 @@
+"""Tests for JSON serialisation of results."""
+
+import json
+
+import pytest
+from allure_commons import model2
+from attr import asdict
+
+from allure_step_rewriter import serialization
+from allure_step_rewriter.rewrite_step import rewrite_step
+from allure_step_rewriter.sinks import capture_steps
+
+INSTALLED = [
+    name for name, installed in serialization.available_backends().items() if installed
+]
+
+
+@pytest.fixture(params=INSTALLED)
+def backend(request):
+    """Select each installed backend in turn."""
+    previous = serialization.get_backend()
+    serialization.set_backend(request.param)
+    yield request.param
+    serialization.set_backend(previous)
+
+
+def _result():
+    """Build a test result with nested steps."""
+    step = model2.TestStepResult(
+        name="Открыть страницу",
+        status="passed",
+        steps=[model2.TestStepResult(name="Inner", status="failed")],
+        attachments=[model2.Attachment(name="body", source="x-attachment.txt")],
+        parameters=[model2.Parameter(name="id", value="1", excluded=False)],
+    )
+    return model2.TestResult(uuid="1", name="test_a", steps=[step], start=1, stop=2)
+
+
+class TestDumps:
+    """Test encoding."""
+
+    def test_matches_allure_file_logger(self, backend):
+        """Test that results encode like AllureFileLogger writes them."""
+        result = _result()
+        expected = asdict(result, filter=lambda _, value: value or value is False)
+
+        assert json.loads(serialization.dumps(result)) == expected
+
+    def test_round_trip(self, backend, tmp_path):
+        """Test writing and reading a file."""
+        path = str(tmp_path / "a-result.json")
+
+        serialization.write_file_atomic(path, {"name": "тест", "steps": []})
+
+        assert serialization.read_file(path) == {"name": "тест", "steps": []}
+
+    def test_failed_write_leaves_no_tmp_file(self, backend, tmp_path):
+        """Test that a failed write removes its temporary file."""
+        path = tmp_path / "a-result.json"
+        path.write_text("{}")
+
+        with pytest.raises(TypeError):
+            serialization.write_file_atomic(str(path), {"steps": [object()]})
+
+        assert [p.name for p in tmp_path.iterdir()] == ["a-result.json"]
+        assert path.read_text() == "{}"
+
+    def test_step_records(self, backend):
+        """Test that captured step trees encode like to_dict()."""
+        with capture_steps() as sink:
+            with rewrite_step("Parent"):
+                with rewrite_step("Child"):
+                    pass
+
+        assert json.loads(sink.to_json()) == sink.to_dict()
+
+    def test_deeply_nested_steps(self, backend):
+        """Test that steps nested deeper than the backend allows are encoded."""
+        result = model2.TestResult(uuid="1", name="test_deep")
+        parent = result
+        for level in range(200):
+            step = model2.TestStepResult(name=f"Step {level}", status="passed")
+            parent.steps.append(step)
+            parent = step
+
+        decoded = json.loads(serialization.dumps(result))
+
+        for level in range(200):
+            (decoded,) = decoded["steps"]
+            assert decoded["name"] == f"Step {level}"
+
+    def test_unknown_object(self, backend):
+        """Test that unsupported objects raise TypeError."""
+        with pytest.raises(TypeError):
+            serialization.dumps(object())
+
+
+class TestBackend:
+    """Test backend selection."""
+
+    def test_fastest_installed_by_default(self):
+        """Test that the default backend is the first installed one."""
+        assert serialization.set_backend() == INSTALLED[0]
+
+    def test_unknown_backend(self):
+        """Test that unknown backends are rejected."""
+        with pytest.raises(ValueError, match="Unknown"):
+            serialization.set_backend("yaml")
@@ -0,0 +1,170 @@
+"""Tests for pluggable step sinks."""
+
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import (
+    AllureSink,
+    MemorySink,
+    NullSink,
+    rewrite_step,
+    set_sink,
+)
+from allure_step_rewriter.sinks import get_sink
+
+
+@pytest.fixture
+def memory_sink():
+    """Install a MemorySink for the duration of a test."""
+    sink = MemorySink()
+    previous = set_sink(sink)
+    yield sink
+    set_sink(previous)
+
+
+class TestMemorySink:
+    """Test step structure recorded by MemorySink."""
+
+    def test_records_created_steps_only(self, memory_sink):
+        """Test that overridden steps do not produce records."""
+
+        @rewrite_step("Helper")
+        def helper():
+            return "value"
+
+        with rewrite_step("Parent"):
+            helper()  # Overridden
+            helper()  # Nested
+
+        assert memory_sink.titles() == [("Parent", ["Helper"])]
+
+    def test_records_status_and_duration(self, memory_sink):
+        """Test that status and timings are recorded."""
+
+        @rewrite_step("Check")
+        def check():
+            assert False
+
+        @rewrite_step("Crash")
+        def crash():
+            raise RuntimeError("boom")
+
+        with pytest.raises(AssertionError):
+            check()
+        with pytest.raises(RuntimeError):
+            crash()
+        with rewrite_step("Ok"):
+            pass
+
+        assert [step.status for step in memory_sink.steps] == [
+            "failed",
+            "broken",
+            "passed",
+        ]
+        assert all(step.duration >= 0 for step in memory_sink.steps)
+
+    def test_attachments_land_on_current_step(self, memory_sink):
+        """Test that attachments go to the innermost open step."""
+        with rewrite_step("Parent"):
+            get_sink().attach("body", name="note")
+
+        assert memory_sink.steps[0].attachments[0]["name"] == "note"
+
+    def test_sink_swapped_inside_step_closes_original(self, memory_sink):
+        """Test that a step is closed on the sink that opened it."""
+        with rewrite_step("Parent"):
+            set_sink(NullSink())
+
+        assert memory_sink.steps[0].status == "passed"
+
+    def test_steps_closed_out_of_order(self, memory_sink):
+        """Test that a step closed before a nested one stops being a parent."""
+
+        @rewrite_step("Gen")
+        def gen():
+            yield 1
+
+        @rewrite_step("After")
+        def after():
+            pass
+
+        items = gen()
+        next(items)
+        with rewrite_step("Consumer"):
+            # Exhausts the generator, closing its step inside Consumer
+            next(items, None)
+        after()
+
+        assert memory_sink.titles() == [("Gen", ["Consumer"]), "After"]
+        assert memory_sink.current_step() is memory_sink.root
+
+
+class TestNullSink:
+    """Test the zero-cost null sink."""
+
+    def test_no_allure_steps_created(self):
+        """Test that nothing reaches allure with the null sink."""
+
+        @rewrite_step("Helper")
+        def helper():
+            return "value"
+
+        previous = set_sink(NullSink())
+        try:
+            with mock.patch("allure.step") as step:
+                with rewrite_step("Parent"):
+                    assert helper() == "value"
+                    assert helper() == "value"
+        finally:
+            set_sink(previous)
+
+        step.assert_not_called()
+
+
+class TestAllureSink:
+    """Test the default allure sink."""
+
+    def test_default_sink(self):
+        """Test that steps go to allure by default."""
+        assert isinstance(get_sink(), AllureSink)
+
+    def test_params_passed_to_allure_step(self):
+        """Test that step parameters reach the allure step context."""
+        with mock.patch("allure.step") as step:
+            handle = AllureSink().start_step("Title", {"user": "'admin'"})
+
+        step.assert_called_once_with("Title")
+        assert handle.params == {"user": "'admin'"}
+        handle.__enter__.assert_called_once_with()
+
+    def test_annotate_step_adds_parameters(self):
+        """Test that parameters are added to the reported step."""
+        step = mock.Mock(parameters=[])
+        reporter = mock.Mock(get_item=mock.Mock(return_value=step))
+        handle = mock.Mock(uuid="step-uuid")
+
+        with mock.patch(
+            "allure_step_rewriter.sinks._allure_reporter", return_value=reporter
+        ):
+            AllureSink().annotate_step(handle, {"calls": "3"})
+
+        reporter.get_item.assert_called_once_with("step-uuid")
+        assert [(p.name, p.value) for p in step.parameters] == [("calls", "3")]
+
+    def test_annotate_step_replaces_parameters(self):
+        """Test that a parameter added again replaces the previous value."""
+        step = mock.Mock(parameters=[])
+        reporter = mock.Mock(get_item=mock.Mock(return_value=step))
+        handle = mock.Mock(uuid="step-uuid")
+
+        with mock.patch(
+            "allure_step_rewriter.sinks._allure_reporter", return_value=reporter
+        ):
+            AllureSink().annotate_step(handle, {"calls": "2", "depth": "1"})
+            AllureSink().annotate_step(handle, {"calls": "3"})
+
+        assert [(p.name, p.value) for p in step.parameters] == [
+            ("depth", "1"),
+            ("calls", "3"),
+        ]
@@ -0,0 +1,194 @@
+"""Tests for slow step detection."""
+
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from allure_step_rewriter import (
+    SlowStepError,
+    SlowStepWarning,
+    rewrite_step,
+    set_slow_step_thresholds,
+    slow_steps,
+)
+from allure_step_rewriter.sinks import capture_steps
+
+
+@pytest.fixture
+def attachments():
+    """Collect bodies of Allure attachments."""
+    with mock.patch("allure.attach") as attach:
+        yield lambda: [call.args[0] for call in attach.call_args_list]
+
+
+@pytest.fixture(autouse=True)
+def reset_thresholds():
+    """Remove session-wide thresholds after each test."""
+    yield
+    set_slow_step_thresholds()
+
+
+class TestSlowSteps:
+    """Test warn_after and fail_after thresholds."""
+
+    def test_fast_step_is_not_reported(self, attachments):
+        """Test that steps under the threshold are left alone."""
+
+        @rewrite_step("Fast", warn_after=10.0, fail_after=20.0)
+        def fast():
+            return "done"
+
+        assert fast() == "done"
+        assert attachments() == []
+
+    def test_warn_after_warns_and_tags_step(self, attachments):
+        """Test that a slow decorated call warns and gets an attachment."""
+
+        @rewrite_step("Slow helper", warn_after=0.01)
+        def slow():
+            time.sleep(0.02)
+            return "done"
+
+        with pytest.warns(SlowStepWarning, match="Slow helper"):
+            assert slow() == "done"
+        assert "warn_after=0.01s" in attachments()[0]
+
+    def test_slow_step_tagged_with_parameter(self):
+        """Test that a slow step gets a slow parameter with its duration."""
+        with capture_steps() as sink:
+            with pytest.warns(SlowStepWarning):
+                with rewrite_step("Slow block", warn_after=0.01):
+                    time.sleep(0.02)
+            with rewrite_step("Fast block", warn_after=10.0):
+                pass
+
+        assert sink.find("Slow block").params["slow"].endswith("s")
+        assert "slow" not in sink.find("Fast block").params
+
+    def test_fail_after_fails_context(self, attachments):
+        """Test that a context exceeding fail_after raises SlowStepError."""
+        with pytest.raises(SlowStepError, match="fail_after=0.01s"):
+            with rewrite_step("Slow block", fail_after=0.01):
+                time.sleep(0.02)
+
+        assert len(attachments()) == 1
+
+    def test_original_error_wins_over_fail_after(self, attachments):
+        """Test that an exception raised in a slow step is not replaced."""
+
+        @rewrite_step("Slow failing", fail_after=0.01)
+        def slow_failing():
+            time.sleep(0.02)
+            raise ValueError("original")
+
+        with pytest.warns(SlowStepWarning):
+            with pytest.raises(ValueError, match="original"):
+                slow_failing()
+
+    def test_global_thresholds_apply_to_overridden_calls(self, attachments):
+        """Test that session-wide thresholds cover overridden steps too."""
+
+        @rewrite_step("Helper")
+        def helper():
+            time.sleep(0.02)
+
+        set_slow_step_thresholds(warn_after=0.01)
+
+        with pytest.warns(SlowStepWarning, match="Helper"):
+            with rewrite_step("Outer", warn_after=10.0):
+                helper()
+
+    def test_stack_sample_attached(self, attachments):
+        """Test that the watchdog samples the stack of a slow step."""
+
+        def stuck_in_here():
+            time.sleep(0.2)
+
+        with pytest.warns(SlowStepWarning):
+            with rewrite_step("Stuck", warn_after=0.05, capture_stack=True):
+                stuck_in_here()
+
+        assert "stuck_in_here" in attachments()[0]
+
+    def test_finished_steps_leave_the_watchdog(self):
+        """Test that fast steps with long thresholds do not pile up."""
+        for _ in range(1000):
+            with rewrite_step("Fast", warn_after=60.0, capture_stack=True):
+                pass
+
+        assert len(slow_steps._watchdog._heap) <= slow_steps._Watchdog.PURGE_SLACK
+
+    @pytest.mark.parametrize("kind", ["decorator", "context", "generator"])
+    def test_warning_points_at_caller(self, attachments, kind):
+        """Test that the warning is attributed to the code running the step."""
+
+        @rewrite_step("Slow call", warn_after=0.01)
+        def slow_call():
+            time.sleep(0.02)
+
+        @rewrite_step("Slow items", warn_after=0.01)
+        def slow_items():
+            time.sleep(0.02)
+            yield 1
+
+        with pytest.warns(SlowStepWarning) as record:
+            if kind == "decorator":
+                slow_call()
+            elif kind == "context":
+                with rewrite_step("Slow block", warn_after=0.01):
+                    time.sleep(0.02)
+            else:
+                list(slow_items())
+
+        assert record[0].filename == __file__
+
+
+class TestSlowStepOptions:
+    """Test the slow step ini options of the plugin."""
+
+    def test_conftest_thresholds_kept_without_ini_options(self, pytester):
+        """Test that the plugin keeps thresholds set through the API in conftest.py."""
+        pytester.makeconftest("""
+            from allure_step_rewriter import set_slow_step_thresholds
+
+            set_slow_step_thresholds(warn_after=0.01)
+            """)
+        pytester.makepyfile("""
+            import time
+
+            import pytest
+            from allure_step_rewriter import SlowStepWarning, rewrite_step
+
+            def test_slow():
+                with pytest.warns(SlowStepWarning):
+                    with rewrite_step("Slow"):
+                        time.sleep(0.02)
+            """)
+
+        result = pytester.runpytest("-p", "allure_step_rewriter.plugin")
+
+        result.assert_outcomes(passed=1)
+
+    def test_slow_parameter_in_allure_results(self, pytester):
+        """Test that the slow parameter is written to the Allure step."""
+        pytester.makepyfile("""
+            import time
+
+            from allure_step_rewriter import rewrite_step
+
+            def test_slow():
+                with rewrite_step("Slow", warn_after=0.01):
+                    time.sleep(0.02)
+            """)
+
+        result = pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", "--alluredir", "results"
+        )
+
+        result.assert_outcomes(passed=1)
+        (path,) = (pytester.path / "results").glob("*-result.json")
+        (step,) = json.loads(path.read_text())["steps"]
+        (parameter,) = step["parameters"]
+        assert parameter["name"] == "slow"
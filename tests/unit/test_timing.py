@@ -0,0 +1,162 @@
+"""Tests for step observers and per-title timing aggregation."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from allure_step_rewriter import (
+    StepObserver,
+    add_step_observer,
+    plugin,
+    remove_step_observer,
+    rewrite_step,
+)
+from allure_step_rewriter.timing import Histogram, TimingRecorder
+
+
+@pytest.fixture
+def recorder():
+    """Register a timing recorder for the duration of a test."""
+    recorder = TimingRecorder()
+    add_step_observer(recorder)
+    yield recorder
+    remove_step_observer(recorder)
+
+
+class TestStepObservers:
+    """Test observer notifications from rewrite_step."""
+
+    def test_observer_sees_created_and_overridden_steps(self):
+        """Test that observers are notified for every handled step."""
+        events = []
+
+        class Observer(StepObserver):
+            def step_started(self, title, overridden):
+                events.append(("start", title, overridden))
+
+            def step_finished(self, title, overridden, wall, cpu, exc_val):
+                events.append(("finish", title, overridden, type(exc_val)))
+
+        @rewrite_step("Helper")
+        def helper():
+            raise ValueError("boom")
+
+        observer = Observer()
+        add_step_observer(observer)
+        try:
+            with pytest.raises(ValueError):
+                with rewrite_step("Outer"):
+                    helper()
+        finally:
+            remove_step_observer(observer)
+
+        assert events == [
+            ("start", "Outer", False),
+            ("start", "Helper", True),
+            ("finish", "Helper", True, ValueError),
+            ("finish", "Outer", False, ValueError),
+        ]
+
+
+class TestHistogram:
+    """Test the fixed-bucket histogram."""
+
+    def test_percentiles_are_bucket_bounds(self):
+        """Test that percentiles are estimated within bucket resolution."""
+        histogram = Histogram()
+        for _ in range(90):
+            histogram.add(0.010)
+        for _ in range(10):
+            histogram.add(1.0)
+
+        assert histogram.count == 100
+        assert histogram.max == 1.0
+        assert 0.010 <= histogram.percentile(50) < 0.010 * 1.2
+        assert histogram.percentile(95) == 1.0
+
+    def test_empty_histogram(self):
+        """Test that an empty histogram reports zeros."""
+        assert Histogram().to_dict() == {
+            "total": 0.0,
+            "p50": 0.0,
+            "p95": 0.0,
+            "max": 0.0,
+        }
+
+
+class TestTimingRecorder:
+    """Test per-title aggregation."""
+
+    def test_counts_created_nested_and_overridden(self, recorder):
+        """Test that steps are classified by how they were recorded."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        with rewrite_step("Outer"):
+            helper()  # Overridden
+            helper()  # Nested
+
+        stats = {item.title: item for item in recorder.stats()}
+        assert stats["Outer"].created == 1
+        assert stats["Helper"].overridden == 1
+        assert stats["Helper"].nested == 1
+        assert stats["Helper"].wall.count == 2
+
+    def test_report_and_json_dump(self, recorder, tmp_path):
+        """Test the session-end report and JSON dump."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        for _ in range(3):
+            helper()
+
+        lines = recorder.report_lines()
+        path = tmp_path / "timings.json"
+        recorder.dump_json(str(path))
+
+        assert lines[0] == "Slowest steps (total wall time):"
+        assert "count=3" in lines[1] and lines[1].endswith("Helper")
+        data = json.loads(path.read_text())
+        assert data["titles"][0]["title"] == "Helper"
+        assert data["titles"][0]["created"] == 3
+
+
+class TestTimingPlugin:
+    """Test the timing options of the pytest plugin."""
+
+    def test_terminal_summary_and_json(self, pytester):
+        """Test that the hot-step report is shown and dumped."""
+        pytester.makepyfile("""
+            from allure_step_rewriter import rewrite_step
+
+            @rewrite_step("Login")
+            def login():
+                pass
+
+            def test_login():
+                login()
+                login()
+            """)
+        path = pytester.path / "timings.json"
+
+        result = pytester.runpytest(
+            "-p", "allure_step_rewriter.plugin", f"--allure-step-timings-json={path}"
+        )
+
+        result.stdout.fnmatch_lines(
+            ["*allure-step-rewriter: hot steps*", "*count=2*Login"]
+        )
+        assert json.loads(path.read_text())["titles"][0]["count"] == 2
+
+    def test_xdist_workers_write_own_file(self, tmp_path):
+        """Test that xdist workers add their id to the output paths."""
+        path = str(tmp_path / "timings.json")
+        worker = SimpleNamespace(workerinput={"workerid": "gw1"})
+
+        assert plugin._worker_path(worker, path) == str(tmp_path / "timings.gw1.json")
+        assert plugin._worker_path(SimpleNamespace(), path) == path
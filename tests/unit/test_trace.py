@@ -0,0 +1,108 @@
+"""Tests for Chrome trace-event export of step timelines."""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from allure_step_rewriter import add_step_observer, remove_step_observer, rewrite_step
+from allure_step_rewriter.trace import ChromeTraceWriter
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    """Path of the trace file written by the writer fixture."""
+    return tmp_path / "steps.trace.json"
+
+
+@pytest.fixture
+def writer(trace_path):
+    """Register a trace writer with a small chunk size."""
+    writer = ChromeTraceWriter(str(trace_path), chunk_size=3)
+    add_step_observer(writer)
+    yield writer
+    remove_step_observer(writer)
+    writer.close()
+
+
+def _step_events(trace_path):
+    """Load non-metadata events from a trace file."""
+    return [event for event in json.loads(trace_path.read_text()) if event["ph"] != "M"]
+
+
+class TestChromeTraceWriter:
+    """Test trace event streaming."""
+
+    def test_begin_and_end_events(self, writer, trace_path):
+        """Test that every step produces a begin and an end event."""
+
+        @rewrite_step("Helper")
+        def helper():
+            pass
+
+        with pytest.raises(AssertionError):
+            with rewrite_step("Outer"):
+                helper()
+                assert False
+        writer.close()
+
+        events = _step_events(trace_path)
+        assert [(event["ph"], event["name"]) for event in events] == [
+            ("B", "Outer"),
+            ("B", "Helper"),
+            ("E", "Helper"),
+            ("E", "Outer"),
+        ]
+        assert events[1]["args"]["overridden"] is True
+        assert events[3]["args"]["status"] == "failed"
+        assert events[0]["ts"] <= events[3]["ts"]
+
+    def test_one_lane_per_thread(self, writer, trace_path):
+        """Test that steps of different threads go to different lanes."""
+
+        barrier = threading.Barrier(3)
+
+        @rewrite_step("Worker step")
+        def work():
+            barrier.wait()
+
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.close()
+
+        events = json.loads(trace_path.read_text())
+        lanes = {event["tid"] for event in events if event["ph"] == "B"}
+        names = [event for event in events if event["ph"] == "M"]
+        assert len(lanes) == 3
+        assert len(names) == 3
+
+    def test_asyncio_tasks_get_own_lanes(self, writer, trace_path):
+        """Test that steps of asyncio tasks are laid out per task."""
+
+        async def task(name):
+            with rewrite_step(name):
+                await asyncio.sleep(0)
+
+        async def main():
+            await asyncio.gather(task("A"), task("B"))
+
+        asyncio.run(main())
+        writer.close()
+
+        events = _step_events(trace_path)
+        lanes = {event["name"]: event["tid"] for event in events}
+        assert lanes["A"] != lanes["B"]
+
+    def test_close_is_idempotent(self, writer, trace_path):
+        """Test that events after close are ignored and the file stays valid."""
+        writer.close()
+        writer.close()
+
+        with rewrite_step("After close"):
+            pass
+
+        assert json.loads(trace_path.read_text()) == []
@@ -0,0 +1,174 @@
+"""Tests for the background Allure result writer."""
+
+import json
+import threading
+import time
+import warnings
+from unittest import mock
+
+import allure_commons
+import pytest
+from allure_commons import model2
+from allure_commons.logger import AllureFileLogger
+
+from allure_step_rewriter import serialization
+from allure_step_rewriter.writer import (
+    BackgroundFileLogger,
+    install_background_writer,
+    uninstall_background_writer,
+)
+
+
+@pytest.fixture
+def file_logger(tmp_path):
+    """File logger writing to a temporary results directory."""
+    return AllureFileLogger(str(tmp_path))
+
+
+class TestBackgroundFileLogger:
+    """Test queued writing."""
+
+    def test_results_written_on_writer_thread(self, file_logger, tmp_path):
+        """Test that results are written by the writer thread."""
+        threads = []
+        dumps = serialization.dumps
+
+        def record_thread(data):
+            threads.append(threading.current_thread().name)
+            return dumps(data)
+
+        writer = BackgroundFileLogger(file_logger)
+        with mock.patch.object(serialization, "dumps", record_thread):
+            writer.report_result(model2.TestResult(uuid="1", name="test_a"))
+            writer.report_attached_data(b"body", "x-attachment.txt")
+            writer.close()
+
+        assert threads == ["allure-step-writer"]
+        (result,) = tmp_path.glob("*-result.json")
+        assert json.loads(result.read_text())["name"] == "test_a"
+        assert (tmp_path / "x-attachment.txt").read_bytes() == b"body"
+
+    def test_full_queue_blocks_test_thread(self, file_logger):
+        """Test backpressure: submitting waits while the queue is full."""
+        release = threading.Event()
+        writer = BackgroundFileLogger(file_logger, max_queue=1)
+        writer.submit(release.wait)  # Taken by the writer thread
+        time.sleep(0.05)
+        writer.submit(lambda: None)  # Fills the queue
+
+        submitted = threading.Event()
+        thread = threading.Thread(
+            target=lambda: (writer.submit(lambda: None), submitted.set())
+        )
+        thread.start()
+        assert not submitted.wait(0.1)
+
+        release.set()
+        assert submitted.wait(1)
+        thread.join()
+        writer.close()
+
+    def test_remove_runs_after_queued_writes(self, file_logger, tmp_path):
+        """Test that removal is ordered after the queued attachment write."""
+        writer = BackgroundFileLogger(file_logger)
+        writer.report_attached_data(b"body", "x-attachment.txt")
+        writer.remove("x-attachment.txt")
+        writer.close()
+
+        assert not (tmp_path / "x-attachment.txt").exists()
+
+    def test_errors_warn_on_close(self, file_logger):
+        """Test that write errors are reported when closing."""
+        writer = BackgroundFileLogger(file_logger)
+        writer.submit(mock.Mock(side_effect=OSError("disk full")))
+
+        with pytest.warns(UserWarning, match="disk full"):
+            writer.close()
+
+    def test_failed_write_falls_back_to_file_logger(
+        self, file_logger, tmp_path, capsys
+    ):
+        """Test that a result the fast path fails to write is still written."""
+        writer = BackgroundFileLogger(file_logger)
+        with mock.patch.object(
+            serialization, "dumps", side_effect=TypeError("Recursion limit reached")
+        ):
+            writer.report_result(model2.TestResult(uuid="1", name="test_a"))
+            with pytest.warns(UserWarning, match="Recursion limit reached"):
+                writer.close()
+
+        (result,) = tmp_path.iterdir()
+        assert result.name.endswith("-result.json")
+        assert json.loads(result.read_text())["name"] == "test_a"
+        assert "Recursion limit reached" in capsys.readouterr().err
+
+    def test_submit_after_close_writes_inline(self, file_logger):
+        """Test that late writes still happen, on the calling thread."""
+        writer = BackgroundFileLogger(file_logger)
+        writer.close()
+        func = mock.Mock()
+
+        writer.submit(func, 1)
+
+        func.assert_called_once_with(1)
+
+
+class TestInstall:
+    """Test taking over from the registered file logger."""
+
+    def test_install_and_uninstall(self, file_logger):
+        """Test that the file logger is swapped out and restored."""
+        allure_commons.plugin_manager.register(file_logger)
+        try:
+            writer = install_background_writer()
+            plugins = allure_commons.plugin_manager.get_plugins()
+            assert writer in plugins
+            assert file_logger not in plugins
+
+            uninstall_background_writer(writer)
+            plugins = allure_commons.plugin_manager.get_plugins()
+            assert writer not in plugins
+            assert file_logger in plugins
+        finally:
+            allure_commons.plugin_manager.unregister(file_logger)
+
+    def test_uninstall_restores_logger_when_close_raises(self, file_logger):
+        """Test that the file logger is registered again if closing raises."""
+        allure_commons.plugin_manager.register(file_logger)
+        try:
+            writer = install_background_writer()
+            writer.submit(mock.Mock(side_effect=OSError("disk full")))
+
+            with pytest.raises(UserWarning, match="disk full"):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error")
+                    uninstall_background_writer(writer)
+
+            assert file_logger in allure_commons.plugin_manager.get_plugins()
+        finally:
+            allure_commons.plugin_manager.unregister(file_logger)
+
+    def test_no_file_logger(self):
+        """Test that nothing is installed without a file logger."""
+        assert install_background_writer() is None
+
+    def test_plugin_option(self, pytester):
+        """Test the --allure-step-background-writer option end to end."""
+        pytester.makepyfile("""
+            import allure
+
+            def test_attach():
+                allure.attach("body", name="note")
+            """)
+        results_dir = pytester.path / "allure-results"
+
+        result = pytester.runpytest(
+            "-p",
+            "allure_step_rewriter.plugin",
+            f"--alluredir={results_dir}",
+            "--allure-step-background-writer",
+        )
+
+        result.assert_outcomes(passed=1)
+        assert len(list(results_dir.glob("*-result.json"))) == 1
+        assert len(list(results_dir.glob("*-attachment.*"))) == 1